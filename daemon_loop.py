@@ -0,0 +1,72 @@
+"""
+Долгоживущий режим раннеров: `python3 tiktok_runner.py daemon [режим]`.
+
+Раньше каждый прогон — новый процесс по SSH / cron: заново читался
+config.json, строился discovery-сервис Sheets, шла авторизация, а кэши
+(sheetId, пул HTTP-соединений, GPT-кэш, зеркало, circuit breaker) умирали
+вместе с процессом. Daemon держит всё это между циклами, а поведение
+берёт из листа Settings в начале каждого цикла:
+
+- bot_status = on / off — off: цикл пропускается (в Logs — bot_off);
+- sleep_between_min — пауза между концом одного цикла и началом следующего.
+
+Правки Settings / Clusters подхватываются со следующего цикла без
+перезапуска; config.json читается один раз (его правки — перезапуск).
+SIGTERM / SIGINT: текущий цикл доделывается, затем процесс выходит
+(повторный сигнал — выход сразу).
+"""
+import signal
+import threading
+
+
+DEFAULT_SLEEP_BETWEEN_MIN = 5
+# даже при sleep_between_min = 0 не крутимся вхолостую
+MIN_SLEEP_SEC = 5
+
+
+def parse_daemon_settings(settings):
+    """bot_status / sleep_between_min из Settings -> (бот включён, пауза в сек)."""
+    status = (settings.get("bot_status", "on") or "on").strip().lower()
+    enabled = status in ("on", "1", "true", "yes")
+    try:
+        sleep_min = float(settings.get("sleep_between_min", str(DEFAULT_SLEEP_BETWEEN_MIN)))
+    except Exception:
+        sleep_min = DEFAULT_SLEEP_BETWEEN_MIN
+    return enabled, max(MIN_SLEEP_SEC, sleep_min * 60)
+
+
+class Daemon:
+    def __init__(self):
+        self.cycles = 0
+        self._stop = threading.Event()
+
+    def stop(self, *_args):
+        if self._stop.is_set():
+            # второй сигнал — выходим сразу
+            raise KeyboardInterrupt
+        print("[DAEMON] Остановка: доделываем текущий цикл")
+        self._stop.set()
+
+    def stopped(self):
+        return self._stop.is_set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run_forever(self, cycle, on_error):
+        """
+        cycle() — один цикл, возвращает паузу до следующего (сек).
+        on_error(exc) — цикл упал; следующий начнётся после прежней паузы.
+        """
+        sleep_sec = DEFAULT_SLEEP_BETWEEN_MIN * 60
+        while not self._stop.is_set():
+            self.cycles += 1
+            try:
+                sleep_sec = cycle()
+            except Exception as e:
+                on_error(e)
+            if self._stop.is_set():
+                break
+            print(f"[DAEMON] Цикл {self.cycles} завершён, следующий через {int(sleep_sec)} сек")
+            self._stop.wait(sleep_sec)
@@ -0,0 +1,288 @@
+"""
+Офлайн-разметка через OpenAI Batch API (режим gpt_batch).
+
+Поток:
+1. пишем все запросы в JSONL-файл (одна строка = один chat/completions);
+2. заливаем файл (POST /files, purpose=batch) и создаём batch (POST /batches);
+3. ждём, пока batch станет completed (GET /batches/{id});
+4. качаем output-файл (GET /files/{id}/content) и разбираем ответы по custom_id.
+
+base_url настраивается (OPENAI_BASE_URL в config.json), так что весь поток
+можно прогнать против локального сервера-заглушки.
+"""
+import json
+import os
+import time
+
+import http_client
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_DONE_STATUSES = ("completed",)
+BATCH_FAILED_STATUSES = ("failed", "expired", "cancelling", "cancelled")
+# batch не доделан, но то, что успело выполниться, лежит в output-файле
+BATCH_PARTIAL_STATUSES = ("expired", "cancelled")
+
+
+def _auth_headers(api_key):
+    return {"Authorization": f"Bearer {api_key}"}
+
+
+def write_batch_file(path, requests_by_id):
+    """
+    requests_by_id: список пар (custom_id, body), body — тело chat/completions.
+    Возвращает количество записанных строк.
+    """
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in requests_by_id:
+            line = {
+                "custom_id": str(custom_id),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": body,
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def upload_batch_file(base_url, api_key, path):
+    with open(path, "rb") as f:
+        resp = http_client.post(
+            f"{base_url}/files",
+            headers=_auth_headers(api_key),
+            data={"purpose": "batch"},
+            files={"file": (os.path.basename(path), f, "application/jsonl")},
+            timeout=300,
+        )
+    if resp.status_code != 200:
+        raise RuntimeError(f"Batch file upload error {resp.status_code}: {resp.text[:500]}")
+    file_id = resp.json().get("id")
+    if not file_id:
+        raise RuntimeError("Batch file upload without id: " + resp.text[:200])
+    return file_id
+
+
+def create_batch(base_url, api_key, input_file_id, completion_window="24h"):
+    resp = http_client.post(
+        f"{base_url}/batches",
+        headers={**_auth_headers(api_key), "Content-Type": "application/json"},
+        json={
+            "input_file_id": input_file_id,
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": completion_window,
+        },
+        timeout=60,
+    )
+    if resp.status_code != 200:
+        raise RuntimeError(f"Batch create error {resp.status_code}: {resp.text[:500]}")
+    batch_id = resp.json().get("id")
+    if not batch_id:
+        raise RuntimeError("Batch create without id: " + resp.text[:200])
+    return batch_id
+
+
+def get_batch(base_url, api_key, batch_id):
+    resp = http_client.get(
+        f"{base_url}/batches/{batch_id}",
+        headers=_auth_headers(api_key),
+        timeout=60,
+    )
+    if resp.status_code != 200:
+        raise RuntimeError(f"Batch status error {resp.status_code}: {resp.text[:200]}")
+    return resp.json()
+
+
+def wait_batch(base_url, api_key, batch_id, max_wait_sec, poll_sec=60):
+    """
+    Ждёт, пока batch завершится. Возвращает последний объект batch
+    (status: completed / failed / expired / ... или in_progress при таймауте).
+    """
+    waited = 0
+    last_status = None
+    while True:
+        batch = get_batch(base_url, api_key, batch_id)
+        status = batch.get("status", "")
+        if status != last_status:
+            counts = batch.get("request_counts") or {}
+            print(
+                f"[GPT_BATCH] batch={batch_id} status={status} "
+                f"completed={counts.get('completed', 0)}/{counts.get('total', 0)} waited={waited} sec"
+            )
+            last_status = status
+
+        if status in BATCH_DONE_STATUSES or status in BATCH_FAILED_STATUSES:
+            return batch
+        if waited >= max_wait_sec:
+            return batch
+
+        time.sleep(poll_sec)
+        waited += poll_sec
+
+
+def download_batch_results(base_url, api_key, output_file_id):
+    """
+    Качает output-файл batch и возвращает {custom_id: content}.
+    Запросы с ошибкой (status_code != 200) и строки без custom_id
+    в результат не попадают.
+    """
+    resp = http_client.get(
+        f"{base_url}/files/{output_file_id}/content",
+        headers=_auth_headers(api_key),
+        timeout=300,
+    )
+    if resp.status_code != 200:
+        raise RuntimeError(f"Batch output download error {resp.status_code}: {resp.text[:200]}")
+
+    results = {}
+    for line in resp.text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except Exception:
+            continue
+        custom_id = item.get("custom_id")
+        if custom_id is None:
+            continue
+        response = item.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        body = response.get("body") or {}
+        content = (
+            (body.get("choices") or [{}])[0]
+            .get("message", {})
+            .get("content", "")
+        )
+        results[str(custom_id)] = (content or "").strip()
+    return results
+
+
+# ---------- полный цикл с запоминанием незавершённого batch ----------
+
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print("[GPT_BATCH] cannot read state:", repr(e))
+        return None
+
+
+def _save_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _clear_state(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _finish_batch(base_url, api_key, state, max_wait_sec, poll_sec):
+    """
+    Ждёт batch из state. Возвращает (status, {text: answer}).
+    У expired / cancelled забираем то, что успело выполниться.
+    """
+    batch = wait_batch(base_url, api_key, state["batch_id"], max_wait_sec, poll_sec)
+    status = batch.get("status", "")
+    if status not in BATCH_DONE_STATUSES and status not in BATCH_PARTIAL_STATUSES:
+        return status, {}
+
+    output_file_id = batch.get("output_file_id")
+    if not output_file_id:
+        return status, {}
+
+    by_id = download_batch_results(base_url, api_key, output_file_id)
+    texts = state.get("texts", {})
+    answers = {}
+    for custom_id, answer in by_id.items():
+        if custom_id in texts and answer:
+            answers[texts[custom_id]] = answer
+    return status, answers
+
+
+def classify_texts_via_batch(
+    base_url,
+    api_key,
+    texts,
+    build_body,
+    batch_dir,
+    tag,
+    prompt_key,
+    max_wait_sec,
+    poll_sec=60,
+):
+    """
+    Размечает уникальные texts одним batch. build_body(text) -> тело chat/completions.
+
+    Возвращает (answers, status): answers = {text: ответ модели},
+    status — completed / failed / ... / in_progress (если не дождались).
+
+    id незавершённого batch пишем в batch_dir/pending_{tag}.json: следующий
+    запуск сначала дождётся его, а не будет платить за те же тексты второй раз
+    (если промпт с тех пор не поменялся — prompt_key).
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    state_path = os.path.join(batch_dir, f"pending_{tag}.json")
+    answers = {}
+
+    state = _load_state(state_path)
+    if state and state.get("prompt_key") == prompt_key:
+        print(f"[GPT_BATCH] resume batch={state.get('batch_id')}")
+        status, got = _finish_batch(base_url, api_key, state, max_wait_sec, poll_sec)
+        answers.update(got)
+        if status not in BATCH_DONE_STATUSES and status not in BATCH_FAILED_STATUSES:
+            return answers, status
+        _clear_state(state_path)
+    elif state:
+        print("[GPT_BATCH] pending batch was built for another prompt, skip it")
+        _clear_state(state_path)
+
+    todo = []
+    seen = set()
+    for text in texts:
+        if text in answers or text in seen:
+            continue
+        seen.add(text)
+        todo.append(text)
+
+    if not todo:
+        return answers, "completed"
+
+    ids = {f"t{i}": text for i, text in enumerate(todo)}
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(batch_dir, f"batch_{tag}_{ts}.jsonl")
+    count = write_batch_file(path, [(cid, build_body(text)) for cid, text in ids.items()])
+    print(f"[GPT_BATCH] batch file: {path}, requests={count}")
+
+    input_file_id = upload_batch_file(base_url, api_key, path)
+    batch_id = create_batch(base_url, api_key, input_file_id)
+    print(f"[GPT_BATCH] submitted batch={batch_id} file={input_file_id}")
+
+    state = {
+        "batch_id": batch_id,
+        "input_file_id": input_file_id,
+        "prompt_key": prompt_key,
+        "created": ts,
+        "texts": ids,
+    }
+    _save_state(state_path, state)
+
+    status, got = _finish_batch(base_url, api_key, state, max_wait_sec, poll_sec)
+    answers.update(got)
+    if status in BATCH_DONE_STATUSES or status in BATCH_FAILED_STATUSES:
+        _clear_state(state_path)
+    return answers, status
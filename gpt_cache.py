@@ -0,0 +1,138 @@
+"""
+Постоянный кэш ответов GPT на диске (SQLite).
+
+Ключ = sha256(модель + хэш промпта + нормализованный текст), так что
+одинаковые био (один автор — много видео, повторные скрейпы тех же
+поисковых URL) классифицируются один раз. Кэш общий для TikTok- и
+YouTube-бота, если у них один и тот же GPT_CACHE_PATH.
+
+Размер ограничен max_entries: при переполнении выкидываем записи,
+которые дольше всех не читались (LRU по last_used).
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+DEFAULT_MAX_ENTRIES = 200_000
+
+# как часто (в put-ах) проверяем размер кэша
+_EVICT_CHECK_EVERY = 500
+
+
+def normalize_text(text):
+    """NFC + схлопываем пробелы/переносы строк."""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFC", str(text))
+    return " ".join(text.split())
+
+
+def make_key(model, prompt, text):
+    prompt_hash = hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()
+    raw = "\x00".join([model or "", prompt_hash, normalize_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class GptCache:
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS gpt_cache ("
+            " key TEXT PRIMARY KEY,"
+            " answer TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS gpt_cache_last_used ON gpt_cache(last_used)"
+        )
+        self._conn.commit()
+
+    def get(self, model, prompt, text):
+        """Ответ из кэша или None."""
+        key = make_key(model, prompt, text)
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT answer FROM gpt_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._conn.execute(
+                    "UPDATE gpt_cache SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._conn.commit()
+            except Exception as e:
+                print("GPT cache read error:", repr(e))
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, prompt, text, answer):
+        if not answer:
+            return
+        key = make_key(model, prompt, text)
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO gpt_cache (key, answer, created, last_used)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, answer, now, now),
+                )
+                self._conn.commit()
+                self._puts += 1
+                if self._puts % _EVICT_CHECK_EVERY == 0:
+                    self._evict()
+            except Exception as e:
+                print("GPT cache write error:", repr(e))
+
+    def _evict(self):
+        if not self.max_entries or self.max_entries <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM gpt_cache").fetchone()
+        extra = count - self.max_entries
+        if extra <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM gpt_cache WHERE key IN ("
+            " SELECT key FROM gpt_cache ORDER BY last_used ASC LIMIT ?)",
+            (extra,),
+        )
+        self._conn.commit()
+        self.evicted += extra
+
+    def stats(self):
+        with self._lock:
+            try:
+                (size,) = self._conn.execute("SELECT COUNT(*) FROM gpt_cache").fetchone()
+            except Exception:
+                size = -1
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "size": size,
+        }
+
+    def stats_text(self):
+        st = self.stats()
+        return (
+            f"hits={st['hits']} misses={st['misses']} "
+            f"evicted={st['evicted']} size={st['size']}"
+        )
@@ -0,0 +1,268 @@
+"""
+Общий движок GPT-разметки для tiktok_runner.py и youtube_runner.py.
+
+Сами HTTP-вызовы GPT живут в раннерах (call_gpt_label и т.п.),
+здесь — только логика "как гонять много запросов сразу".
+"""
+import itertools
+import json
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+DEFAULT_GPT_CONCURRENCY = 4
+DEFAULT_GPT_PACK_SIZE = 1  # 1 = один текст на запрос (упаковка выключена)
+
+
+def parse_concurrency(settings, key="gpt_concurrency", default=DEFAULT_GPT_CONCURRENCY):
+    """Читает размер пула из Settings (минимум 1)."""
+    raw = settings.get(key, str(default))
+    try:
+        return max(1, int(raw))
+    except Exception:
+        return default
+
+
+def parse_pack_size(settings, key="gpt_pack_size", default=DEFAULT_GPT_PACK_SIZE):
+    """Сколько текстов упаковывать в один GPT-запрос (минимум 1)."""
+    raw = settings.get(key, str(default))
+    try:
+        return max(1, int(raw))
+    except Exception:
+        return default
+
+
+def _safe_call(worker, task):
+    try:
+        return worker(task)
+    except Exception as e:
+        print("GPT worker error:", repr(e))
+        return ""
+
+
+def run_in_pool(tasks, worker, concurrency=1):
+    """
+    Прогоняет worker(task) по всем tasks, держа в полёте не больше
+    concurrency запросов одновременно.
+
+    Это генератор: отдаёт пары (task, result) по мере готовности
+    (порядок может отличаться от порядка tasks). Запись результата
+    в строки делает вызывающий код в основном потоке — поэтому
+    результат всегда попадает в "свою" строку.
+
+    Если worker упал с исключением — result = "" (как при ошибке GPT).
+    """
+    if concurrency <= 1:
+        for task in tasks:
+            yield task, _safe_call(worker, task)
+        return
+
+    it = iter(tasks)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+        for task in itertools.islice(it, concurrency):
+            in_flight[pool.submit(_safe_call, worker, task)] = task
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                task = in_flight.pop(fut)
+                yield task, fut.result()
+
+            for task in itertools.islice(it, concurrency - len(in_flight)):
+                in_flight[pool.submit(_safe_call, worker, task)] = task
+
+
+def group_rows_by_key(rows, row_indexes, key_idx):
+    """
+    Группирует строки (по индексам row_indexes) по значению колонки key_idx,
+    например по profile_url: у всех видео одного профиля одно и то же био,
+    значит и ответ GPT один.
+
+    Возвращает список групп (списков row_idx) в порядке первого появления.
+    Строки с пустым ключом (или key_idx=None) идут каждая своей группой.
+    """
+    keys = None if key_idx is None else _RowsColumn(rows, key_idx)
+    return group_by_column(keys, row_indexes)
+
+
+def group_by_column(keys, row_indexes):
+    """
+    То же, что group_rows_by_key, но по готовой колонке: keys[row_idx] —
+    ключ строки (например, RowStore.column("profile_url"); None — без группировки).
+    """
+    groups = []
+    by_key = {}
+    for row_idx in row_indexes:
+        key = str(keys[row_idx] or "").strip() if keys is not None else ""
+        if not key:
+            groups.append([row_idx])
+            continue
+        if key in by_key:
+            by_key[key].append(row_idx)
+        else:
+            group = [row_idx]
+            by_key[key] = group
+            groups.append(group)
+    return groups
+
+
+def group_text(rows, group, text_idx):
+    """Текст для группы — первый непустой текст среди её строк."""
+    return column_group_text(_RowsColumn(rows, text_idx), group)
+
+
+def column_group_text(texts, group):
+    """group_text по готовой колонке texts (texts[row_idx] — текст строки)."""
+    for row_idx in group:
+        text = texts[row_idx]
+        if str(text or "").strip():
+            return text
+    return ""
+
+
+class _RowsColumn:
+    """Колонка col_idx списка строк без копирования (короткая строка -> "")."""
+
+    __slots__ = ("rows", "col_idx")
+
+    def __init__(self, rows, col_idx):
+        self.rows = rows
+        self.col_idx = col_idx
+
+    def __getitem__(self, row_idx):
+        r = self.rows[row_idx]
+        return r[self.col_idx] if self.col_idx < len(r) else ""
+
+
+def chunked(items, size):
+    size = max(1, int(size or 1))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# ---------- упаковка нескольких текстов в один запрос ----------
+
+def build_packed_prompt(prompt_base, texts):
+    """
+    Промпт для пакетной классификации: то же правило prompt_base,
+    но применить к каждому тексту отдельно и вернуть JSON {id: ответ}.
+    id — строки "1".."K" (порядок texts).
+    """
+    items = [{"id": str(i), "text": "" if t is None else str(t)} for i, t in enumerate(texts, start=1)]
+    return (
+        prompt_base.strip()
+        + "\n\nНиже несколько текстов в JSON-массиве, у каждого свой id. "
+        "Примени правило выше к КАЖДОМУ тексту отдельно. "
+        "Верни ТОЛЬКО JSON-объект вида {\"<id>\": \"<ответ>\"} для всех id, без пояснений."
+        "\n\nТексты:\n"
+        + json.dumps(items, ensure_ascii=False)
+    )
+
+
+def parse_packed_answer(content, count):
+    """
+    Разбирает ответ на build_packed_prompt.
+    Возвращает список из count ответов; None — для id, которых нет
+    в ответе или значение странное. Если JSON вообще не разобрался —
+    все None (вызывающий код падает обратно на одиночные запросы).
+    """
+    answers = [None] * count
+    try:
+        data = json.loads((content or "").strip())
+    except Exception:
+        return answers
+
+    # иногда модель заворачивает ответ в {"labels": {...}} / {"results": {...}}
+    if isinstance(data, dict) and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            data = inner
+    if not isinstance(data, dict):
+        return answers
+
+    for i in range(count):
+        val = data.get(str(i + 1))
+        if isinstance(val, (str, int, float)) and not isinstance(val, bool):
+            val = str(val).strip()
+            if val:
+                answers[i] = val
+    return answers
+
+
+# ---------- локальный пре-классификатор (до GPT) ----------
+
+# письменности, которые однозначно "не английские буквы"
+_NON_LATIN_SCRIPTS = {
+    "CYRILLIC", "GREEK", "ARABIC", "HEBREW", "ARMENIAN", "GEORGIAN",
+    "CJK", "HIRAGANA", "KATAKANA", "HANGUL", "BOPOMOFO",
+    "DEVANAGARI", "BENGALI", "GURMUKHI", "GUJARATI", "ORIYA", "TAMIL",
+    "TELUGU", "KANNADA", "MALAYALAM", "SINHALA", "THAI", "LAO",
+    "MYANMAR", "KHMER", "TIBETAN", "ETHIOPIC", "SYRIAC", "THAANA",
+}
+
+# все не-ASCII буквы (без цифр и "_")
+_NON_ASCII_LETTER_RE = re.compile(r"[^\W\d_]", re.UNICODE)
+
+# кэш: буква -> "latin" / "non_latin" / "other"
+_char_class_cache = {}
+
+
+def _char_class(ch):
+    cls = _char_class_cache.get(ch)
+    if cls is None:
+        name = unicodedata.name(ch, "")
+        script = name.split(" ", 1)[0] if name else ""
+        if script == "LATIN":
+            cls = "latin"
+        elif script in _NON_LATIN_SCRIPTS:
+            cls = "non_latin"
+        else:
+            cls = "other"
+        _char_class_cache[ch] = cls
+    return cls
+
+
+def preclassify_script(texts, yes="Y", no="N"):
+    """
+    Правило дефолтного gpt_prompt ("англ. или пусто -> Y, есть не-английские
+    буквы -> N") проверяется по Unicode-письменности без GPT.
+
+    На вход — сразу вся пачка текстов, на выход — список той же длины:
+    - yes — пусто / нет букв / все буквы ASCII;
+    - no  — есть буквы явно не-латинских письменностей (кириллица, CJK, ...);
+    - None — спорно (латиница с диакритикой, стилизованные символы и т.п.),
+      такие тексты уходят в GPT.
+    """
+    verdicts = [None] * len(texts)
+    non_ascii = []
+    for i, text in enumerate(texts):
+        text = "" if text is None else str(text)
+        # быстрый путь: str.isascii() проверяет всю строку разом
+        if text.isascii():
+            verdicts[i] = yes
+        else:
+            non_ascii.append(i)
+
+    for i in non_ascii:
+        letters = set(_NON_ASCII_LETTER_RE.findall(str(texts[i])))
+        classes = {_char_class(ch) for ch in letters if not ch.isascii()}
+        if not classes:
+            verdicts[i] = yes  # только эмодзи/символы/цифры
+        elif "non_latin" in classes:
+            verdicts[i] = no
+    return verdicts
+
+
+PRECLASSIFIERS = {
+    "script": preclassify_script,
+}
+
+
+def get_preclassifier(settings, key="gpt_preclassifier"):
+    """
+    Пре-классификатор по имени из Settings (off / script).
+    Включать только если gpt_prompt — это правило про английский/не-английский.
+    """
+    name = (settings.get(key, "off") or "off").strip().lower()
+    return PRECLASSIFIERS.get(name)
@@ -0,0 +1,138 @@
+"""
+Общий HTTP-клиент для Bright Data и OpenAI.
+
+Один requests.Session на процесс: urllib3 держит пул соединений на
+каждый хост (keep-alive), так что тысячи call_gpt_label и секундные
+опросы get_snapshot_status не открывают каждый раз новый TCP + TLS.
+Ответы в gzip распаковываются автоматически (в т.ч. при stream=True).
+
+Размер пула настраивается через configure() — раннеры берут его из
+config.json (HTTP_POOL_HOSTS / HTTP_POOL_MAXSIZE).
+
+Все запросы идут через resilience.call_with_retry (повторы 429/5xx,
+Retry-After, circuit breaker на хост).
+"""
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import resilience
+
+
+DEFAULT_POOL_HOSTS = 4      # сколько хостов держим в кэше пулов
+DEFAULT_POOL_MAXSIZE = 16   # соединений на один хост (>= gpt_concurrency)
+
+_session = None
+_session_lock = threading.Lock()
+_pool_hosts = DEFAULT_POOL_HOSTS
+_pool_maxsize = DEFAULT_POOL_MAXSIZE
+
+
+def configure(pool_hosts=None, pool_maxsize=None):
+    """Меняет размеры пула. Действует на сессию, созданную после вызова."""
+    global _pool_hosts, _pool_maxsize, _session
+    with _session_lock:
+        if pool_hosts:
+            _pool_hosts = max(1, int(pool_hosts))
+        if pool_maxsize:
+            _pool_maxsize = max(1, int(pool_maxsize))
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _build_session():
+    session = requests.Session()
+    # pool_block=False: если все соединения заняты, открываем временное
+    # лишнее, а не ждём (чтобы не зависнуть при gpt_concurrency > pool_maxsize)
+    adapter = HTTPAdapter(
+        pool_connections=_pool_hosts,
+        pool_maxsize=_pool_maxsize,
+        pool_block=False,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _classify(idempotent):
+    """
+    Не-идемпотентный запрос (POST trigger Bright Data, загрузка файла и
+    создание batch в OpenAI) повторяем, только если сервер его точно не
+    выполнял: 429 и 503 с Retry-After. 500 / 502 / 504 и обрыв после
+    отправки — FAIL: повтор мог бы запустить второй (платный) скрейп / batch.
+    """
+    def classify(resp, exc):
+        if exc is not None:
+            # ConnectTimeout — запрос точно не дошёл до сервера, его можно повторить всегда
+            if isinstance(exc, requests.exceptions.ConnectTimeout):
+                return resilience.RETRY, None
+            if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                return (resilience.RETRY if idempotent else resilience.FAIL), None
+            return resilience.FAIL, None
+        retry_after = resilience.retry_after_from_headers(resp.headers)
+        if resp.status_code == 429:
+            return resilience.THROTTLED, retry_after
+        if resp.status_code in resilience.RETRY_STATUSES:
+            if idempotent or (resp.status_code == 503 and retry_after is not None):
+                return resilience.RETRY, retry_after
+            return resilience.FAIL, None
+        return resilience.OK, None
+    return classify
+
+
+def _rewind_files(kwargs):
+    """Перед повтором multipart-загрузки перематываем файлы в начало."""
+    for value in (kwargs.get("files") or {}).values():
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+
+
+def request(method, url, idempotent=None, **kwargs):
+    """
+    requests-запрос через общую сессию с повторами и circuit breaker по хосту.
+    idempotent — можно ли повторять запрос, который мог дойти до сервера
+    (по умолчанию только GET / HEAD; POST без побочных эффектов, например
+    chat/completions, передаёт idempotent=True).
+    """
+    if idempotent is None:
+        idempotent = method in ("GET", "HEAD")
+
+    def send():
+        _rewind_files(kwargs)
+        return get_session().request(method, url, **kwargs)
+
+    return resilience.call_with_retry(
+        urlsplit(url).hostname or url,
+        send,
+        _classify(idempotent),
+    )
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def close():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,149 @@
+"""
+Write-behind буфер для точечной записи ячеек в Google Sheets.
+
+Вместо того чтобы после каждой строки заливать всю колонку целиком,
+запоминаем только изменённые ячейки и раз в N строк / T секунд
+отправляем их одним values.batchUpdate (соседние строки склеиваем
+в один диапазон).
+"""
+import atexit
+import time
+
+
+DEFAULT_FLUSH_ROWS = 25
+DEFAULT_FLUSH_SEC = 15
+
+
+def parse_flush_settings(settings):
+    """gpt_flush_rows / gpt_flush_sec из Settings."""
+    try:
+        flush_rows = max(1, int(settings.get("gpt_flush_rows", str(DEFAULT_FLUSH_ROWS))))
+    except Exception:
+        flush_rows = DEFAULT_FLUSH_ROWS
+    try:
+        flush_sec = max(0.0, float(settings.get("gpt_flush_sec", str(DEFAULT_FLUSH_SEC))))
+    except Exception:
+        flush_sec = DEFAULT_FLUSH_SEC
+    return flush_rows, flush_sec
+
+
+def coalesce_rows(row_numbers):
+    """
+    [2, 3, 4, 7, 9, 10] -> [(2, 4), (7, 7), (9, 10)]
+    row_numbers — 1-based номера строк листа.
+    """
+    ranges = []
+    for n in sorted(row_numbers):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return [(a, b) for a, b in ranges]
+
+
+class LabelWriteBuffer:
+    """
+    Буфер изменённых ячеек одного листа.
+
+    set(row_idx, value) — row_idx 0-based индекс в rows (без заголовка),
+    т.е. строка листа = first_row + row_idx.
+
+    Если flush упал — ячейки остаются в буфере и уйдут следующим flush.
+    При выходе из процесса буфер сбрасывается ещё раз (atexit).
+
+    on_flush(cells) — вызывается после успешной записи с
+    {(col_letter, row_number): value} (например, чтобы обновить зеркало листа).
+    """
+
+    def __init__(
+        self,
+        service,
+        spreadsheet_id,
+        sheet_name,
+        col_letter,
+        flush_rows=DEFAULT_FLUSH_ROWS,
+        flush_sec=DEFAULT_FLUSH_SEC,
+        first_row=2,
+        on_flush=None,
+    ):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.col_letter = col_letter
+        self.flush_rows = flush_rows
+        self.flush_sec = flush_sec
+        self.first_row = first_row
+        self.on_flush = on_flush
+
+        self._pending = {}  # {(col_letter, row_number): value}
+        self._last_flush = time.monotonic()
+        self.cells_sent = 0
+        self.flushes = 0
+
+        atexit.register(self.flush)
+
+    def set(self, row_idx, value, col_letter=None):
+        col = col_letter or self.col_letter
+        self._pending[(col, self.first_row + row_idx)] = value
+
+        if len(self._pending) >= self.flush_rows:
+            self.flush()
+        elif self.flush_sec and time.monotonic() - self._last_flush >= self.flush_sec:
+            self.flush()
+
+    def _build_data(self):
+        by_col = {}
+        for (col, row_num), value in self._pending.items():
+            by_col.setdefault(col, {})[row_num] = value
+
+        data = []
+        for col in sorted(by_col):
+            cells = by_col[col]
+            for start, end in coalesce_rows(cells.keys()):
+                data.append(
+                    {
+                        "range": f"{self.sheet_name}!{col}{start}:{col}{end}",
+                        "values": [[cells[n]] for n in range(start, end + 1)],
+                    }
+                )
+        return data
+
+    def flush(self):
+        """True — буфер пуст (всё ушло), False — запись упала, ячейки остались."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return True
+
+        data = self._build_data()
+        sent = dict(self._pending)
+        try:
+            self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"valueInputOption": "USER_ENTERED", "data": data},
+            ).execute()
+        except Exception as e:
+            print("LabelWriteBuffer flush error:", repr(e))
+            return False
+
+        # снимаем только то, что реально ушло (и не перезаписано заново)
+        for key, value in sent.items():
+            if self._pending.get(key) == value:
+                del self._pending[key]
+        self.cells_sent += len(sent)
+        self.flushes += 1
+        if self.on_flush is not None:
+            try:
+                self.on_flush(sent)
+            except Exception as e:
+                print("LabelWriteBuffer on_flush error:", repr(e))
+        return not self._pending
+
+    def close(self):
+        """
+        Сбрасывает буфер. Если запись не удалась, atexit не снимаем —
+        оставшиеся ячейки попробуем записать ещё раз при выходе.
+        """
+        if self.flush():
+            atexit.unregister(self.flush)
+        else:
+            print(f"LabelWriteBuffer: не записано ячеек: {len(self._pending)}, повторим при выходе")
@@ -0,0 +1,115 @@
+"""
+Буферизованная запись в лист Logs.
+
+Шапку Logs проверяем один раз на процесс, строки копим в памяти и
+отправляем одним values.append — по размеру буфера / по времени,
+в конце кластера (flush) и при выходе из процесса (atexit).
+
+Если Sheets недоступен, неотправленные строки остаются в буфере, но не
+больше max_rows: самые старые выбрасываются и считаются в dropped.
+"""
+import atexit
+import threading
+import time
+
+import sheets_quota
+
+
+LOGS_HEADER = ["timestamp", "action", "cluster_name", "details"]
+
+DEFAULT_LOG_FLUSH_ROWS = 20
+DEFAULT_LOG_FLUSH_SEC = 30
+DEFAULT_LOG_MAX_ROWS = 1000
+
+
+class LogSink:
+    def __init__(
+        self,
+        spreadsheet_id,
+        sheet_name,
+        flush_rows=DEFAULT_LOG_FLUSH_ROWS,
+        flush_sec=DEFAULT_LOG_FLUSH_SEC,
+        max_rows=DEFAULT_LOG_MAX_ROWS,
+    ):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.flush_rows = flush_rows
+        self.flush_sec = flush_sec
+        self.max_rows = max_rows
+        self.dropped = 0
+
+        self.service = None
+        self._rows = []
+        self._header_checked = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+        atexit.register(self.flush)
+
+    def add(self, service, row):
+        with self._lock:
+            self.service = service
+            self._rows.append(row)
+            self._trim_locked()
+            due = len(self._rows) >= self.flush_rows or (
+                self.flush_sec and time.monotonic() - self._last_flush >= self.flush_sec
+            )
+        if due:
+            self.flush()
+
+    def _trim_locked(self):
+        """Оставляет в буфере не больше max_rows последних строк. Вызывать под _lock."""
+        extra = len(self._rows) - self.max_rows
+        if self.max_rows <= 0 or extra <= 0:
+            return
+        del self._rows[:extra]
+        self.dropped += extra
+        print(f"LOG: буфер переполнен, выброшено старых строк: {extra} (всего {self.dropped})")
+
+    def _ensure_header(self, sheet):
+        if self._header_checked:
+            return
+        try:
+            resp = sheet.values().get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{self.sheet_name}!A1:D1",
+            ).execute()
+            if not resp.get("values", []):
+                sheet.values().update(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{self.sheet_name}!A1",
+                    valueInputOption="RAW",
+                    body={"values": [LOGS_HEADER]},
+                ).execute()
+            self._header_checked = True
+        except Exception as e:
+            print("LOG: error while ensuring header:", e)
+
+    def flush(self):
+        # под замком только забираем буфер: сетевой запрос не держит add()
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._rows or self.service is None:
+                return
+            rows = self._rows
+            self._rows = []
+            service = self.service
+
+        sheet = service.spreadsheets()
+        # логи уступают квоту Sheets записям данных (см. sheets_quota.py)
+        with sheets_quota.priority(sheets_quota.PRIORITY_LOGS):
+            self._ensure_header(sheet)
+            try:
+                sheet.values().append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{self.sheet_name}!A1",
+                    valueInputOption="RAW",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": rows},
+                ).execute()
+            except Exception as e:
+                # не теряем строки: уйдут со следующим flush (в пределах max_rows)
+                print("LOG: append error:", repr(e))
+                with self._lock:
+                    self._rows = rows + self._rows
+                    self._trim_locked()
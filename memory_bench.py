@@ -0,0 +1,185 @@
+"""
+Замер памяти: лист TikTok_Posts в памяти раннера — списки строк против RowStore.
+
+    python3 memory_bench.py [строк, по умолчанию 150000]
+
+Лист генерируется синтетически (url уникальны, ~6 видео на профиль, одно
+био на профиль, batch на 3000 строк, ~90% строк размечены), ответы Sheets
+проходят через json, как настоящие: каждая ячейка — новый объект str.
+Сравниваются три представления:
+
+- rows A:H     — весь лист одним values.get + выравнивание строк по шапке
+                 (как было до чтения нужных колонок);
+- rows proj    — строки-списки только с нужными колонками (как было до RowStore);
+- RowStore     — load_projected_rows: по колонкам, повторы интернированы.
+
+Для каждого: сколько памяти занято после чтения (retained), пик во время
+чтения (tracemalloc), время чтения и время дедупа + выборки неразмеченных
++ группировки по профилю. Сеть и config.json не нужны.
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from gpt_labeler import group_by_column, group_rows_by_key
+from sheet_reader import iter_sheet_columns, load_projected_rows
+
+
+HEADER = [
+    "url",
+    "play_count",
+    "hashtags",
+    "profile_url",
+    "profile_followers",
+    "profile_biography",
+    "batch",
+    "gpt_flag",
+]
+COLUMNS = ["url", "profile_url", "profile_biography", "gpt_flag"]
+INTERN_COLUMNS = ["profile_url", "profile_biography", "gpt_flag"]
+CHUNK_ROWS = 5000
+
+
+def make_sheet(n_rows):
+    """Синтетический TikTok_Posts: список колонок (как majorDimension=COLUMNS)."""
+    cols = [[] for _ in HEADER]
+    for i in range(n_rows):
+        profile = i // 6
+        row = [
+            f"https://www.tiktok.com/@creator{profile}/video/{7300000000000000000 + i}",
+            1000 + i * 7 % 100000,
+            '["fyp", "beauty", "skincare", "grwm"]',
+            f"https://www.tiktok.com/@creator{profile}",
+            10000 + profile % 50000,
+            f"creator {profile} | skincare & makeup tips | collabs: creator{profile}@mail.com",
+            f"2025-11-{1 + i // 3000 % 28:02d} 10:00 | TikTok | cluster_{i // 3000}",
+            "" if i % 10 == 0 else ("Y" if profile % 3 else "N"),
+        ]
+        for c, v in zip(cols, row):
+            c.append(v)
+    return cols
+
+
+class FakeSheets:
+    """Отвечает на values.get / values.batchGet / spreadsheets.get, как Sheets, через json."""
+
+    def __init__(self, cols):
+        self.cols = cols
+        self.n_rows = len(cols[0])
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def _respond(self, payload):
+        return _Resp(json.loads(json.dumps(payload)))
+
+    def get(self, spreadsheetId, **kw):
+        if "range" not in kw:
+            props = {"title": "TikTok_Posts", "gridProperties": {"rowCount": self.n_rows + 1}}
+            return self._respond({"sheets": [{"properties": props}]})
+        rows = [HEADER] + [[str(c[i]) for c in self.cols] for i in range(self.n_rows)]
+        return self._respond({"values": rows})
+
+    def batchGet(self, spreadsheetId, ranges, **_kw):
+        out = []
+        for rng in ranges:
+            cell_from, cell_to = rng.split("!")[1].split(":")
+            idx = ord(cell_from[0]) - 65
+            start, end = int(cell_from[1:]) - 2, int(cell_to[1:]) - 1
+            out.append({"values": [self.cols[idx][start:end]]})
+        return self._respond({"valueRanges": out})
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return self.data
+
+
+def load_full_rows(service):
+    resp = service.spreadsheets().values().get(spreadsheetId="bench", range="TikTok_Posts!A1:H").execute()
+    rows = resp.get("values", [])[1:]
+    for i, r in enumerate(rows):
+        if len(r) < len(HEADER):
+            rows[i] = r + [""] * (len(HEADER) - len(r))
+    return rows
+
+
+def load_projected_lists(service):
+    """Прежний load_projected_rows: строка-список на каждую строку листа."""
+    idxs = sorted(HEADER.index(c) for c in COLUMNS)
+    letters = [chr(65 + i) for i in idxs]
+    rows = []
+    for _row_num, values in iter_sheet_columns(
+        service, "bench", "TikTok_Posts", letters, chunk_rows=CHUNK_ROWS
+    ):
+        r = [""] * len(HEADER)
+        for idx, val in zip(idxs, values):
+            r[idx] = val
+        rows.append(r)
+    return rows
+
+
+def load_row_store(service):
+    return load_projected_rows(
+        service, "bench", "TikTok_Posts", HEADER, COLUMNS,
+        chunk_rows=CHUNK_ROWS, intern_columns=INTERN_COLUMNS,
+    )
+
+
+def scan_lists(rows):
+    label_idx = HEADER.index("gpt_flag")
+    urls = {r[0].strip() for r in rows}
+    pending = [i for i, r in enumerate(rows) if not (r[label_idx] or "").strip()]
+    groups = group_rows_by_key(rows, pending, HEADER.index("profile_url"))
+    return len(urls), len(pending), len(groups)
+
+
+def scan_store(store):
+    urls = {u.strip() for u in store.column("url")}
+    pending = [i for i, v in enumerate(store.column("gpt_flag")) if not (v or "").strip()]
+    groups = group_by_column(store.column("profile_url"), pending)
+    return len(urls), len(pending), len(groups)
+
+
+def measure(name, load, scan, service):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    data = load(service)
+    load_sec = time.perf_counter() - started
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    counts = scan(data)
+    scan_sec = time.perf_counter() - started
+
+    print(
+        f"{name:<10} {retained / 2**20:>10.1f} {peak / 2**20:>10.1f} "
+        f"{load_sec:>9.2f} {scan_sec:>9.3f}   urls={counts[0]} pending={counts[1]} profiles={counts[2]}"
+    )
+    del data
+    gc.collect()
+
+
+def main(n_rows):
+    service = FakeSheets(make_sheet(n_rows))
+    print(f"TikTok_Posts: {n_rows} строк x {len(HEADER)} колонок")
+    print(f"{'':<10} {'retained':>10} {'peak':>10} {'read, s':>9} {'scan, s':>9}")
+    print(f"{'':<10} {'MB':>10} {'MB':>10}")
+    measure("rows A:H", load_full_rows, scan_lists, service)
+    measure("rows proj", load_projected_lists, scan_lists, service)
+    measure("RowStore", load_row_store, scan_store, service)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 150_000)
@@ -0,0 +1,231 @@
+"""
+Локальное зеркало листа TikTok_Posts в SQLite (включается POSTS_MIRROR_PATH).
+
+Храним по каждой строке листа только то, что нужно до GPT:
+номер строки, url (с индексом), batch и метку (gpt_flag).
+
+- первый запуск (или файл от другой таблицы / старше rebuild_hours) —
+  читаем лист целиком один раз;
+- дальше sync() читает только хвост листа, начиная с последней известной
+  строки (её url сверяем — если лист пересортировали/почистили, строим заново),
+  так что строки, дописанные другим ботом (TikTok / YouTube), тоже подхватываются;
+- свои дописанные строки и записанные метки раннеры сообщают сами
+  (append_rows / on_cells_written), без повторного чтения листа.
+
+Дедуп идёт через url_set() (SELECT по индексу), а first_pending_row()
+подсказывает, с какой строки вообще нужно читать лист для GPT.
+"""
+import sqlite3
+import threading
+import time
+
+from sheet_reader import iter_sheet_columns
+
+
+DEFAULT_REBUILD_HOURS = 24
+
+URL_IDX = 0
+BATCH_IDX = 6
+LABEL_IDX = 7
+LABEL_COL_LETTER = "H"
+# из листа читаем только эти колонки: url, batch, gpt_flag
+MIRROR_COLUMNS = ["A", "G", "H"]
+
+def _cell(row, idx):
+    if idx < len(row):
+        return str(row[idx] or "").strip()
+    return ""
+
+
+class MirrorUrlSet:
+    """
+    Заменяет set() уже известных url: `url in s` — запрос по индексу,
+    s.add(url) — запоминаем в памяти до записи строк в зеркало.
+    """
+
+    def __init__(self, mirror):
+        self.mirror = mirror
+        self._added = set()
+
+    def __contains__(self, url):
+        return url in self._added or self.mirror.has_url(url)
+
+    def add(self, url):
+        self._added.add(url)
+
+
+class PostsMirror:
+    def __init__(self, path, spreadsheet_id, sheet_name, rebuild_hours=DEFAULT_REBUILD_HOURS):
+        self.path = path
+        self.sheet_key = f"{spreadsheet_id}|{sheet_name}"
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.rebuild_hours = rebuild_hours
+        self.rows_read = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            " row_num INTEGER PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " batch TEXT NOT NULL,"
+            " label TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS posts_url ON posts(url)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS posts_label ON posts(label)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    # ---------- meta ----------
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    # ---------- синхронизация с листом ----------
+
+    def _read_sheet(self, service, start_row):
+        """[(row_num, url, batch, label), ...] со строки start_row до конца листа."""
+        values = [
+            (row_num, url.strip(), batch.strip(), label.strip())
+            for row_num, (url, batch, label) in iter_sheet_columns(
+                service,
+                self.spreadsheet_id,
+                self.sheet_name,
+                MIRROR_COLUMNS,
+                start_row=start_row,
+                ask_row_count=False,
+            )
+        ]
+        self.rows_read += len(values)
+        return values
+
+    def _upsert_records(self, records):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO posts (row_num, url, batch, label) VALUES (?, ?, ?, ?)",
+            records,
+        )
+
+    def _upsert(self, start_row, rows):
+        """rows — полные строки листа (A..H), как их дописывает бот."""
+        self._upsert_records(
+            [
+                (start_row + i, _cell(r, URL_IDX), _cell(r, BATCH_IDX), _cell(r, LABEL_IDX))
+                for i, r in enumerate(rows)
+            ]
+        )
+
+    def _needs_rebuild(self):
+        if self._get_meta("sheet_key") != self.sheet_key:
+            return True
+        built = float(self._get_meta("built_at") or 0)
+        if self.rebuild_hours and time.time() - built > self.rebuild_hours * 3600:
+            return True
+        return self.last_row() < 2
+
+    def _rebuild(self, service):
+        values = self._read_sheet(service, 2)
+        self._conn.execute("DELETE FROM posts")
+        self._upsert_records(values)
+        self._set_meta("sheet_key", self.sheet_key)
+        self._set_meta("built_at", time.time())
+        self._conn.commit()
+        print(f"[MIRROR] {self.sheet_name}: зеркало построено заново, строк={len(values)}")
+
+    def sync(self, service):
+        """Догоняет лист: читает только строки после последней известной."""
+        with self._lock:
+            if self._needs_rebuild():
+                self._rebuild(service)
+                return
+
+            last = self.last_row()
+            values = self._read_sheet(service, last)
+            known = self._conn.execute(
+                "SELECT url FROM posts WHERE row_num = ?", (last,)
+            ).fetchone()
+            first_url = values[0][1] if values else ""
+            if not known or known[0] != first_url:
+                print("[MIRROR] последняя известная строка не совпала с листом — строим заново")
+                self._rebuild(service)
+                return
+
+            self._upsert_records(values)
+            self._conn.commit()
+            if len(values) > 1:
+                print(f"[MIRROR] {self.sheet_name}: подтянуто новых строк={len(values) - 1}")
+
+    def invalidate(self):
+        """Следующий sync() перечитает лист целиком (например, после overwrite меток)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM posts")
+            self._conn.commit()
+
+    # ---------- запросы ----------
+
+    def last_row(self):
+        (row_num,) = self._conn.execute("SELECT MAX(row_num) FROM posts").fetchone()
+        return row_num or 1
+
+    def has_url(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM posts WHERE url = ? LIMIT 1", (url,)
+            ).fetchone()
+        return row is not None
+
+    def url_set(self):
+        return MirrorUrlSet(self)
+
+    def first_pending_row(self):
+        """Первая строка листа с пустой меткой (None — всё размечено)."""
+        with self._lock:
+            (row_num,) = self._conn.execute(
+                "SELECT MIN(row_num) FROM posts WHERE label = ''"
+            ).fetchone()
+        return row_num
+
+    def stats_text(self):
+        with self._lock:
+            (total,) = self._conn.execute("SELECT COUNT(*) FROM posts").fetchone()
+            (pending,) = self._conn.execute(
+                "SELECT COUNT(*) FROM posts WHERE label = ''"
+            ).fetchone()
+        return f"rows={total} pending_labels={pending} rows_read={self.rows_read}"
+
+    # ---------- изменения, сделанные самим ботом ----------
+
+    def append_rows(self, rows):
+        """
+        Строки, дописанные ботом в конец листа (appendCells не сообщает,
+        куда они легли): кладём сразу после последней известной строки.
+        Если кто-то дописал лист параллельно, следующий sync() заметит
+        расхождение по url и перестроит зеркало.
+        """
+        if not rows:
+            return
+        with self._lock:
+            self._upsert(self.last_row() + 1, rows)
+            self._conn.commit()
+
+    def on_cells_written(self, cells):
+        """Колбэк LabelWriteBuffer: {(col_letter, row_number): value} — обновляем метки."""
+        labels = [
+            (str(value or "").strip(), row_num)
+            for (col, row_num), value in cells.items()
+            if col == LABEL_COL_LETTER
+        ]
+        if not labels:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE posts SET label = ? WHERE row_num = ?", labels)
+            self._conn.commit()
@@ -0,0 +1,253 @@
+"""
+Повторы, backoff и circuit breaker для внешних вызовов (Bright Data, OpenAI, Sheets).
+
+Раньше один 429/5xx от OpenAI превращался в пустую метку (строка ждала
+следующего прохода), а временная ошибка Bright Data роняла весь кластер.
+Теперь http_client и sheets_quota отправляют запросы через call_with_retry():
+
+- повторяем 429 / 5xx и сетевые ошибки (для не-идемпотентных запросов —
+  только те, что точно не дошли до сервера), до RETRY_MAX_ATTEMPTS раз;
+- пауза: Retry-After / retry-after-ms / x-ratelimit-reset-* из ответа,
+  иначе экспонента с разбросом (RETRY_BASE_SEC * 2^n, не больше RETRY_MAX_SEC);
+- на каждый upstream (хост) свой circuit breaker: после
+  CIRCUIT_FAIL_THRESHOLD неудач подряд (5xx / сеть; 429 не считаем) вызовы CIRCUIT_COOLDOWN_SEC сразу
+  падают с CircuitOpenError, потом пропускаем один пробный запрос;
+- счётчики повторов / срабатываний — stats_text().
+"""
+import email.utils
+import random
+import re
+import threading
+import time
+
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_SEC = 1.0
+DEFAULT_MAX_SEC = 60.0
+DEFAULT_FAIL_THRESHOLD = 5
+DEFAULT_COOLDOWN_SEC = 120.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# вердикты classify() в call_with_retry
+OK = "ok"
+RETRY = "retry"
+THROTTLED = "throttled"   # 429: повторяем, но upstream жив — для breaker это ответ, не ошибка
+FAIL = "fail"
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        base_sec=DEFAULT_BASE_SEC,
+        max_sec=DEFAULT_MAX_SEC,
+    ):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_sec = max(0.0, float(base_sec))
+        self.max_sec = max(self.base_sec, float(max_sec))
+
+    def backoff(self, attempt):
+        """Пауза перед повтором номер attempt (1, 2, ...): full jitter."""
+        return random.uniform(0, min(self.max_sec, self.base_sec * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    def __init__(self, name, fail_threshold=DEFAULT_FAIL_THRESHOLD, cooldown_sec=DEFAULT_COOLDOWN_SEC):
+        self.name = name
+        self.fail_threshold = max(1, int(fail_threshold))
+        self.cooldown_sec = float(cooldown_sec)
+
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.retries = 0
+        self.trips = 0
+        self.short_circuits = 0
+
+    def before_call(self):
+        with self._lock:
+            self.calls += 1
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown_sec or self.half_open:
+                self.short_circuits += 1
+                raise CircuitOpenError(f"{self.name}: circuit open после {self.failures} ошибок подряд")
+            # cooldown прошёл — пропускаем один пробный запрос
+            self.half_open = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.half_open = False
+
+    def record_failure(self):
+        """Возвращает True, если после этой ошибки цепь открыта."""
+        with self._lock:
+            self.failures += 1
+            if self.half_open or self.failures >= self.fail_threshold:
+                if self.opened_at is None or self.half_open:
+                    self.trips += 1
+                    print(f"[CIRCUIT] {self.name}: открыт на {int(self.cooldown_sec)} сек (ошибок подряд: {self.failures})")
+                self.opened_at = time.monotonic()
+                self.half_open = False
+            return self.opened_at is not None
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def stats_text(self):
+        state = "open" if self.opened_at is not None else "closed"
+        return (
+            f"{self.name}: calls={self.calls} retries={self.retries} "
+            f"trips={self.trips} short_circuits={self.short_circuits} state={state}"
+        )
+
+
+_policy = RetryPolicy()
+_breaker_settings = (DEFAULT_FAIL_THRESHOLD, DEFAULT_COOLDOWN_SEC)
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def configure(
+    max_attempts=None,
+    base_sec=None,
+    max_sec=None,
+    fail_threshold=None,
+    cooldown_sec=None,
+):
+    """Параметры повторов и circuit breaker (раннеры берут их из config.json)."""
+    global _policy, _breaker_settings
+    _policy = RetryPolicy(
+        max_attempts or DEFAULT_MAX_ATTEMPTS,
+        DEFAULT_BASE_SEC if base_sec is None else base_sec,
+        max_sec or DEFAULT_MAX_SEC,
+    )
+    _breaker_settings = (fail_threshold or DEFAULT_FAIL_THRESHOLD, cooldown_sec or DEFAULT_COOLDOWN_SEC)
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_breaker(upstream):
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = CircuitBreaker(upstream, *_breaker_settings)
+            _breakers[upstream] = breaker
+        return breaker
+
+
+def stats_text():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return " | ".join(b.stats_text() for b in breakers)
+
+
+# ---------- подсказки сервера о паузе ----------
+
+def _parse_duration(value):
+    """'1s' / '6m0s' / '120ms' / '2.5' -> секунды (или None)."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in parts)
+
+
+def retry_after_from_headers(headers):
+    """Сколько сервер просит подождать (секунды) или None."""
+    if not headers:
+        return None
+    lower = {str(k).lower(): v for k, v in headers.items()}
+
+    if lower.get("retry-after-ms"):
+        try:
+            return float(lower["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+
+    value = lower.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                dt = email.utils.parsedate_to_datetime(value)
+                return max(0.0, dt.timestamp() - time.time())
+            except Exception:
+                pass
+
+    resets = [
+        _parse_duration(lower.get(h))
+        for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "x-ratelimit-reset")
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+# ---------- основной цикл ----------
+
+def call_with_retry(upstream, send, classify, policy=None):
+    """
+    send() -> результат (или исключение).
+    classify(result, exc) -> (verdict, пауза_от_сервера_или_None), verdict:
+        OK        — upstream ответил (в т.ч. 4xx), отдаём как есть;
+        RETRY     — временная ошибка, повторяем;
+        THROTTLED — 429, повторяем; для circuit breaker это ответ (upstream жив);
+        FAIL      — ошибка, которую повторять нельзя (например, таймаут POST).
+
+    Если повторы кончились — возвращаем последний результат / бросаем
+    последнее исключение, как без повторов (вызывающий код решает, что делать).
+    """
+    policy = policy or _policy
+    breaker = get_breaker(upstream)
+    breaker.before_call()
+
+    attempt = 0
+    while True:
+        attempt += 1
+        result, exc = None, None
+        try:
+            result = send()
+        except Exception as e:
+            exc = e
+
+        verdict, server_delay = classify(result, exc)
+        if verdict in (OK, THROTTLED):
+            # любой ответ upstream (и 429 тоже) закрывает цепь: иначе 429 на
+            # пробном запросе оставлял бы half_open навсегда
+            breaker.record_success()
+        if verdict != OK:
+            opened = breaker.record_failure() if verdict != THROTTLED else False
+            delay = server_delay if server_delay is not None else policy.backoff(attempt)
+            retryable = verdict in (RETRY, THROTTLED)
+            # сервер просит ждать дольше, чем мы готовы, — не тратим время прогона
+            if retryable and not opened and attempt < policy.max_attempts and delay <= policy.max_sec:
+                breaker.record_retry()
+                if result is not None and hasattr(result, "close"):
+                    result.close()
+                time.sleep(delay)
+                continue
+
+        if exc is not None:
+            raise exc
+        return result
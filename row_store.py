@@ -0,0 +1,173 @@
+"""
+Строки листа данных (TikTok_Posts) в памяти по колонкам.
+
+Раньше append_cluster_posts / apply_gpt_labels держали лист как список
+строк-списков: на 150k строк — 150k списков по 8 ячеек, а одинаковые
+profile_url / био / batch каждой строки — отдельные объекты str (Sheets
+присылает их заново в каждом ответе), плюс выравнивание каждой строки
+по шапке копией (r + [""] * ...).
+
+RowStore хранит на каждую нужную колонку один список значений:
+- колонки, которых нет в store, всегда "" (как у load_projected_rows);
+- повторяющиеся значения колонок из intern_columns (profile_url, био,
+  batch, метки) хранятся одним объектом на значение;
+- column(idx) отдаёт сам список колонки без копирования — по нему
+  строятся дедуп (url) и выборка неразмеченных строк (метка), запись
+  метки — set(row_idx, idx, value);
+- rows[i] / for r in rows дают RowView (r[idx], r[idx] = value) для кода,
+  который ходит по строкам.
+"""
+
+
+class RowView:
+    """Строка RowStore без копирования: r[idx] читает / пишет ячейку колонки."""
+
+    __slots__ = ("_store", "_row_idx")
+
+    def __init__(self, store, row_idx):
+        self._store = store
+        self._row_idx = row_idx
+
+    def __len__(self):
+        return self._store.width
+
+    def __getitem__(self, col_idx):
+        return self._store.get(self._row_idx, col_idx)
+
+    def __setitem__(self, col_idx, value):
+        self._store.set(self._row_idx, col_idx, value)
+
+    def to_list(self):
+        return [self._store.get(self._row_idx, i) for i in range(self._store.width)]
+
+
+class RowStore:
+    def __init__(self, header, columns=None, intern_columns=()):
+        """
+        header — шапка листа; columns — какие колонки хранить (названия или
+        индексы, None — все); intern_columns — колонки с повторами.
+        """
+        self.header = list(header)
+        self.width = len(self.header)
+        self._len = 0
+        self._cols = {}
+        self._pools = {}
+        idxs = range(self.width) if columns is None else [self._idx(c) for c in columns]
+        for idx in idxs:
+            if idx is not None:
+                self._cols[idx] = []
+        for c in intern_columns:
+            idx = self._idx(c)
+            if idx in self._cols:
+                self._pools[idx] = {}
+
+    @classmethod
+    def from_rows(cls, header, rows, columns=None, intern_columns=()):
+        store = cls(header, columns, intern_columns)
+        for r in rows:
+            store.append(r)
+        return store
+
+    def _idx(self, col):
+        if isinstance(col, int):
+            return col if 0 <= col < self.width else None
+        return self.header.index(col) if col in self.header else None
+
+    def _value(self, col_idx, value):
+        if value is None:
+            return ""
+        pool = self._pools.get(col_idx)
+        if pool is None:
+            return value
+        return pool.setdefault(value, value)
+
+    # ---------- размер ----------
+
+    def __len__(self):
+        return self._len
+
+    def truncate(self, length):
+        """Оставляет первые length строк (хвост пустых строк листа)."""
+        if length < self._len:
+            for values in self._cols.values():
+                del values[length:]
+            self._len = length
+
+    # ---------- колонки ----------
+
+    def has_column(self, col):
+        return self._idx(col) in self._cols
+
+    def column(self, col):
+        """
+        Список значений колонки (название или индекс) — сам список store,
+        без копии: его можно читать и менять по индексу, но не по длине.
+        Колонка, которой не было в store, заводится пустой.
+        """
+        idx = self._idx(col)
+        if idx is None:
+            raise KeyError(col)
+        values = self._cols.get(idx)
+        if values is None:
+            values = self._cols[idx] = [""] * self._len
+        return values
+
+    def clear_column(self, col):
+        values = self.column(col)
+        values[:] = [""] * self._len
+
+    def extend_columns(self, col_idxs, columns, count):
+        """
+        Дописывает count строк сразу по колонкам (кусок values.batchGet c
+        majorDimension=COLUMNS): columns[k] — значения колонки col_idxs[k],
+        короткий список добивается "". Остальные колонки store — "".
+        """
+        given = dict(zip(col_idxs, columns))
+        for idx, values in self._cols.items():
+            src = given.get(idx)
+            if src is None:
+                values.extend([""] * count)
+                continue
+            pool = self._pools.get(idx)
+            if pool is None:
+                values.extend(src[:count])
+            else:
+                setdefault = pool.setdefault
+                values.extend(setdefault(v, v) for v in src[:count])
+            if len(src) < count:
+                values.extend([""] * (count - len(src)))
+        self._len += count
+
+    # ---------- строки ----------
+
+    def get(self, row_idx, col_idx):
+        values = self._cols.get(col_idx)
+        if values is None:
+            if not 0 <= col_idx < self.width:
+                raise IndexError(col_idx)
+            return ""
+        return values[row_idx]
+
+    def set(self, row_idx, col_idx, value):
+        values = self._cols.get(col_idx)
+        if values is None:
+            values = self.column(col_idx)
+        values[row_idx] = self._value(col_idx, value)
+
+    def append(self, row):
+        """Строка-список по шапке; значения колонок, которых нет в store, не хранятся."""
+        n = len(row)
+        for idx, values in self._cols.items():
+            values.append(self._value(idx, row[idx]) if idx < n else "")
+        self._len += 1
+
+    def __getitem__(self, row_idx):
+        if row_idx < 0:
+            row_idx += self._len
+        if not 0 <= row_idx < self._len:
+            raise IndexError(row_idx)
+        return RowView(self, row_idx)
+
+    def __iter__(self):
+        for row_idx in range(self._len):
+            yield RowView(self, row_idx)
@@ -0,0 +1,137 @@
+"""
+Журнал этапов кластеров на диске — чтобы упавший запуск продолжить, а не начать заново.
+
+Раньше, если `python3 tiktok_runner.py` по SSH падал или обрывался по
+таймауту после trigger, snapshot_id оставался только в листе Logs:
+следующий запуск заново запускал снапшот (и платил за него) и заново ждал
+всю сборку. Теперь раннер пишет в JSON-файл (CHECKPOINT_PATH) этап
+каждого кластера:
+
+    triggered  -> снапшот запущен (snapshot_id)
+    ready      -> снапшот собран
+    downloaded -> снапшот дочитан до конца
+    appended   -> все строки в листе (rows — сколько строк уже дописали)
+    labeled    -> GPT-разметка прошла
+
+При старте кластера раннер смотрит журнал: снапшот из незавершённого
+запуска, который ещё можно скачать, используется повторно; после
+appended / labeled скачивание пропускается. Запись удаляется, когда
+кластер закрыт (last_cluster_name записан) или снапшот упал.
+Записи старше max_age_hours и записи с другим fingerprint (поменялись
+URL / лимиты кластера) игнорируются.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_MAX_AGE_HOURS = 24
+
+STAGE_TRIGGERED = "triggered"
+STAGE_READY = "ready"
+STAGE_DOWNLOADED = "downloaded"
+STAGE_APPENDED = "appended"
+STAGE_LABELED = "labeled"
+STAGES = [STAGE_TRIGGERED, STAGE_READY, STAGE_DOWNLOADED, STAGE_APPENDED, STAGE_LABELED]
+
+# после этих этапов снапшот больше не нужен
+STAGES_AFTER_APPEND = (STAGE_APPENDED, STAGE_LABELED)
+
+
+def fingerprint(*parts):
+    """Короткий хэш входных данных кластера / input (URL, лимиты, режим)."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def stage_reached(entry, stage):
+    """Дошла ли запись журнала до stage (или дальше)."""
+    if not entry or entry.get("stage") not in STAGES:
+        return False
+    return STAGES.index(entry["stage"]) >= STAGES.index(stage)
+
+
+class CheckpointJournal:
+    """
+    {ключ: {stage, snapshot_id, fingerprint, rows, updated_at, ...}} в JSON-файле.
+    Ключ — имя кластера (YouTube: ещё "кластер#номер input").
+    Пустой path — журнал выключен (get всегда None, запись — no-op).
+    """
+
+    def __init__(self, path, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+        self.path = path
+        self.max_age_sec = max(0, max_age_hours) * 3600
+        self._data = {}
+        self._lock = threading.Lock()
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._data = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("Checkpoint journal read error:", repr(e))
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print("Checkpoint journal write error:", repr(e))
+
+    def get(self, key, fp=None):
+        """Запись незавершённого запуска (копия) или None, если её нет / устарела / другой fingerprint."""
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry:
+                return None
+            expired = self.max_age_sec and time.time() - entry.get("updated_at", 0) > self.max_age_sec
+            if expired or (fp is not None and entry.get("fingerprint") != fp):
+                del self._data[key]
+                self._save()
+                return None
+            return dict(entry)
+
+    def mark(self, key, stage, **fields):
+        """Кластер дошёл до stage; fields (snapshot_id, fingerprint, ...) дописываются в запись."""
+        if not self.path:
+            return
+        with self._lock:
+            entry = self._data.setdefault(key, {"rows": 0})
+            entry.update(fields)
+            entry["stage"] = stage
+            entry["updated_at"] = int(time.time())
+            self._save()
+
+    def add_rows(self, key, count):
+        """count строк кластера ушли в лист (вызывается после commit())."""
+        if not self.path or not count:
+            return
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            entry["rows"] = entry.get("rows", 0) + count
+            entry["updated_at"] = int(time.time())
+            self._save()
+
+    def clear(self, key):
+        """Удаляет запись key и записи его inputs ("key#...")."""
+        if not self.path:
+            return
+        with self._lock:
+            keys = [k for k in self._data if k == key or k.startswith(key + "#")]
+            if not keys:
+                return
+            for k in keys:
+                del self._data[k]
+            self._save()
@@ -0,0 +1,79 @@
+"""
+Холодный старт запуска за два запроса к Sheets.
+
+Раньше каждый запуск (по SSH / cron) начинался с цепочки отдельных
+запросов: values.get Settings, values.get Clusters, values.get шапки
+TikTok_Posts и spreadsheets.get всей таблицы без маски полей ради sheetId.
+
+bootstrap() делает один values.batchGet по всем нужным диапазонам и один
+spreadsheets.get с fields=sheets.properties(...) и складывает результат в
+RunContext. Функции раннеров читают диапазоны через ctx.get_values():
+то, что пришло в bootstrap, берётся из памяти, остальное — обычным values.get.
+"""
+
+
+SHEET_PROPERTIES_FIELDS = "sheets.properties(sheetId,title)"
+
+
+class RunContext:
+    def __init__(self, spreadsheet_id=None):
+        self.spreadsheet_id = spreadsheet_id
+        self.values = {}    # {диапазон как в запросе: [[...], ...]}
+        self.sheets = {}    # {title: properties}
+
+    def put(self, rng, values):
+        self.values[rng] = values
+
+    def get_values(self, service, rng):
+        """Значения диапазона: из bootstrap, если он его читал, иначе values.get."""
+        if rng in self.values:
+            return self.values[rng]
+        resp = service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=rng,
+        ).execute()
+        return resp.get("values", [])
+
+    def sheet_ids(self):
+        return {
+            title: props["sheetId"]
+            for title, props in self.sheets.items()
+            if "sheetId" in props
+        }
+
+
+def bootstrap(service, spreadsheet_id, ranges):
+    """
+    Один values.batchGet по ranges + один spreadsheets.get (только properties листов).
+    Если запрос не прошёл (например, нет какого-то листа), в контексте просто
+    не будет этих данных — раннер прочитает их по-старому.
+    """
+    ctx = RunContext(spreadsheet_id)
+    sheet = service.spreadsheets()
+
+    if ranges:
+        try:
+            resp = sheet.values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=list(ranges),
+                fields="valueRanges(values)",
+            ).execute()
+            # порядок valueRanges = порядок ranges (сам range Sheets нормализует)
+            for rng, vr in zip(ranges, resp.get("valueRanges", [])):
+                ctx.put(rng, vr.get("values", []))
+        except Exception as e:
+            print("bootstrap batchGet error:", repr(e))
+
+    try:
+        resp = sheet.get(
+            spreadsheetId=spreadsheet_id,
+            fields=SHEET_PROPERTIES_FIELDS,
+        ).execute()
+        for s in resp.get("sheets", []):
+            props = s.get("properties", {})
+            if props.get("title"):
+                ctx.sheets[props["title"]] = props
+    except Exception as e:
+        print("bootstrap spreadsheets.get error:", repr(e))
+
+    return ctx
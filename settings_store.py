@@ -0,0 +1,147 @@
+"""
+Лист Settings (key | value) с кэшем на процесс.
+
+Раньше load_settings читал Settings!A:B при каждом вызове, а update_setting
+делал get + clear + update всего листа — три запроса и момент, когда
+другой бот (TikTok / YouTube) видит пустой Settings.
+
+Теперь лист читается один раз (load), запоминается key -> номер строки,
+а set() пишет только одну ячейку B{строка}; новый ключ дописывается
+в конец листа. Запись может уйти сразу или в общий SheetsUnitOfWork.
+"""
+import re
+import threading
+
+
+_UPDATED_ROW_RE = re.compile(r"![A-Z]+(\d+)")
+
+
+class SettingsStore:
+    def __init__(self, spreadsheet_id, sheet_name):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+
+        self._values = None     # {key: value}
+        self._rows = {}         # {key: номер строки листа}
+        self._last_row = 0      # последняя строка с данными в A:B
+        self._stale = False     # после appendCells номера строк не точны
+        self._lock = threading.Lock()
+
+    @property
+    def range(self):
+        return f"{self.sheet_name}!A:B"
+
+    def _read(self, service):
+        resp = service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=self.range,
+        ).execute()
+        self._fill(resp.get("values", []))
+
+    def _fill(self, values):
+        settings = {}
+        rows = {}
+        # пропускаем заголовок
+        for row_num, row in enumerate(values[1:], start=2):
+            key = (row[0] or "").strip() if row else ""
+            if not key:
+                continue
+            # при дублях ключа действует последняя строка — её и обновляем
+            rows[key] = row_num
+            if len(row) >= 2:
+                settings[key] = (row[1] or "").strip()
+
+        self._values = settings
+        self._rows = rows
+        self._last_row = len(values)
+        self._stale = False
+
+    def load(self, service, refresh=False):
+        """{key: value} из кэша; первый вызов (или refresh=True) читает лист."""
+        with self._lock:
+            if self._values is None or refresh:
+                self._read(service)
+            return dict(self._values)
+
+    def prime(self, values):
+        """Значения Settings!A:B, уже прочитанные заранее (bootstrap запуска)."""
+        with self._lock:
+            self._fill(values)
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+    def set(self, service, key, new_value, uow=None):
+        """
+        Записывает одно значение. Без изменений — ничего не пишем.
+        uow — SheetsUnitOfWork: запись уйдёт при его commit().
+        """
+        key = (key or "").strip()
+        new_value = str(new_value)
+        with self._lock:
+            if self._values is None or self._stale:
+                self._read(service)
+            if key in self._rows and self._values.get(key) == new_value:
+                return
+
+            deferred = False
+            row_num = self._rows.get(key)
+            if row_num:
+                self._write_cell(service, row_num, new_value, uow)
+                deferred = uow is not None
+            elif self._last_row == 0:
+                # пустой лист: шапка + ключ одной записью
+                self._write_rows(service, 1, [["key", "value"], [key, new_value]])
+                self._rows[key] = 2
+                self._last_row = 2
+            elif uow is not None:
+                uow.append_rows(self.sheet_name, [[key, new_value]], raw=True)
+                # appendCells не сообщает строку — перечитаем при следующем set()
+                self._stale = True
+                deferred = True
+            else:
+                row_num = self._append_row(service, key, new_value)
+                if row_num:
+                    self._rows[key] = row_num
+                    self._last_row = max(self._last_row, row_num)
+                else:
+                    self._stale = True
+
+            if not deferred:
+                self._values[key] = new_value
+            else:
+                # кэш меняем только после успешного commit(), иначе он
+                # разойдётся с листом, если batchUpdate упадёт
+                uow.on_commit(lambda: self._remember(key, new_value))
+
+    def _remember(self, key, value):
+        with self._lock:
+            if self._values is not None:
+                self._values[key] = value
+
+    def _write_cell(self, service, row_num, value, uow):
+        if uow is not None:
+            uow.set_cell(self.sheet_name, row_num, 1, value)
+            return
+        self._write_rows(service, row_num, [[value]], col="B")
+
+    def _write_rows(self, service, row_num, values, col="A"):
+        service.spreadsheets().values().update(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{self.sheet_name}!{col}{row_num}",
+            valueInputOption="RAW",
+            body={"values": values},
+        ).execute()
+
+    def _append_row(self, service, key, value):
+        resp = service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{self.sheet_name}!A:B",
+            valueInputOption="RAW",
+            insertDataOption="INSERT_ROWS",
+            body={"values": [[key, value]]},
+        ).execute()
+        rng = (resp.get("updates") or {}).get("updatedRange", "")
+        m = _UPDATED_ROW_RE.search(rng)
+        return int(m.group(1)) if m else None
@@ -0,0 +1,176 @@
+"""
+Чтение листа только нужными колонками и кусками.
+
+Вместо одного огромного values.get по A1:H читаем values.batchGet
+только по тем колонкам, которые нужны вызывающему коду (например,
+A для дедупа или F/H для GPT), кусками по chunk_rows строк:
+- majorDimension=COLUMNS — на каждую колонку один плоский список;
+- valueRenderOption=FORMATTED_VALUE — строки, как их видно в листе
+  (как у прежнего values.get: "TRUE", а не True, числа в формате ячейки);
+- fields=valueRanges(values) — в ответе ничего лишнего.
+
+load_projected_rows складывает прочитанное сразу в RowStore (row_store.py)
+по колонкам, не собирая строки-списки. Размер листа он не спрашивает
+(лишний spreadsheets.get на каждое чтение): читает, пока не придёт
+неполный кусок.
+"""
+from row_store import RowStore
+
+
+DEFAULT_CHUNK_ROWS = 5000
+
+
+def _cell_str(val):
+    if val is None:
+        return ""
+    if isinstance(val, float) and val.is_integer():
+        return str(int(val))
+    return str(val)
+
+
+def get_row_count(service, spreadsheet_id, sheet_name):
+    """Сколько строк в сетке листа (gridProperties.rowCount) или None."""
+    try:
+        resp = service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets(properties(title,gridProperties(rowCount)))",
+        ).execute()
+    except Exception as e:
+        print("get_row_count error:", repr(e))
+        return None
+    for s in resp.get("sheets", []):
+        props = s.get("properties", {})
+        if props.get("title") == sheet_name:
+            return (props.get("gridProperties") or {}).get("rowCount")
+    return None
+
+
+def iter_column_chunks(
+    service,
+    spreadsheet_id,
+    sheet_name,
+    col_letters,
+    start_row=2,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    row_count=None,
+    ask_row_count=True,
+):
+    """
+    Генератор кусков (row_number первой строки, chunk_len, columns):
+    columns[k] — значения колонки col_letters[k] (строки, "" для пустых),
+    список может быть короче chunk_len (пустой хвост Sheets не присылает).
+
+    row_count — сколько строк в листе. Если None — спрашиваем у Sheets
+    (ask_row_count=True), а если не узнали или не спрашивали — читаем,
+    пока не придёт неполный кусок (удобно для короткого хвоста листа).
+    """
+    if row_count is None and ask_row_count:
+        row_count = get_row_count(service, spreadsheet_id, sheet_name)
+
+    row = start_row
+    while row_count is None or row <= row_count:
+        end = row + chunk_rows - 1
+        if row_count is not None:
+            end = min(end, row_count)
+
+        resp = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{sheet_name}!{c}{row}:{c}{end}" for c in col_letters],
+            majorDimension="COLUMNS",
+            valueRenderOption="FORMATTED_VALUE",
+            fields="valueRanges(values)",
+        ).execute()
+
+        columns = []
+        for vr in resp.get("valueRanges", []):
+            values = vr.get("values") or [[]]
+            columns.append([_cell_str(v) for v in values[0]])
+        while len(columns) < len(col_letters):
+            columns.append([])
+
+        if row_count is None:
+            # без rowCount: пустые строки в конце куска Sheets не присылает,
+            # короткий/пустой кусок = конец данных
+            chunk_len = max((len(c) for c in columns), default=0)
+            if chunk_len == 0:
+                return
+        else:
+            chunk_len = end - row + 1
+
+        yield row, chunk_len, columns
+
+        if row_count is None and chunk_len < chunk_rows:
+            return
+        row = end + 1
+
+
+def iter_sheet_columns(service, spreadsheet_id, sheet_name, col_letters, **kwargs):
+    """
+    Генератор (row_number, [значения колонок col_letters]) по строкам листа
+    (аргументы — как у iter_column_chunks).
+    """
+    for row, chunk_len, columns in iter_column_chunks(
+        service, spreadsheet_id, sheet_name, col_letters, **kwargs
+    ):
+        for i in range(chunk_len):
+            yield row + i, [c[i] if i < len(c) else "" for c in columns]
+
+
+def load_projected_rows(
+    service,
+    spreadsheet_id,
+    sheet_name,
+    header,
+    columns,
+    start_row=2,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    intern_columns=(),
+    row_count=None,
+):
+    """
+    Строки листа в RowStore шириной len(header), где хранятся только
+    колонки columns (по названиям из header), остальные — "". Так код,
+    который ходит по header.index(...), работает без изменений, а из Sheets
+    читаем только нужное. intern_columns — колонки с повторяющимися
+    значениями (см. RowStore). Пустые строки в конце листа отбрасываются.
+
+    row_count — число строк листа, если вызывающий его уже знает; иначе
+    читаем до первого неполного куска (chunk_rows пустых строк подряд во
+    всех колонках columns считаются концом данных).
+    """
+    idxs = sorted({header.index(c) for c in columns if c in header})
+    store = RowStore(header, idxs, intern_columns)
+    if not idxs:
+        return store
+    letters = [_idx_to_letter(i) for i in idxs]
+
+    last_filled = 0
+    for _row_num, chunk_len, chunk_columns in iter_column_chunks(
+        service,
+        spreadsheet_id,
+        sheet_name,
+        letters,
+        start_row=start_row,
+        chunk_rows=chunk_rows,
+        row_count=row_count,
+        ask_row_count=False,
+    ):
+        offset = len(store)
+        store.extend_columns(idxs, chunk_columns, chunk_len)
+        for values in chunk_columns:
+            # последняя непустая ячейка колонки в куске
+            for i in range(min(len(values), chunk_len) - 1, -1, -1):
+                if values[i] != "":
+                    last_filled = max(last_filled, offset + i + 1)
+                    break
+    store.truncate(last_filled)
+    return store
+
+
+def _idx_to_letter(idx):
+    s = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        s = chr(65 + rem) + s
+    return s
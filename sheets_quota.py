@@ -0,0 +1,242 @@
+"""
+Общий ограничитель запросов к Google Sheets API (token bucket).
+
+У Sheets поминутные квоты отдельно на чтение и на запись (на сервисный
+аккаунт), и горячие циклы раннеров их пробивали: запрос падал с 429,
+ошибка печаталась, запись терялась. Теперь каждый запрос сервиса Sheets
+(см. execute_request) сначала берёт
+токен из своего ведра:
+
+- два ведра: read и write, ёмкость = бюджет в минуту, пополняются равномерно;
+- приоритеты: данные (PRIORITY_DATA) могут выбрать ведро до нуля,
+  логи (PRIORITY_LOGS) — только до резерва LOGS_RESERVE, т.е. при нехватке
+  квоты логи ждут, а данные идут первыми;
+- состояние вёдер лежит в файле (state_path) под fcntl-блокировкой, так что
+  TikTok- и YouTube-раннеры на одной VM делят одну квоту;
+- сколько запросы простояли в ожидании — stats_text().
+
+Через execute_request идут запросы лёгкого клиента sheets_rest и (через
+quota_request_class) discovery-клиента googleapiclient; сам googleapiclient
+импортируется только во втором случае, чтобы не тормозить старт раннеров.
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # не Linux — делим квоту только внутри процесса
+    fcntl = None
+
+import resilience
+
+
+DEFAULT_READS_PER_MIN = 60
+DEFAULT_WRITES_PER_MIN = 60
+
+PRIORITY_DATA = "data"
+PRIORITY_LOGS = "logs"
+
+# доля ведра, которую логи не трогают (остаётся для записей данных)
+LOGS_RESERVE = 0.25
+# спим не дольше этого за раз, чтобы заново проверить общее ведро
+MAX_SLEEP_SEC = 2.0
+
+READ_METHOD_SUFFIXES = (".get", ".batchGet", ".batchGetByDataFilter", ".getByDataFilter")
+
+
+class QuotaGovernor:
+    def __init__(
+        self,
+        reads_per_min=DEFAULT_READS_PER_MIN,
+        writes_per_min=DEFAULT_WRITES_PER_MIN,
+        state_path="",
+    ):
+        self.limits = {
+            "read": max(1, int(reads_per_min)),
+            "write": max(1, int(writes_per_min)),
+        }
+        self.state_path = state_path if fcntl is not None else ""
+        self._lock = threading.Lock()
+        self._state = {}
+        # {(kind, priority): [запросов, сек ожидания, макс. ожидание]}
+        self._stats = {}
+
+    # ---------- состояние вёдер ----------
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        with self._lock:
+            if not self.state_path:
+                yield self._state
+                return
+
+            with open(self.state_path + ".lock", "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    try:
+                        with open(self.state_path, "r", encoding="utf-8") as f:
+                            state = json.load(f)
+                    except (FileNotFoundError, ValueError):
+                        state = {}
+                    yield state
+                    tmp_path = self.state_path + ".tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(state, f)
+                    os.replace(tmp_path, self.state_path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _try_take(self, kind, priority):
+        """Берёт токен. Возвращает 0, если взяли, иначе сколько секунд подождать."""
+        capacity = self.limits[kind]
+        rate = capacity / 60.0
+        floor = capacity * LOGS_RESERVE if priority == PRIORITY_LOGS else 0.0
+
+        with self._locked_state() as state:
+            now = time.time()
+            bucket = state.get(kind) or {"tokens": capacity, "ts": now}
+            tokens = min(capacity, bucket["tokens"] + max(0.0, now - bucket["ts"]) * rate)
+
+            if tokens - 1 >= floor:
+                state[kind] = {"tokens": tokens - 1, "ts": now}
+                return 0.0
+            state[kind] = {"tokens": tokens, "ts": now}
+            return (floor + 1 - tokens) / rate
+
+    def acquire(self, kind, priority=PRIORITY_DATA):
+        """Ждёт токен kind (read / write). Возвращает, сколько секунд ждали."""
+        started = time.monotonic()
+        while True:
+            try:
+                wait = self._try_take(kind, priority)
+            except Exception as e:
+                # ограничитель не должен ронять запросы к таблице
+                print("Sheets quota error:", repr(e))
+                wait = 0.0
+            if wait <= 0:
+                break
+            time.sleep(min(wait, MAX_SLEEP_SEC))
+
+        waited = time.monotonic() - started
+        with self._lock:
+            st = self._stats.setdefault((kind, priority), [0, 0.0, 0.0])
+            st[0] += 1
+            st[1] += waited
+            st[2] = max(st[2], waited)
+        return waited
+
+    def stats_text(self):
+        with self._lock:
+            items = sorted(self._stats.items())
+        return " ".join(
+            f"{kind}/{priority}: calls={n} waited={total:.1f}s max_wait={mx:.1f}s"
+            for (kind, priority), (n, total, mx) in items
+        )
+
+
+_governor = QuotaGovernor()
+_local = threading.local()
+
+
+def configure(reads_per_min=None, writes_per_min=None, state_path=None):
+    """Бюджеты в минуту и файл общего состояния (пустой путь — только этот процесс)."""
+    global _governor
+    _governor = QuotaGovernor(
+        reads_per_min or DEFAULT_READS_PER_MIN,
+        writes_per_min or DEFAULT_WRITES_PER_MIN,
+        state_path or "",
+    )
+
+
+def stats_text():
+    return _governor.stats_text()
+
+
+@contextlib.contextmanager
+def priority(name):
+    """Запросы Sheets внутри блока идут с приоритетом name (например, PRIORITY_LOGS)."""
+    prev = getattr(_local, "priority", PRIORITY_DATA)
+    _local.priority = name
+    try:
+        yield
+    finally:
+        _local.priority = prev
+
+
+def request_kind(method, method_id):
+    if method == "GET" or (method_id or "").endswith(READ_METHOD_SUFFIXES):
+        return "read"
+    return "write"
+
+
+SHEETS_UPSTREAM = "sheets.googleapis.com"
+
+
+def _network_errors():
+    # httplib2 есть в памяти, только если раннер собрал discovery-клиент
+    httplib2 = sys.modules.get("httplib2")
+    return (OSError, httplib2.HttpLib2Error) if httplib2 is not None else (OSError,)
+
+
+def _classify(kind):
+    def classify(result, exc):
+        if exc is None:
+            return resilience.OK, None
+        # HttpError (googleapiclient) и SheetsHttpError (sheets_rest): exc.resp — заголовки + .status
+        resp = getattr(exc, "resp", None)
+        status = getattr(resp, "status", None)
+        if status is not None:
+            status = int(status or 0)
+            if status == 429:
+                return resilience.THROTTLED, resilience.retry_after_from_headers(resp)
+            if status in resilience.RETRY_STATUSES:
+                return resilience.RETRY, resilience.retry_after_from_headers(resp)
+            return resilience.OK, None
+        if isinstance(exc, _network_errors()):
+            # запись могла дойти до таблицы — повторяем только чтение
+            return (resilience.RETRY if kind == "read" else resilience.FAIL), None
+        return resilience.FAIL, None
+    return classify
+
+
+def execute_request(method, method_id, send):
+    """
+    send() — одна попытка запроса к Sheets. Перед каждой попыткой берём
+    токен у ограничителя, 429 / 5xx повторяем через resilience.
+    """
+    kind = request_kind(method, method_id)
+    prio = getattr(_local, "priority", PRIORITY_DATA)
+
+    def attempt():
+        _governor.acquire(kind, prio)
+        return send()
+
+    return resilience.call_with_retry(SHEETS_UPSTREAM, attempt, _classify(kind))
+
+
+_quota_request_class = None
+
+
+def quota_request_class():
+    """
+    requestBuilder для build("sheets", "v4"): HttpRequest, который
+    выполняется через execute_request(). googleapiclient импортируется здесь.
+    """
+    global _quota_request_class
+    if _quota_request_class is None:
+        from googleapiclient.http import HttpRequest
+
+        class QuotaHttpRequest(HttpRequest):
+            def execute(self, http=None, num_retries=0):
+                return execute_request(
+                    self.method,
+                    getattr(self, "methodId", None),
+                    lambda: HttpRequest.execute(self, http=http, num_retries=num_retries),
+                )
+
+        _quota_request_class = QuotaHttpRequest
+    return _quota_request_class
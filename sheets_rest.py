@@ -0,0 +1,174 @@
+"""
+Лёгкий клиент Google Sheets API v4 (только те методы, что вызывают раннеры).
+
+Раньше каждый запуск импортировал googleapiclient.discovery (+ httplib2)
+и строил сервис через build("sheets", "v4") — разбор discovery-документа
+на каждом коротком gpt_only / start. SheetsClient повторяет тот же
+интерфейс (service.spreadsheets().values().get(...).execute()), но
+запросы шлёт обычным REST через общий requests.Session из http_client
+(keep-alive пул), а каждая попытка идёт через sheets_quota.execute_request
+(квота, повторы 429/5xx, circuit breaker).
+
+Ошибка HTTP — SheetsHttpError: как у googleapiclient.errors.HttpError,
+в exc.resp лежат заголовки ответа и .status.
+
+Методы:
+    spreadsheets().get / batchUpdate
+    spreadsheets().values().get / batchGet / update / append / clear / batchUpdate
+"""
+import threading
+from urllib.parse import quote
+
+import http_client
+import sheets_quota
+
+
+API_ROOT = "https://sheets.googleapis.com/v4/spreadsheets"
+DEFAULT_TIMEOUT_SEC = 120
+
+
+class SheetsHttpError(Exception):
+    def __init__(self, resp, content, uri):
+        self.resp = resp
+        self.content = content
+        self.uri = uri
+        super().__init__(f"<SheetsHttpError {resp.status} when requesting {uri} returned {content[:500]!r}>")
+
+    @property
+    def status_code(self):
+        return self.resp.status
+
+
+class _ResponseHeaders(dict):
+    """Заголовки ответа (ключи в нижнем регистре) + .status, как httplib2.Response."""
+
+    def __init__(self, response):
+        super().__init__((k.lower(), v) for k, v in response.headers.items())
+        self.status = response.status_code
+
+
+def load_credentials(service_account_file, scopes):
+    """Учётка сервисного аккаунта (google.auth грузим только здесь)."""
+    from google.oauth2.service_account import Credentials
+
+    return Credentials.from_service_account_file(service_account_file, scopes=scopes)
+
+
+class SheetsRequest:
+    """Отложенный запрос: execute() отправляет его (как HttpRequest в googleapiclient)."""
+
+    def __init__(self, client, method, method_id, path, params=None, body=None):
+        self.client = client
+        self.method = method
+        self.methodId = method_id
+        self.path = path
+        self.params = {k: v for k, v in (params or {}).items() if v is not None}
+        self.body = body
+
+    def execute(self):
+        return self.client.execute(self)
+
+
+class _Values:
+    def __init__(self, client):
+        self._client = client
+
+    def _request(self, method, name, spreadsheetId, path, params=None, body=None):
+        return SheetsRequest(
+            self._client,
+            method,
+            f"sheets.spreadsheets.values.{name}",
+            f"{quote(spreadsheetId, safe='')}/values{path}",
+            params,
+            body,
+        )
+
+    def get(self, spreadsheetId, range, **params):
+        return self._request("GET", "get", spreadsheetId, "/" + quote(range, safe=""), params)
+
+    def batchGet(self, spreadsheetId, ranges, **params):
+        # список ranges requests отправит повторяющимся параметром (?ranges=..&ranges=..)
+        params["ranges"] = list(ranges)
+        return self._request("GET", "batchGet", spreadsheetId, ":batchGet", params)
+
+    def update(self, spreadsheetId, range, body, **params):
+        return self._request("PUT", "update", spreadsheetId, "/" + quote(range, safe=""), params, body)
+
+    def append(self, spreadsheetId, range, body, **params):
+        return self._request("POST", "append", spreadsheetId, "/" + quote(range, safe="") + ":append", params, body)
+
+    def clear(self, spreadsheetId, range, body=None, **params):
+        return self._request("POST", "clear", spreadsheetId, "/" + quote(range, safe="") + ":clear", params, body or {})
+
+    def batchUpdate(self, spreadsheetId, body, **params):
+        return self._request("POST", "batchUpdate", spreadsheetId, ":batchUpdate", params, body)
+
+
+class _Spreadsheets:
+    def __init__(self, client):
+        self._client = client
+
+    def get(self, spreadsheetId, **params):
+        return SheetsRequest(
+            self._client, "GET", "sheets.spreadsheets.get", quote(spreadsheetId, safe=""), params
+        )
+
+    def batchUpdate(self, spreadsheetId, body, **params):
+        return SheetsRequest(
+            self._client,
+            "POST",
+            "sheets.spreadsheets.batchUpdate",
+            quote(spreadsheetId, safe="") + ":batchUpdate",
+            params,
+            body,
+        )
+
+    def values(self):
+        return _Values(self._client)
+
+
+class SheetsClient:
+    """Замена build("sheets", "v4", credentials=creds) для раннеров."""
+
+    def __init__(self, credentials, api_root=API_ROOT, timeout=DEFAULT_TIMEOUT_SEC):
+        self.credentials = credentials
+        self.api_root = api_root.rstrip("/")
+        self.timeout = timeout
+        self._auth_request = None
+        self._token_lock = threading.Lock()
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def _token(self, force_refresh=False):
+        with self._token_lock:
+            if force_refresh or not self.credentials.valid:
+                if self._auth_request is None:
+                    from google.auth.transport.requests import Request
+
+                    self._auth_request = Request(http_client.get_session())
+                self.credentials.refresh(self._auth_request)
+            return self.credentials.token
+
+    def _send(self, request):
+        url = f"{self.api_root}/{request.path}"
+        kwargs = {"params": request.params, "timeout": self.timeout}
+        if request.body is not None:
+            kwargs["json"] = request.body
+
+        response = None
+        for force_refresh in (False, True):
+            headers = {"Authorization": f"Bearer {self._token(force_refresh)}"}
+            response = http_client.get_session().request(request.method, url, headers=headers, **kwargs)
+            # токен отозван / протух раньше срока — обновляем один раз
+            if response.status_code != 401:
+                break
+
+        if response.status_code >= 400:
+            raise SheetsHttpError(_ResponseHeaders(response), response.text, url)
+        return response.json() if response.content else {}
+
+    def execute(self, request):
+        return sheets_quota.execute_request(
+            request.method, request.methodId, lambda: self._send(request)
+        )
@@ -0,0 +1,198 @@
+"""
+Unit of work для записей кластера в Google Sheets.
+
+Раньше после каждого кластера уходили отдельные запросы: values.append
+новых строк, batchUpdate с copyPaste (формулы H:J), batchUpdate с
+repeatCell (формат E) и get + clear + update листа Settings
+(last_cluster_name). Теперь раннер копит всё это в SheetsUnitOfWork,
+а commit() отправляет данные одним spreadsheets.batchUpdate
+(appendCells + updateCells), а оформление (copyPaste формул, repeatCell
+формата) — вторым.
+
+batchUpdate в Sheets атомарный: либо применились все запросы, либо ни один.
+Поэтому оформление отдельно: его ошибка, как и раньше, только печатается
+и не откатывает уже дописанные строки.
+"""
+import re
+
+
+_NUMBER_RE = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$")
+
+
+def user_entered_cell(value):
+    """
+    CellData для appendCells / updateCells. Разбор — только часть того, что
+    делает values.append с USER_ENTERED: числа (и строки вида "123", "1.5")
+    — числом, bool и "TRUE" / "FALSE" — логическим, "=..." — формулой.
+    Всё остальное остаётся строкой: даты, "50%", "1,234" и валюты Sheets
+    распознал бы по локали таблицы, а здесь они ложатся текстом.
+
+    Колонки, которые должны остаться текстом при любом содержимом (url,
+    био, batch), передавайте через raw_columns — см. append_rows.
+    """
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    s = str(value)
+    if s.startswith("="):
+        return {"userEnteredValue": {"formulaValue": s}}
+    if s.strip().upper() in ("TRUE", "FALSE"):
+        return {"userEnteredValue": {"boolValue": s.strip().upper() == "TRUE"}}
+    if _NUMBER_RE.match(s.strip()):
+        return {"userEnteredValue": {"numberValue": float(s)}}
+    return {"userEnteredValue": {"stringValue": s}}
+
+
+def raw_cell(value):
+    """CellData как при valueInputOption=RAW: всегда строка."""
+    if value is None or value == "":
+        return {}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def _row_data(row, raw, raw_columns=()):
+    if raw:
+        return {"values": [raw_cell(v) for v in row]}
+    return {
+        "values": [
+            raw_cell(v) if idx in raw_columns else user_entered_cell(v)
+            for idx, v in enumerate(row)
+        ]
+    }
+
+
+class SheetsUnitOfWork:
+    """
+    Копит изменения листов и отправляет их одним batchUpdate.
+
+    sheet_id_of(title) -> sheetId (в раннерах — кэширующий get_sheet_id).
+    Строки храним как есть и превращаем в CellData только в commit().
+    После успешного commit() вызываются колбэки on_commit (в порядке
+    добавления) — например, чтобы дописать строки в локальное зеркало.
+    """
+
+    def __init__(self, service, spreadsheet_id, sheet_id_of):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_id_of = sheet_id_of
+
+        self._ops = []
+        self._after_commit = []
+        self.rows_pending = 0
+        self.round_trips = 0
+        self.requests_sent = 0
+
+    def __len__(self):
+        return len(self._ops)
+
+    def sheet_id(self, sheet_title):
+        return self.sheet_id_of(sheet_title)
+
+    def append_rows(self, sheet_title, rows, raw=False, on_commit=None, raw_columns=()):
+        """
+        Дописать строки в конец листа (appendCells). raw — все ячейки
+        строками; raw_columns — индексы колонок, которые всегда строки,
+        остальные — через user_entered_cell.
+        """
+        if not rows:
+            return
+        self._ops.append(("append", sheet_title, (rows, frozenset(raw_columns)), raw))
+        self.rows_pending += len(rows)
+        if on_commit:
+            self._after_commit.append(on_commit)
+
+    def set_cell(self, sheet_title, row_number, col_idx, value, raw=True):
+        """Одна ячейка (row_number с 1, col_idx с 0) через updateCells."""
+        self._ops.append(("cell", sheet_title, (row_number, col_idx, value), raw))
+
+    def on_commit(self, fn):
+        """fn() вызовется после следующего успешного commit()."""
+        self._after_commit.append(fn)
+
+    def add_request(self, request, best_effort=False):
+        """
+        Готовый запрос batchUpdate (copyPaste, repeatCell, ...).
+        best_effort=True — оформление: уходит вторым batchUpdate после
+        данных, ошибка печатается и commit() не роняет.
+        """
+        self._ops.append(("best_effort" if best_effort else "request", None, request, None))
+
+    def _build_requests(self, ops):
+        requests_body = []
+        for kind, sheet_title, payload, raw in ops:
+            if kind in ("request", "best_effort"):
+                requests_body.append(payload)
+            elif kind == "append":
+                rows, raw_columns = payload
+                requests_body.append(
+                    {
+                        "appendCells": {
+                            "sheetId": self.sheet_id_of(sheet_title),
+                            "rows": [_row_data(r, raw, raw_columns) for r in rows],
+                            "fields": "userEnteredValue",
+                        }
+                    }
+                )
+            else:
+                row_number, col_idx, value = payload
+                requests_body.append(
+                    {
+                        "updateCells": {
+                            "start": {
+                                "sheetId": self.sheet_id_of(sheet_title),
+                                "rowIndex": row_number - 1,
+                                "columnIndex": col_idx,
+                            },
+                            "rows": [_row_data([value], raw)],
+                            "fields": "userEnteredValue",
+                        }
+                    }
+                )
+        return requests_body
+
+    def commit(self):
+        """
+        Отправляет данные одним batchUpdate, затем оформление (best_effort)
+        вторым. Пусто — запрос не шлём (колбэки всё равно вызываются).
+        При ошибке записи данных накопленное сбрасывается, а исключение
+        летит дальше; ошибка оформления только печатается.
+        """
+        try:
+            data_body = self._build_requests(op for op in self._ops if op[0] != "best_effort")
+            extra_body = self._build_requests(op for op in self._ops if op[0] == "best_effort")
+        finally:
+            callbacks = self._after_commit
+            self._ops = []
+            self._after_commit = []
+            self.rows_pending = 0
+
+        resp = None
+        if data_body:
+            resp = self._send(data_body)
+        self._run_callbacks(callbacks)
+
+        if extra_body:
+            try:
+                self._send(extra_body)
+            except Exception as e:
+                print("SheetsUnitOfWork formatting error:", repr(e))
+        return resp
+
+    def _send(self, requests_body):
+        resp = self.service.spreadsheets().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={"requests": requests_body},
+        ).execute()
+        self.round_trips += 1
+        self.requests_sent += len(requests_body)
+        return resp
+
+    def _run_callbacks(self, callbacks):
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print("SheetsUnitOfWork on_commit error:", repr(e))
@@ -0,0 +1,199 @@
+"""
+Опрос статуса снапшотов Bright Data с экспоненциальной паузой.
+
+Раньше статус дёргали каждые status_poll_sec (1 сек) — 15-минутная
+сборка = ~900 запросов. Теперь:
+- пауза между опросами растёт от status_poll_sec до status_poll_max_sec
+  (множитель status_poll_backoff, плюс случайный разброс ±20%);
+- храним историю длительностей сборки (по кластеру и числу inputs) в
+  snapshot_history.json и до предсказанного времени готовности вообще
+  не опрашиваем — сразу спим, а дальше опрашиваем часто и снова с backoff.
+
+Один SnapshotPoll = один снапшот. Для последовательного режима есть
+wait_for_snapshot(), в конвейерных режимах раннеры сами спрашивают
+poll.due() и спят next_wake_delay() по всем снапшотам сразу.
+"""
+import fcntl
+import json
+import os
+import random
+import time
+
+
+DEFAULT_POLL_MIN_SEC = 1
+DEFAULT_POLL_MAX_SEC = 30
+DEFAULT_POLL_BACKOFF = 1.5
+POLL_JITTER = 0.2
+
+# сколько последних сборок помним на ключ
+HISTORY_KEEP = 20
+# спим до (самая быстрая из недавних сборок) * PREDICT_LEAD
+PREDICT_LEAD = 0.9
+
+
+def parse_poll_settings(settings):
+    """status_poll_sec / status_poll_max_sec / status_poll_backoff из Settings."""
+    try:
+        min_sec = max(0.1, float(settings.get("status_poll_sec", str(DEFAULT_POLL_MIN_SEC))))
+    except Exception:
+        min_sec = DEFAULT_POLL_MIN_SEC
+    try:
+        max_sec = max(min_sec, float(settings.get("status_poll_max_sec", str(DEFAULT_POLL_MAX_SEC))))
+    except Exception:
+        max_sec = max(min_sec, DEFAULT_POLL_MAX_SEC)
+    try:
+        backoff = max(1.0, float(settings.get("status_poll_backoff", str(DEFAULT_POLL_BACKOFF))))
+    except Exception:
+        backoff = DEFAULT_POLL_BACKOFF
+    return min_sec, max_sec, backoff
+
+
+class SnapshotHistory:
+    """
+    {ключ: [длительность сборки в сек, ...]} в JSON-файле.
+    Пустой path — история выключена (predict всегда None).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = {}
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._data = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("Snapshot history read error:", repr(e))
+
+    def predict(self, key):
+        """Через сколько секунд снапшот, скорее всего, ещё НЕ готов (или None)."""
+        durations = self._data.get(key) or []
+        if not durations:
+            return None
+        return min(durations) * PREDICT_LEAD
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def record(self, key, duration_sec):
+        """
+        Файл общий у tiktok_runner и youtube_runner (и может писаться
+        одновременно): под flock перечитываем его, добавляем запись к
+        свежим данным и пишем через свой tmp-файл процесса.
+        """
+        if not self.path:
+            return
+        try:
+            with open(self.path + ".lock", "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    data = self._read()
+                    durations = data.get(key)
+                    if not isinstance(durations, list):
+                        durations = data[key] = []
+                    durations.append(round(float(duration_sec), 1))
+                    del durations[:-HISTORY_KEEP]
+
+                    tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(data, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._data = data
+        except Exception as e:
+            print("Snapshot history write error:", repr(e))
+
+
+class SnapshotPoll:
+    """Расписание опросов одного снапшота."""
+
+    def __init__(
+        self,
+        max_wait_sec,
+        min_sec=DEFAULT_POLL_MIN_SEC,
+        max_sec=DEFAULT_POLL_MAX_SEC,
+        backoff=DEFAULT_POLL_BACKOFF,
+        history=None,
+        history_key=None,
+    ):
+        self.max_wait_sec = max_wait_sec
+        self.min_sec = min_sec
+        self.max_sec = max_sec
+        self.backoff = backoff
+        self.history = history
+        self.history_key = history_key
+        self.polls = 0
+
+        self.started = time.monotonic()
+        self._delay = min_sec
+
+        predicted = history.predict(history_key) if history and history_key else None
+        if predicted:
+            predicted = min(predicted, max_wait_sec)
+            print(f"Снапшот {history_key}: ждём ~{int(predicted)} сек до первого опроса (по истории)")
+            self.next_at = self.started + predicted
+        else:
+            self.next_at = self.started
+
+    def waited(self):
+        return int(time.monotonic() - self.started)
+
+    def due(self):
+        return time.monotonic() >= self.next_at
+
+    def seconds_until_due(self):
+        return max(0.0, self.next_at - time.monotonic())
+
+    def sleep_until_due(self):
+        delay = self.seconds_until_due()
+        if delay > 0:
+            time.sleep(delay)
+
+    def schedule_next(self):
+        """После опроса со статусом running: следующая пауза длиннее предыдущей."""
+        self.polls += 1
+        delay = self._delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        self._delay = min(self.max_sec, self._delay * self.backoff)
+
+        deadline = self.started + self.max_wait_sec
+        self.next_at = min(time.monotonic() + delay, max(deadline, time.monotonic()))
+
+    def mark_ready(self):
+        self.polls += 1
+        if self.history and self.history_key:
+            self.history.record(self.history_key, time.monotonic() - self.started)
+
+
+def wait_for_snapshot(poll, check):
+    """
+    Последовательное ожидание одного снапшота.
+    check(waited) -> ready / failed / timeout / running (как check_*_snapshot в раннерах).
+    Возвращает итоговое состояние.
+    """
+    while True:
+        poll.sleep_until_due()
+        state = check(poll.waited())
+        if state == "ready":
+            poll.mark_ready()
+            return state
+        if state != "running":
+            return state
+        poll.schedule_next()
+
+
+def next_wake_delay(polls, cap=None):
+    """Сколько спать до ближайшего опроса среди polls (не больше cap)."""
+    delays = [p.seconds_until_due() for p in polls]
+    if cap is not None:
+        delays.append(cap)
+    return min(delays) if delays else 0
@@ -0,0 +1,247 @@
+"""
+Локальное хранилище скачанных снапшотов Bright Data (gzip JSONL).
+
+Раньше, чтобы пересобрать строки после правки маппинга колонок,
+normalize_followers или cluster_limit, приходилось скрейпить заново.
+Теперь iter_snapshot_posts по ходу скачивания пишет сырые NDJSON-строки
+в <dir>/<snapshot_id>.jsonl.gz, а рядом — <snapshot_id>.json с метаданными
+(бот, кластер, input, сколько строк, дочитан ли снапшот до конца).
+
+- если раннер перестал читать раньше (набрал cluster_limit), в файл
+  попадает только прочитанное (complete=false в метаданных); остаток
+  потока докачивается в файл, только если включён SNAPSHOT_STORE_FULL —
+  это полная загрузка снапшота, которую иначе early stop экономит;
+- полностью сохранённый снапшот повторно не качается: iter_snapshot_posts
+  читает его с диска (это же ускоряет продолжение по журналу этапов);
+- режим reprocess раннеров собирает строки заново из сохранённых файлов
+  (и частичных тоже — в них всё, что попало в лист);
+- хранилище чистится после каждой записи: файлы старше keep_days, затем
+  самые старые, пока всё не влезет в max_mb.
+
+SnapshotSpool — не хранилище, а временный файл фоновой загрузки
+(cluster_pipeline / youtube_inputs_in_flight): фоновый поток пишет туда
+поток целиком, основной поток потом читает строки с диска.
+"""
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+DEFAULT_MAX_MB = 2048
+DEFAULT_KEEP_DAYS = 30
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def parse_line(line):
+    """Одна NDJSON-строка -> список постов (бывает и JSON-массив одной строкой)."""
+    item = json.loads(line)
+    return item if isinstance(item, list) else [item]
+
+
+class SnapshotWriter:
+    """
+    Пишет строки одного снапшота во временный файл; finish() публикует его.
+    Ошибка записи (например, кончился диск) не должна ронять скачивание:
+    печатаем её один раз и дальше просто не сохраняем этот снапшот.
+    """
+
+    def __init__(self, store, snapshot_id, meta):
+        self.store = store
+        self.snapshot_id = snapshot_id
+        self.meta = dict(meta or {})
+        self.lines = 0
+        self.failed = False
+        self._tmp_path = store.data_path(snapshot_id) + ".part"
+        self._f = gzip.open(self._tmp_path, "wb", compresslevel=5)
+
+    def write(self, line):
+        if self.failed:
+            return
+        try:
+            self._f.write(line)
+            self._f.write(b"\n")
+            self.lines += 1
+        except Exception as e:
+            print("Snapshot store write error:", repr(e))
+            self.failed = True
+
+    def drain(self, lines):
+        """
+        Дописывает остаток потока строк без разбора (раннер уже набрал
+        cluster_limit, а снапшот нужен целиком — SNAPSHOT_STORE_FULL).
+        True — дочитали.
+        """
+        try:
+            for line in lines:
+                line = line.strip()
+                if line:
+                    self.write(line)
+        except Exception as e:
+            print("Snapshot store drain error:", repr(e))
+            return False
+        return not self.failed
+
+    def finish(self, complete):
+        """complete=False — снапшот дочитали не до конца (cluster_limit / ошибка)."""
+        try:
+            self._f.close()
+        except Exception as e:
+            print("Snapshot store write error:", repr(e))
+            self.failed = True
+        if self.failed or not self.lines:
+            os.remove(self._tmp_path)
+            return
+        os.replace(self._tmp_path, self.store.data_path(self.snapshot_id))
+        self.meta.update(
+            snapshot_id=self.snapshot_id,
+            lines=self.lines,
+            complete=bool(complete),
+            saved_at=int(time.time()),
+        )
+        self.store.write_meta(self.snapshot_id, self.meta)
+        self.store.prune()
+
+
+class SnapshotSpool:
+    """
+    Снапшот, скачанный фоновым потоком во временный файл (сырые NDJSON-строки),
+    чтобы не держать его в памяти списком постов. Основной поток читает
+    строки через lines(); close() удаляет файл.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def download(cls, lines, stop=None):
+        """
+        Пишет поток строк во временный файл. stop (threading.Event)
+        выставлен — загрузку бросаем: файл удаляется, возвращается None.
+        """
+        fd, path = tempfile.mkstemp(prefix="snapshot_", suffix=".jsonl")
+        spool = cls(path)
+        stopped = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for line in lines:
+                    if stop is not None and stop.is_set():
+                        stopped = True
+                        break
+                    line = line.strip()
+                    if line:
+                        f.write(line)
+                        f.write(b"\n")
+        except BaseException:
+            spool.close()
+            raise
+        if stopped:
+            spool.close()
+            return None
+        return spool
+
+    def lines(self):
+        with open(self.path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SnapshotStore:
+    def __init__(self, root, max_mb=DEFAULT_MAX_MB, keep_days=DEFAULT_KEEP_DAYS):
+        self.root = root
+        self.max_bytes = max(1, max_mb) * 1024 * 1024
+        self.keep_sec = max(0, keep_days) * 86400
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _base(self, snapshot_id):
+        return os.path.join(self.root, _UNSAFE_RE.sub("_", str(snapshot_id)))
+
+    def data_path(self, snapshot_id):
+        return self._base(snapshot_id) + ".jsonl.gz"
+
+    def meta_path(self, snapshot_id):
+        return self._base(snapshot_id) + ".json"
+
+    def write_meta(self, snapshot_id, meta):
+        tmp_path = self.meta_path(snapshot_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path(snapshot_id))
+
+    def read_meta(self, snapshot_id):
+        try:
+            with open(self.meta_path(snapshot_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("Snapshot store meta error:", repr(e))
+            return None
+
+    def has_complete(self, snapshot_id):
+        """Снапшот сохранён целиком — можно не качать."""
+        meta = self.read_meta(snapshot_id)
+        return bool(meta and meta.get("complete")) and os.path.exists(self.data_path(snapshot_id))
+
+    def writer(self, snapshot_id, meta=None):
+        return SnapshotWriter(self, snapshot_id, meta)
+
+    def iter_posts(self, snapshot_id):
+        """Посты сохранённого снапшота (генератор)."""
+        with gzip.open(self.data_path(snapshot_id), "rb") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield from parse_line(line)
+
+    def list(self, **filters):
+        """Метаданные сохранённых снапшотов (новые первыми), например list(command="TikTok", cluster="A")."""
+        metas = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            meta = self.read_meta(name[: -len(".json")])
+            if not meta or not os.path.exists(self.data_path(meta.get("snapshot_id", ""))):
+                continue
+            if all(meta.get(k) == v for k, v in filters.items()):
+                metas.append(meta)
+        metas.sort(key=lambda m: m.get("saved_at", 0), reverse=True)
+        return metas
+
+    def _remove(self, snapshot_id):
+        for path in (self.data_path(snapshot_id), self.meta_path(snapshot_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def prune(self):
+        """Удаляет снапшоты старше keep_days, затем самые старые сверх max_mb."""
+        with self._lock:
+            try:
+                metas = self.list()
+                now = time.time()
+                total = 0
+                for meta in metas:  # новые первыми
+                    sid = meta["snapshot_id"]
+                    size = os.path.getsize(self.data_path(sid))
+                    expired = self.keep_sec and now - meta.get("saved_at", 0) > self.keep_sec
+                    if expired or total + size > self.max_bytes:
+                        self._remove(sid)
+                        continue
+                    total += size
+            except Exception as e:
+                print("Snapshot store prune error:", repr(e))
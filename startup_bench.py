@@ -0,0 +1,111 @@
+"""
+Замер холодного старта раннеров: сколько проходит от запуска процесса
+python3 до первого запроса к Sheets API в каждом режиме, для клиента
+rest (sheets_rest) и discovery (googleapiclient).
+
+    python3 startup_bench.py [tiktok|youtube|all] [повторов, по умолчанию 5]
+
+Запускать из папки бота (нужны config.json и service-account.json).
+Каждый замер — отдельный процесс `python3 <раннер> <режим>` во временной
+папке (копия config.json с нужным SHEETS_CLIENT, state-файлы туда же),
+так что журналы, кэши и снапшоты бота не трогаются. Процесс завершается
+в момент, когда первый запрос к Sheets берёт токен у sheets_quota, —
+до OAuth-обмена и сети, поэтому замер не зависит от задержек Google.
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODES = {
+    "tiktok": ("tiktok_runner.py", ["full", "scrape_only", "gpt_only", "gpt_batch", "start", "reprocess", "daemon"]),
+    "youtube": ("youtube_runner.py", ["full", "scrape_only", "gpt_only", "gpt_batch", "reprocess", "daemon"]),
+}
+CLIENTS = ["rest", "discovery"]
+
+# выполняется в дочернем процессе: перехватываем первый запрос к Sheets
+_CHILD = """
+import os, runpy, sys, time
+sys.path.insert(0, {bot_dir!r})
+import sheets_quota
+
+def _first_request(self, kind, priority=sheets_quota.PRIORITY_DATA):
+    print("FIRST_REQUEST", time.time(), flush=True)
+    os._exit(0)
+
+sheets_quota.QuotaGovernor.acquire = _first_request
+sys.argv = [{runner!r}] + {args!r}
+if {args!r}:
+    runpy.run_path(os.path.join({bot_dir!r}, {runner!r}), run_name="__main__")
+else:
+    import importlib
+    importlib.import_module({runner!r}[:-3])
+    print("FIRST_REQUEST", time.time(), flush=True)
+"""
+
+
+def _make_workdir(client):
+    with open(os.path.join(BOT_DIR, "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config["SHEETS_CLIENT"] = client
+    config["SERVICE_ACCOUNT_FILE"] = os.path.join(BOT_DIR, config["SERVICE_ACCOUNT_FILE"])
+
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return workdir
+
+
+def measure(workdir, runner, args):
+    """Миллисекунды от запуска процесса до первого запроса к Sheets (None — не дошли)."""
+    code = _CHILD.format(bot_dir=BOT_DIR, runner=runner, args=args)
+    started = time.time()
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=workdir,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("FIRST_REQUEST "):
+            return (float(line.split()[1]) - started) * 1000
+    print(f"  {runner} {' '.join(args)}: не дошли до запроса к Sheets\n{proc.stderr[-1000:]}")
+    return None
+
+
+def run_bench(bots, repeat):
+    print(f"Старт до первого запроса к Sheets, мс (медиана / минимум из {repeat})")
+    print(f"{'раннер':<18} {'режим':<12} " + " ".join(f"{c:>18}" for c in CLIENTS))
+    workdirs = {c: _make_workdir(c) for c in CLIENTS}
+    try:
+        for bot in bots:
+            runner, modes = MODES[bot]
+            # "import" — только импорт модуля раннера (config.json + модули)
+            for mode in ["import"] + modes:
+                args = [] if mode == "import" else [mode]
+                cells = []
+                for client in CLIENTS:
+                    times = [measure(workdirs[client], runner, args) for _ in range(repeat)]
+                    times = [t for t in times if t is not None]
+                    if times:
+                        cells.append(f"{statistics.median(times):>8.0f} / {min(times):>7.0f}")
+                    else:
+                        cells.append(f"{'ошибка':>18}")
+                print(f"{runner:<18} {mode:<12} " + " ".join(cells))
+    finally:
+        for workdir in workdirs.values():
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "all"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    run_bench(list(MODES) if target == "all" else [target], max(1, repeat))
@@ -0,0 +1,173 @@
+"""
+Заглушка OpenAI Files + Batch API для проверки gpt_batch без сети.
+
+    python3 tests/fake_openai_batch.py [порт, по умолчанию 8767]
+
+и OPENAI_BASE_URL = "http://127.0.0.1:8767/v1" в config.json — режим
+gpt_batch пройдёт весь цикл: POST /files, POST /batches, GET /batches/{id},
+GET /files/{id}/content. Ответ модели на каждый запрос — answer(body).
+
+Поведение задаётся атрибутами сервера (тесты меняют их на лету):
+- polls_to_finish — сколько GET /batches/{id} batch остаётся in_progress;
+- outcome — чем он кончается: completed / expired / failed;
+- expired_done — сколько первых запросов успело выполниться до expired;
+- drop_custom_id — custom_id, для которых строка ответа придёт без custom_id.
+"""
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def default_answer(body):
+    text = body["messages"][-1]["content"]
+    return "Y" if "yes" in text else "N"
+
+
+class FakeBatchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.files = {}      # file_id -> bytes
+        self.batches = {}    # batch_id -> dict
+        self.polls = {}      # batch_id -> сколько раз спросили статус
+        self.requests_log = []
+        self.polls_to_finish = 0
+        self.outcome = "completed"
+        self.expired_done = 0
+        self.drop_custom_id = set()
+        self.answer = default_answer
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _new_id(self, prefix, table):
+        return f"{prefix}-{len(table) + 1}"
+
+    def add_file(self, content):
+        with self._lock:
+            file_id = self._new_id("file", self.files)
+            self.files[file_id] = content
+            return file_id
+
+    def create_batch(self, input_file_id):
+        with self._lock:
+            batch_id = self._new_id("batch", self.batches)
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "status": "in_progress",
+                "input_file_id": input_file_id,
+                "output_file_id": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+            self.polls[batch_id] = 0
+            return self.batches[batch_id]
+
+    def poll_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        self.polls[batch_id] += 1
+        if batch["status"] == "in_progress" and self.polls[batch_id] > self.polls_to_finish:
+            self._finish(batch)
+        return batch
+
+    def _finish(self, batch):
+        lines = [json.loads(l) for l in self.files[batch["input_file_id"]].decode("utf-8").splitlines() if l.strip()]
+        batch["status"] = self.outcome
+        batch["request_counts"]["total"] = len(lines)
+        if self.outcome == "failed":
+            return
+        if self.outcome == "expired":
+            lines = lines[: self.expired_done]
+        batch["request_counts"]["completed"] = len(lines)
+        out = []
+        for line in lines:
+            item = {
+                "custom_id": line["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"content": self.answer(line["body"])}}]},
+                },
+            }
+            if line["custom_id"] in self.drop_custom_id:
+                del item["custom_id"]
+            out.append(json.dumps(item, ensure_ascii=False))
+        if out:
+            batch["output_file_id"] = self.add_file(("\n".join(out) + "\n").encode("utf-8"))
+
+
+def _multipart_file(body, content_type):
+    """Содержимое части name="file" из multipart/form-data."""
+    boundary = re.search(r"boundary=([^;]+)", content_type).group(1).strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        head, _, data = part.partition(b"\r\n\r\n")
+        if b'name="file"' in head:
+            return data[:-2] if data.endswith(b"\r\n") else data
+    return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _json(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        srv = self.server
+        srv.requests_log.append(("POST", self.path))
+        body = self._body()
+        if self.path == "/v1/files":
+            content = _multipart_file(body, self.headers.get("Content-Type", ""))
+            if content is None:
+                return self._json(400, {"error": "no file"})
+            return self._json(200, {"id": srv.add_file(content), "purpose": "batch"})
+        if self.path == "/v1/batches":
+            payload = json.loads(body)
+            if payload.get("input_file_id") not in srv.files:
+                return self._json(400, {"error": "unknown input_file_id"})
+            return self._json(200, srv.create_batch(payload["input_file_id"]))
+        self._json(404, {"error": self.path})
+
+    def do_GET(self):
+        srv = self.server
+        srv.requests_log.append(("GET", self.path))
+        m = re.fullmatch(r"/v1/batches/([\w-]+)", self.path)
+        if m and m.group(1) in srv.batches:
+            return self._json(200, srv.poll_batch(m.group(1)))
+        m = re.fullmatch(r"/v1/files/([\w-]+)/content", self.path)
+        if m and m.group(1) in srv.files:
+            data = srv.files[m.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self._json(404, {"error": self.path})
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8767
+    server = FakeBatchServer(port)
+    print(f"Fake OpenAI Batch API: {server.base_url}")
+    server.serve_forever()
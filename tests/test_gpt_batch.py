@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+import gpt_batch
+from fake_openai_batch import FakeBatchServer
+
+
+TEXTS = ["say yes 1", "no 2", "say yes 3", "no 4", "say yes 1"]
+
+
+@pytest.fixture
+def server():
+    srv = FakeBatchServer().start()
+    yield srv
+    srv.stop()
+
+
+def build_body(text):
+    return {"model": "gpt-5-mini", "messages": [{"role": "user", "content": text}]}
+
+
+def classify(server, batch_dir, texts=TEXTS, prompt_key="p1", max_wait_sec=60):
+    return gpt_batch.classify_texts_via_batch(
+        server.base_url,
+        "test-key",
+        texts,
+        build_body,
+        str(batch_dir),
+        "labels",
+        prompt_key,
+        max_wait_sec=max_wait_sec,
+        poll_sec=0,
+    )
+
+
+def pending_path(batch_dir):
+    return os.path.join(str(batch_dir), "pending_labels.json")
+
+
+def posts(server, path):
+    return [p for method, p in server.requests_log if method == "POST" and p == path]
+
+
+def test_completed_batch(server, tmp_path):
+    server.polls_to_finish = 2
+    answers, status = classify(server, tmp_path)
+
+    assert status == "completed"
+    assert answers == {"say yes 1": "Y", "no 2": "N", "say yes 3": "Y", "no 4": "N"}
+    # дубль текста в batch не уходит
+    assert len(posts(server, "/v1/batches")) == 1
+    lines = server.files["file-1"].decode("utf-8").splitlines()
+    assert len(lines) == 4
+    assert {json.loads(l)["url"] for l in lines} == {gpt_batch.BATCH_ENDPOINT}
+    assert not os.path.exists(pending_path(tmp_path))
+
+
+def test_resume_pending_batch(server, tmp_path):
+    server.polls_to_finish = 3
+
+    # не дождались: batch запомнен, ответов нет
+    answers, status = classify(server, tmp_path, max_wait_sec=0)
+    assert status == "in_progress"
+    assert answers == {}
+    with open(pending_path(tmp_path), encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["batch_id"] == "batch-1"
+
+    # следующий запуск ждёт тот же batch, а не создаёт новый
+    answers, status = classify(server, tmp_path)
+    assert status == "completed"
+    assert answers["say yes 3"] == "Y"
+    assert len(posts(server, "/v1/batches")) == 1
+    assert not os.path.exists(pending_path(tmp_path))
+
+
+def test_pending_batch_for_another_prompt_is_dropped(server, tmp_path):
+    server.polls_to_finish = 5
+    classify(server, tmp_path, max_wait_sec=0)
+
+    server.polls_to_finish = 0
+    answers, status = classify(server, tmp_path, prompt_key="p2")
+    assert status == "completed"
+    assert len(answers) == 4
+    assert len(posts(server, "/v1/batches")) == 2
+    assert server.polls["batch-1"] == 1
+
+
+def test_expired_batch_keeps_finished_answers(server, tmp_path):
+    server.outcome = "expired"
+    server.expired_done = 2
+    answers, status = classify(server, tmp_path)
+
+    assert status == "expired"
+    assert answers == {"say yes 1": "Y", "no 2": "N"}
+    assert not os.path.exists(pending_path(tmp_path))
+
+    # остальное уходит следующим batch
+    server.outcome = "completed"
+    answers, status = classify(server, tmp_path, texts=["say yes 3", "no 4"])
+    assert status == "completed"
+    assert answers == {"say yes 3": "Y", "no 4": "N"}
+
+
+def test_failed_batch(server, tmp_path):
+    server.outcome = "failed"
+    answers, status = classify(server, tmp_path)
+
+    assert status == "failed"
+    assert answers == {}
+    assert not os.path.exists(pending_path(tmp_path))
+
+
+def test_output_line_without_custom_id_is_skipped(server, tmp_path):
+    server.drop_custom_id = {"t1"}
+    answers, status = classify(server, tmp_path)
+
+    assert status == "completed"
+    assert "no 2" not in answers
+    assert answers == {"say yes 1": "Y", "say yes 3": "Y", "no 4": "N"}
@@ -0,0 +1,56 @@
+import atexit
+
+from label_buffer import LabelWriteBuffer
+
+
+class FlakySheets:
+    """values().batchUpdate(...).execute(): первые fail_times вызовов падают."""
+
+    def __init__(self, fail_times):
+        self.fail_times = fail_times
+        self.calls = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.calls.append(body)
+        return self
+
+    def execute(self):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("sheets down")
+        return {}
+
+
+def test_close_keeps_atexit_when_flush_failed(monkeypatch):
+    unregistered = []
+    monkeypatch.setattr(atexit, "unregister", unregistered.append)
+
+    service = FlakySheets(fail_times=1)
+    buf = LabelWriteBuffer(service, "sid", "TikTok_Posts", "H", flush_rows=100, flush_sec=0)
+    buf.set(0, "Y")
+    buf.set(1, "N")
+
+    buf.close()
+    assert unregistered == []
+    assert len(buf._pending) == 2
+
+    # повтор при выходе дописывает ячейки
+    assert buf.flush() is True
+    assert not buf._pending
+    assert service.calls[-1]["data"] == [{"range": "TikTok_Posts!H2:H3", "values": [["Y"], ["N"]]}]
+
+
+def test_close_unregisters_after_successful_flush(monkeypatch):
+    unregistered = []
+    monkeypatch.setattr(atexit, "unregister", unregistered.append)
+
+    buf = LabelWriteBuffer(FlakySheets(fail_times=0), "sid", "TikTok_Posts", "H", flush_rows=100, flush_sec=0)
+    buf.set(0, "Y")
+    buf.close()
+    assert unregistered == [buf.flush]
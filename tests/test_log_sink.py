@@ -0,0 +1,95 @@
+import threading
+
+import log_sink
+from log_sink import LogSink
+
+
+class FakeService:
+    """Минимальный service.spreadsheets().values() для LogSink."""
+
+    def __init__(self):
+        self.fail = False
+        self.appended = []
+        self.on_append = None
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, **kwargs):
+        return _Call(lambda: {"values": [log_sink.LOGS_HEADER]})
+
+    def update(self, **kwargs):
+        return _Call(lambda: {})
+
+    def append(self, body, **kwargs):
+        def run():
+            if self.on_append:
+                self.on_append()
+            if self.fail:
+                raise OSError("sheets down")
+            self.appended.extend(body["values"])
+            return {}
+
+        return _Call(run)
+
+
+class _Call:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+def make_sink(**kwargs):
+    sink = LogSink("sid", "Logs", flush_rows=1000, flush_sec=0, **kwargs)
+    log_sink.atexit.unregister(sink.flush)
+    return sink
+
+
+def test_failed_flush_keeps_rows_up_to_max():
+    service = FakeService()
+    sink = make_sink(max_rows=5)
+    service.fail = True
+    for i in range(4):
+        sink.add(service, [i])
+    sink.flush()
+    for i in range(4, 8):
+        sink.add(service, [i])
+    sink.flush()
+
+    assert sink.dropped == 3
+    service.fail = False
+    sink.flush()
+    assert service.appended == [[3], [4], [5], [6], [7]]
+
+
+def test_add_does_not_wait_for_append():
+    service = FakeService()
+    sink = make_sink()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_append():
+        started.set()
+        release.wait(5)
+
+    service.on_append = slow_append
+    sink.add(service, ["first"])
+    flusher = threading.Thread(target=sink.flush)
+    flusher.start()
+    assert started.wait(5)
+
+    # append ещё висит, а add уже проходит
+    done = threading.Event()
+    threading.Thread(target=lambda: (sink.add(service, ["second"]), done.set())).start()
+    assert done.wait(1)
+
+    release.set()
+    flusher.join(5)
+    service.on_append = None
+    sink.flush()
+    assert service.appended == [["first"], ["second"]]
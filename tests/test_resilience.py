@@ -0,0 +1,95 @@
+import pytest
+import requests
+
+import http_client
+import resilience
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = resilience.CircuitBreaker("test-upstream", fail_threshold=1, cooldown_sec=60)
+    monkeypatch.setitem(resilience._breakers, "test-upstream", breaker)
+    return breaker
+
+
+def _call(send, classify):
+    policy = resilience.RetryPolicy(max_attempts=1)
+    return resilience.call_with_retry("test-upstream", send, classify, policy)
+
+
+def _by_status(resp, exc):
+    if resp.status_code == 429:
+        return resilience.THROTTLED, None
+    if resp.status_code >= 500:
+        return resilience.RETRY, None
+    return resilience.OK, None
+
+
+def test_throttled_probe_closes_circuit(breaker, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+
+    # open: одна 5xx при fail_threshold=1
+    _call(lambda: FakeResponse(500), _by_status)
+    assert breaker.opened_at is not None
+    with pytest.raises(resilience.CircuitOpenError):
+        _call(lambda: FakeResponse(200), _by_status)
+
+    # cooldown прошёл, пробный запрос получает 429
+    now[0] += 61
+    assert _call(lambda: FakeResponse(429), _by_status).status_code == 429
+    assert not breaker.half_open
+    assert breaker.opened_at is None
+
+    # следующий вызов проходит, а не падает с CircuitOpenError навсегда
+    assert _call(lambda: FakeResponse(200), _by_status).status_code == 200
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens_circuit(breaker, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+
+    _call(lambda: FakeResponse(500), _by_status)
+    now[0] += 61
+    _call(lambda: FakeResponse(502), _by_status)
+    assert breaker.opened_at == now[0]
+    assert not breaker.half_open
+    with pytest.raises(resilience.CircuitOpenError):
+        _call(lambda: FakeResponse(200), _by_status)
+
+
+@pytest.mark.parametrize(
+    "status, headers, idempotent, verdict",
+    [
+        (500, {}, True, resilience.RETRY),
+        (502, {}, False, resilience.FAIL),
+        (504, {}, False, resilience.FAIL),
+        (503, {}, False, resilience.FAIL),
+        (503, {"Retry-After": "5"}, False, resilience.RETRY),
+        (429, {}, False, resilience.THROTTLED),
+        (400, {}, False, resilience.OK),
+        (200, {}, False, resilience.OK),
+    ],
+)
+def test_http_classify_status(status, headers, idempotent, verdict):
+    classify = http_client._classify(idempotent)
+    assert classify(FakeResponse(status, headers), None)[0] == verdict
+
+
+def test_http_classify_exceptions():
+    post = http_client._classify(False)
+    get = http_client._classify(True)
+    assert post(None, requests.exceptions.ConnectTimeout())[0] == resilience.RETRY
+    assert post(None, requests.exceptions.ReadTimeout())[0] == resilience.FAIL
+    assert get(None, requests.exceptions.ReadTimeout())[0] == resilience.RETRY
+    assert post(None, ValueError("boom"))[0] == resilience.FAIL
@@ -0,0 +1,62 @@
+from sheet_reader import load_projected_rows
+
+
+HEADER = ["url", "play_count", "hashtags", "profile_url", "profile_followers", "profile_biography", "batch", "gpt_flag"]
+
+
+class FakeSheets:
+    """values.batchGet по колонкам (majorDimension=COLUMNS), пустой хвост не присылаем."""
+
+    def __init__(self, cols):
+        self.cols = cols
+        self.calls = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, **kw):
+        self.calls.append(("get", kw))
+        raise AssertionError("размер листа не запрашиваем")
+
+    def batchGet(self, spreadsheetId, ranges, **kw):
+        self.calls.append(("batchGet", kw))
+        out = []
+        for rng in ranges:
+            cell_from, cell_to = rng.split("!")[1].split(":")
+            col = self.cols.get(cell_from[0], [])
+            start, end = int(cell_from[1:]) - 2, int(cell_to[1:]) - 1
+            values = col[start:end]
+            while values and values[-1] == "":
+                values = values[:-1]
+            out.append({"values": [values]} if values else {})
+        self._resp = {"valueRanges": out}
+        return self
+
+    def execute(self):
+        return self._resp
+
+
+def test_projected_read_without_row_count_request():
+    n = 12
+    service = FakeSheets({
+        "A": [f"https://t/v{i}" for i in range(n)],
+        "H": ["TRUE" if i % 2 else "" for i in range(n)],
+    })
+    store = load_projected_rows(service, "sid", "TikTok_Posts", HEADER, ["url", "gpt_flag"], chunk_rows=5)
+
+    assert len(store) == n
+    assert store.column("url")[-1] == "https://t/v11"
+    assert store.column("gpt_flag")[:2] == ["", "TRUE"]
+    # 5 + 5 + 2: третий кусок короткий — конец данных
+    assert [kind for kind, _ in service.calls] == ["batchGet"] * 3
+    assert all(kw["valueRenderOption"] == "FORMATTED_VALUE" for _, kw in service.calls)
+
+
+def test_known_row_count_stops_without_extra_read():
+    service = FakeSheets({"A": [f"u{i}" for i in range(10)]})
+    store = load_projected_rows(service, "sid", "TikTok_Posts", HEADER, ["url"], chunk_rows=5, row_count=11)
+    assert len(store) == 10
+    assert len(service.calls) == 2
@@ -0,0 +1,92 @@
+import pytest
+
+from settings_store import SettingsStore
+from sheets_uow import SheetsUnitOfWork
+
+
+class FakeSheets:
+    """spreadsheets().batchUpdate / values().get; fail(body) -> падать ли запросу."""
+
+    def __init__(self, fail=lambda body: False, settings_rows=None):
+        self.fail = fail
+        self.settings_rows = settings_rows or []
+        self.batches = []
+        self._next = None
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        self._next = ("get", None)
+        return self
+
+    def batchUpdate(self, spreadsheetId, body):
+        self._next = ("batch", body)
+        return self
+
+    def execute(self):
+        kind, body = self._next
+        if kind == "get":
+            return {"values": self.settings_rows}
+        if self.fail(body):
+            raise RuntimeError("batchUpdate failed")
+        self.batches.append(body["requests"])
+        return {}
+
+
+def _kinds(requests):
+    return [next(iter(r)) for r in requests]
+
+
+def _new_uow(service):
+    return SheetsUnitOfWork(service, "sid", lambda title: 1)
+
+
+def test_formatting_failure_keeps_appended_rows():
+    service = FakeSheets(fail=lambda body: "copyPaste" in body["requests"][0])
+    uow = _new_uow(service)
+    committed = []
+    uow.append_rows("TikTok_Posts", [["u1", 1], ["u2", 2]], on_commit=lambda: committed.append(True))
+    uow.add_request({"copyPaste": {}}, best_effort=True)
+    uow.add_request({"repeatCell": {}}, best_effort=True)
+
+    uow.commit()
+
+    assert [_kinds(b) for b in service.batches] == [["appendCells"]]
+    assert committed == [True]
+
+
+def test_data_failure_raises_and_skips_formatting():
+    service = FakeSheets(fail=lambda body: "appendCells" in body["requests"][0])
+    uow = _new_uow(service)
+    committed = []
+    uow.append_rows("TikTok_Posts", [["u1", 1]], on_commit=lambda: committed.append(True))
+    uow.add_request({"copyPaste": {}}, best_effort=True)
+
+    with pytest.raises(RuntimeError):
+        uow.commit()
+    assert service.batches == []
+    assert committed == []
+    assert len(uow) == 0
+
+
+def test_settings_value_changes_only_after_commit():
+    rows = [["key", "value"], ["last_cluster_name", "A"]]
+    service = FakeSheets(fail=lambda body: True, settings_rows=rows)
+    store = SettingsStore("sid", "Settings")
+
+    uow = _new_uow(service)
+    store.set(service, "last_cluster_name", "B", uow=uow)
+    assert store.load(service)["last_cluster_name"] == "A"
+    with pytest.raises(RuntimeError):
+        uow.commit()
+    assert store.load(service)["last_cluster_name"] == "A"
+
+    service.fail = lambda body: False
+    uow = _new_uow(service)
+    store.set(service, "last_cluster_name", "B", uow=uow)
+    uow.commit()
+    assert store.load(service)["last_cluster_name"] == "B"
@@ -1,10 +1,52 @@
 import time
+import itertools
 import json
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import daemon_loop
+from gpt_batch import classify_texts_via_batch
+from gpt_cache import GptCache
+from gpt_labeler import (
+    build_packed_prompt,
+    chunked,
+    column_group_text,
+    group_by_column,
+    group_rows_by_key,
+    group_text,
+    parse_concurrency,
+    get_preclassifier,
+    parse_pack_size,
+    parse_packed_answer,
+    run_in_pool,
+)
+import http_client
+from label_buffer import (
+    DEFAULT_FLUSH_ROWS,
+    DEFAULT_FLUSH_SEC,
+    LabelWriteBuffer,
+    parse_flush_settings,
+)
+from log_sink import DEFAULT_LOG_FLUSH_ROWS, DEFAULT_LOG_FLUSH_SEC, DEFAULT_LOG_MAX_ROWS, LogSink
+from posts_mirror import LABEL_IDX, PostsMirror
+from row_store import RowStore
+import resilience
+import run_checkpoints
+from run_context import SHEET_PROPERTIES_FIELDS, RunContext, bootstrap
+from settings_store import SettingsStore
+from sheet_reader import load_projected_rows
+import sheets_quota
+import sheets_rest
+from sheets_uow import SheetsUnitOfWork
+from snapshot_poller import (
+    SnapshotHistory,
+    SnapshotPoll,
+    next_wake_delay,
+    parse_poll_settings,
+    wait_for_snapshot,
+)
+import snapshot_store
 
 # --- читаем конфиг ---
 with open("config.json", "r", encoding="utf-8") as f:
@@ -26,12 +68,76 @@ def _int_from_config(key, default):
 DEFAULT_NUM_OF_POSTS = _int_from_config("DEFAULT_NUM_OF_POSTS", 3000)
 # базовый максимум постов на кластер (можно переопределить в Settings)
 BASE_MAX_POSTS_PER_CLUSTER = _int_from_config("MAX_POSTS_PER_CLUSTER", 3000)
+# cluster_pipeline=on: сколько готовых снапшотов качаем параллельно
+CLUSTER_DOWNLOAD_WORKERS = _int_from_config("CLUSTER_DOWNLOAD_WORKERS", 3)
+# снапшот читаем потоком; как только набралось N новых строк — отправляем
+# их в лист, остаток уходит одним batchUpdate вместе с формулами/форматом
+SNAPSHOT_CHUNK_ROWS = _int_from_config("SNAPSHOT_CHUNK_ROWS", 500)
 
 SPREADSHEET_ID = CONFIG["SPREADSHEET_ID"]
 SERVICE_ACCOUNT_FILE = CONFIG["SERVICE_ACCOUNT_FILE"]
 COMMAND_NAME = CONFIG.get("COMMAND_NAME", "TikTok")
 
 OPENAI_API_KEY = CONFIG.get("OPENAI_API_KEY", "")
+# можно направить на локальный сервер-заглушку (например, для проверки gpt_batch)
+OPENAI_BASE_URL = (CONFIG.get("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+GPT_MODEL = "gpt-5-mini"
+GPT_LABEL_SYSTEM = "Ты классификатор. Отвечай КРАТКО и строго согласно промпту пользователя."
+GPT_CATEGORY_SYSTEM = "Ты классификатор. Отвечай строго согласно промпту пользователя."
+
+# постоянный кэш ответов GPT (общий для TikTok и YouTube; пустой путь — выключен)
+GPT_CACHE_PATH = CONFIG.get("GPT_CACHE_PATH", "gpt_cache.sqlite3")
+GPT_CACHE_MAX_ENTRIES = _int_from_config("GPT_CACHE_MAX_ENTRIES", 200_000)
+
+# папка для JSONL-файлов режима gpt_batch
+GPT_BATCH_DIR = CONFIG.get("GPT_BATCH_DIR", "gpt_batches")
+
+# локальное зеркало TikTok_Posts в SQLite (url/batch/gpt_flag; пустой путь — выключено)
+POSTS_MIRROR_PATH = CONFIG.get("POSTS_MIRROR_PATH", "")
+POSTS_MIRROR_REBUILD_HOURS = _int_from_config("POSTS_MIRROR_REBUILD_HOURS", 24)
+
+# колонки TikTok_Posts читаем кусками по N строк (см. sheet_reader.py)
+SHEET_READ_CHUNK_ROWS = _int_from_config("SHEET_READ_CHUNK_ROWS", 5000)
+
+# история длительностей сборки снапшотов (для предсказания готовности; пустой путь — выключена)
+SNAPSHOT_HISTORY_PATH = CONFIG.get("SNAPSHOT_HISTORY_PATH", "snapshot_history.json")
+
+# сохранённые снапшоты (gzip JSONL) для reprocess без повторного скрейпа; пустой путь — выключено
+SNAPSHOT_STORE_DIR = CONFIG.get("SNAPSHOT_STORE_DIR", "snapshots")
+SNAPSHOT_STORE_MAX_MB = _int_from_config("SNAPSHOT_STORE_MAX_MB", snapshot_store.DEFAULT_MAX_MB)
+SNAPSHOT_STORE_KEEP_DAYS = _int_from_config("SNAPSHOT_STORE_KEEP_DAYS", snapshot_store.DEFAULT_KEEP_DAYS)
+# 1 — если перестали читать снапшот раньше (cluster_limit), докачивать остаток
+# в хранилище (это полная загрузка снапшота); 0 — сохраняем только прочитанное
+SNAPSHOT_STORE_FULL = _int_from_config("SNAPSHOT_STORE_FULL", 0) == 1
+
+# журнал этапов кластеров для продолжения после падения (пустой путь — выключен)
+CHECKPOINT_PATH = CONFIG.get("CHECKPOINT_PATH", "run_checkpoints.json")
+CHECKPOINT_MAX_AGE_HOURS = _int_from_config("CHECKPOINT_MAX_AGE_HOURS", run_checkpoints.DEFAULT_MAX_AGE_HOURS)
+
+# пул HTTP-соединений к Bright Data / OpenAI (keep-alive)
+http_client.configure(
+    pool_hosts=_int_from_config("HTTP_POOL_HOSTS", http_client.DEFAULT_POOL_HOSTS),
+    pool_maxsize=_int_from_config("HTTP_POOL_MAXSIZE", http_client.DEFAULT_POOL_MAXSIZE),
+)
+
+# повторы 429/5xx и circuit breaker для Bright Data / OpenAI / Sheets
+resilience.configure(
+    max_attempts=_int_from_config("RETRY_MAX_ATTEMPTS", resilience.DEFAULT_MAX_ATTEMPTS),
+    base_sec=_int_from_config("RETRY_BASE_SEC", resilience.DEFAULT_BASE_SEC),
+    max_sec=_int_from_config("RETRY_MAX_SEC", resilience.DEFAULT_MAX_SEC),
+    fail_threshold=_int_from_config("CIRCUIT_FAIL_THRESHOLD", resilience.DEFAULT_FAIL_THRESHOLD),
+    cooldown_sec=_int_from_config("CIRCUIT_COOLDOWN_SEC", resilience.DEFAULT_COOLDOWN_SEC),
+)
+
+# поминутные квоты Sheets API (общие для TikTok и YouTube через файл состояния)
+sheets_quota.configure(
+    reads_per_min=_int_from_config("SHEETS_READS_PER_MIN", sheets_quota.DEFAULT_READS_PER_MIN),
+    writes_per_min=_int_from_config("SHEETS_WRITES_PER_MIN", sheets_quota.DEFAULT_WRITES_PER_MIN),
+    state_path=CONFIG.get("SHEETS_QUOTA_STATE_PATH", "sheets_quota.json"),
+)
+
+# клиент Sheets: rest — лёгкий sheets_rest (быстрый старт), discovery — googleapiclient
+SHEETS_CLIENT = (CONFIG.get("SHEETS_CLIENT") or "rest").strip().lower()
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
@@ -54,22 +160,78 @@ HEADER = [
     "gpt_flag",
 ]
 
+# колонки, которые пишем в лист строкой как есть (RAW), даже если значение
+# похоже на число или формулу; play_count / profile_followers — числами
+TEXT_COLUMNS = ("url", "hashtags", "profile_url", "profile_biography", "batch")
+
 BOT_VERSION = "2025-11-28_gpt5mini_stream_v1"
 
+# статусы снапшота, после которых его уже не скачать
+SNAPSHOT_FAILED_STATUSES = ("failed", "error", "canceled", "canceling")
+
 # для анти-дубляжа логов
 _last_log_key = None
 
+# буфер строк для листа Logs
+_log_sink = LogSink(
+    SPREADSHEET_ID,
+    SHEET_LOGS,
+    flush_rows=_int_from_config("LOG_FLUSH_ROWS", DEFAULT_LOG_FLUSH_ROWS),
+    flush_sec=_int_from_config("LOG_FLUSH_SEC", DEFAULT_LOG_FLUSH_SEC),
+    max_rows=_int_from_config("LOG_MAX_ROWS", DEFAULT_LOG_MAX_ROWS),
+)
+
+# Settings: читаем один раз на процесс, пишем по одной ячейке
+_settings_store = SettingsStore(SPREADSHEET_ID, SHEET_SETTINGS)
+
+# сервис Google Sheets (строим один раз на процесс)
+_sheets_service = None
+
 # кэш sheetId по названию листа
 _sheet_id_cache = {}
 
+# то, что прочитано одним запросом в начале запуска (см. bootstrap_run)
+_run_ctx = RunContext(SPREADSHEET_ID)
+
+# кэш ответов GPT (открываем один раз на процесс)
+_gpt_cache = None
+_gpt_cache_lock = threading.Lock()
+
+# история сборок снапшотов (читаем файл один раз на процесс)
+_snapshot_history = None
+
+# зеркало TikTok_Posts (открываем один раз на процесс)
+_posts_mirror = None
+
+# журнал этапов кластеров (читаем файл один раз на процесс)
+_checkpoints = None
+
+# хранилище скачанных снапшотов
+_snapshot_store = None
+
 
 # ---------- сервис Google Sheets ----------
 
 def get_sheets_service():
-    creds = Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES
-    )
-    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+    """Сервис Sheets строится один раз на процесс (в daemon живёт между циклами)."""
+    global _sheets_service
+    if _sheets_service is None:
+        creds = sheets_rest.load_credentials(SERVICE_ACCOUNT_FILE, SCOPES)
+        # каждый запрос сначала берёт токен у sheets_quota
+        if SHEETS_CLIENT == "discovery":
+            # googleapiclient импортируется только в этом режиме
+            from googleapiclient.discovery import build
+
+            _sheets_service = build(
+                "sheets",
+                "v4",
+                credentials=creds,
+                cache_discovery=False,
+                requestBuilder=sheets_quota.quota_request_class(),
+            )
+        else:
+            _sheets_service = sheets_rest.SheetsClient(creds)
+    return _sheets_service
 
 
 def get_sheet_id(service, sheet_title):
@@ -79,7 +241,8 @@ def get_sheet_id(service, sheet_title):
         return _sheet_id_cache[sheet_title]
 
     spreadsheet = service.spreadsheets().get(
-        spreadsheetId=SPREADSHEET_ID
+        spreadsheetId=SPREADSHEET_ID,
+        fields=SHEET_PROPERTIES_FIELDS,
     ).execute()
     for sheet in spreadsheet.get("sheets", []):
         props = sheet.get("properties", {})
@@ -91,16 +254,43 @@ def get_sheet_id(service, sheet_title):
     raise RuntimeError(f"Sheet '{sheet_title}' not found")
 
 
+def new_sheets_uow(service):
+    """Unit of work: записи кластера копятся и уходят одним batchUpdate."""
+    return SheetsUnitOfWork(
+        service,
+        SPREADSHEET_ID,
+        lambda sheet_title: get_sheet_id(service, sheet_title),
+    )
+
+
+def bootstrap_run(service):
+    """
+    Холодный старт: Settings, Clusters и шапка TikTok_Posts одним
+    values.batchGet, sheetId всех листов одним spreadsheets.get с маской.
+    Дальше load_settings / load_clusters / ensure_data_header / get_sheet_id
+    берут это из памяти.
+    """
+    global _run_ctx
+    _run_ctx = bootstrap(
+        service,
+        SPREADSHEET_ID,
+        [_settings_store.range, f"{SHEET_CLUSTERS}!A:D", f"{SHEET_DATA}!A1:H1"],
+    )
+    _sheet_id_cache.update(_run_ctx.sheet_ids())
+    if _settings_store.range in _run_ctx.values:
+        _settings_store.prime(_run_ctx.values[_settings_store.range])
+
+
 # ---------- логирование в Logs ----------
 
 def write_log(service, action, cluster_name, details):
     """
-    Пишет лог в лист Logs.
+    Пишет лог в лист Logs (через буфер _log_sink: строки уходят пачкой
+    одним append, шапка проверяется один раз на процесс).
     Не дублирует подряд одинаковые action+cluster_name+details.
     """
     global _last_log_key
 
-    sheet = service.spreadsheets()
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     action_text = action or ""
@@ -113,109 +303,34 @@ def write_log(service, action, cluster_name, details):
         return
     _last_log_key = key
 
-    row = [[ts, action_text, cluster_text, details_text]]
+    _log_sink.add(service, [ts, action_text, cluster_text, details_text])
 
-    # создаём шапку, если лист пустой
-    try:
-        resp = sheet.values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{SHEET_LOGS}!A1:D1",
-        ).execute()
-        values = resp.get("values", [])
-        if not values:
-            sheet.values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range=f"{SHEET_LOGS}!A1",
-                valueInputOption="RAW",
-                body={
-                    "values": [
-                        ["timestamp", "action", "cluster_name", "details"]
-                    ]
-                },
-            ).execute()
-    except Exception as e:
-        print("LOG: error while ensuring header:", e)
 
-    sheet.values().append(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_LOGS}!A1",
-        valueInputOption="RAW",
-        insertDataOption="INSERT_ROWS",
-        body={"values": row},
-    ).execute()
+def flush_logs():
+    """Сбрасывает накопленные логи в Logs (конец кластера / прогона)."""
+    _log_sink.flush()
 
 
 # ---------- чтение / запись Settings ----------
 
-def load_settings(service):
-    sheet = service.spreadsheets()
-    resp = sheet.values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_SETTINGS}!A:B",
-    ).execute()
-    values = resp.get("values", [])
-    settings = {}
-    if not values:
-        return settings
-    # пропускаем заголовок
-    for row in values[1:]:
-        if len(row) >= 2:
-            key = (row[0] or "").strip()
-            value = (row[1] or "").strip()
-            if key:
-                settings[key] = value
-    return settings
-
-
-def update_setting(service, key, new_value):
-    """Используем, например, для last_cluster_name."""
-    sheet = service.spreadsheets()
-    resp = sheet.values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_SETTINGS}!A:B",
-    ).execute()
-    values = resp.get("values", [])
-    if not values:
-        values = [["key", "value"]]
-
-    # гарантируем шапку
-    if values[0][0] != "key":
-        values.insert(0, ["key", "value"])
-
-    found = False
-    for row in values[1:]:
-        if len(row) >= 1 and row[0] == key:
-            if len(row) == 1:
-                row.append(str(new_value))
-            else:
-                row[1] = str(new_value)
-            found = True
-            break
+def load_settings(service, refresh=False):
+    """{key: value} из Settings (кэш на процесс, refresh=True — перечитать лист)."""
+    return _settings_store.load(service, refresh=refresh)
 
-    if not found:
-        values.append([key, str(new_value)])
 
-    sheet.values().clear(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_SETTINGS}!A:B",
-    ).execute()
-    sheet.values().update(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_SETTINGS}!A1",
-        valueInputOption="RAW",
-        body={"values": values},
-    ).execute()
+def update_setting(service, key, new_value, uow=None):
+    """
+    Используем, например, для last_cluster_name.
+    Пишет одну ячейку B{строка ключа} (новый ключ — новой строкой);
+    с uow запись уйдёт вместе с остальными при uow.commit().
+    """
+    _settings_store.set(service, key, new_value, uow=uow)
 
 
 # ---------- чтение кластеров ----------
 
 def load_clusters(service):
-    sheet = service.spreadsheets()
-    resp = sheet.values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_CLUSTERS}!A:D",
-    ).execute()
-    values = resp.get("values", [])
+    values = _run_ctx.get_values(service, f"{SHEET_CLUSTERS}!A:D")
     if len(values) <= 1:
         return {}
 
@@ -262,6 +377,97 @@ def load_data_sheet(service):
     return header, rows
 
 
+def get_posts_mirror(service):
+    """
+    Зеркало TikTok_Posts (см. posts_mirror.py), догнанное до текущего листа.
+    None — зеркало выключено или не открылось (работаем по-старому, через лист).
+    """
+    global _posts_mirror
+    if not POSTS_MIRROR_PATH:
+        return None
+    if _posts_mirror is None:
+        try:
+            _posts_mirror = PostsMirror(
+                POSTS_MIRROR_PATH,
+                SPREADSHEET_ID,
+                SHEET_DATA,
+                rebuild_hours=POSTS_MIRROR_REBUILD_HOURS,
+            )
+        except Exception as e:
+            print("Posts mirror open error:", repr(e))
+            _posts_mirror = False
+    if not _posts_mirror:
+        return None
+    try:
+        _posts_mirror.sync(service)
+    except Exception as e:
+        print("Posts mirror sync error:", repr(e))
+        return None
+    return _posts_mirror
+
+
+def _posts_columns(header, label_column, target_column):
+    """Колонки TikTok_Posts, нужные для дедупа и GPT-разметки."""
+    url_column = header[0] if header else HEADER[0]
+    return [url_column, "profile_url", target_column, label_column]
+
+
+def _posts_intern_columns(label_column, target_column):
+    """Колонки с повторами (у всех строк профиля одни и те же) — интернируем в RowStore."""
+    return ["profile_url", target_column, label_column]
+
+
+def load_posts_rows(service, header, label_column, target_column, start_row=2):
+    """
+    Строки TikTok_Posts начиная со строки листа start_row, но только с
+    колонками url / profile_url / target / label (остальные ячейки — ""),
+    кусками через values.batchGet (см. sheet_reader.py), в RowStore по колонкам.
+    """
+    return load_projected_rows(
+        service,
+        SPREADSHEET_ID,
+        SHEET_DATA,
+        header,
+        _posts_columns(header, label_column, target_column),
+        start_row=start_row,
+        chunk_rows=SHEET_READ_CHUNK_ROWS,
+        intern_columns=_posts_intern_columns(label_column, target_column),
+    )
+
+
+def load_posts_for_update(service, label_column, target_column):
+    """
+    Строки TikTok_Posts для дописывания / GPT-разметки.
+    Возвращает (header, rows, first_row, existing_urls):
+    rows — RowStore со строками листа начиная со строки first_row (только
+    нужные колонки, см. load_posts_rows).
+
+    Без зеркала — весь лист (first_row=2) и set() всех url.
+    С зеркалом — из листа читаем только хвост от первой строки с пустой
+    меткой (или ничего, если всё размечено), а дедуп идёт по индексу зеркала.
+    """
+    header = ensure_data_header(service) or HEADER
+    mirror = get_posts_mirror(service)
+
+    if mirror is None:
+        first_row = 2
+        rows = load_posts_rows(service, header, label_column, target_column)
+        existing_urls = {u.strip() for u in rows.column(0)}
+        existing_urls.discard("")
+    else:
+        first_row = 2
+        if label_column in header and header.index(label_column) == LABEL_IDX:
+            first_row = mirror.first_pending_row() or mirror.last_row() + 1
+        if first_row <= mirror.last_row():
+            rows = load_posts_rows(service, header, label_column, target_column, start_row=first_row)
+        else:
+            rows = RowStore(header, _posts_columns(header, label_column, target_column),
+                            _posts_intern_columns(label_column, target_column))
+        existing_urls = mirror.url_set()
+
+    return header, rows, first_row, existing_urls
+
+
 def save_data_sheet(service, header, rows):
     """
     Старая функция "жёсткой" перезаписи A:H.
@@ -318,11 +524,7 @@ def save_gpt_labels_only(service, header, rows, label_column):
 
     col_letter = _idx_to_col_letter(label_idx)
 
-    col_values = []
-    for r in rows:
-        if len(r) <= label_idx:
-            r = r + [""] * (label_idx + 1 - len(r))
-        col_values.append([r[label_idx]])
+    col_values = [[v] for v in rows.column(label_idx)]
 
     sheet = service.spreadsheets()
     try:
@@ -337,20 +539,18 @@ def save_gpt_labels_only(service, header, rows, label_column):
 
 
 def ensure_data_header(service):
-    sheet = service.spreadsheets()
-    resp = sheet.values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_DATA}!A1:H1",
-    ).execute()
-    values = resp.get("values", [])
+    header_range = f"{SHEET_DATA}!A1:H1"
+    values = _run_ctx.get_values(service, header_range)
     if not values:
-        sheet.values().update(
+        service.spreadsheets().values().update(
             spreadsheetId=SPREADSHEET_ID,
             range=f"{SHEET_DATA}!A1",
             valueInputOption="RAW",
             body={"values": [HEADER]},
         ).execute()
-        return HEADER
+        values = [HEADER]
+    # шапка за запуск не меняется — дальше берём из памяти
+    _run_ctx.put(header_range, values)
     return values[0]
 
 
@@ -400,6 +600,63 @@ def normalize_followers(val):
 
 # ---------- GPT: бинарный классификатор (ответ как есть) ----------
 
+def get_gpt_cache():
+    """
+    Общий кэш ответов GPT (SQLite, см. gpt_cache.py).
+    Открываем один раз на процесс; None — если кэш выключен или не открылся.
+    """
+    global _gpt_cache
+    if not GPT_CACHE_PATH:
+        return None
+    with _gpt_cache_lock:
+        if _gpt_cache is None:
+            try:
+                _gpt_cache = GptCache(GPT_CACHE_PATH, max_entries=GPT_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                print("GPT cache open error:", repr(e))
+                _gpt_cache = False
+    return _gpt_cache or None
+
+
+def log_gpt_cache_stats(service, cluster_name):
+    cache = get_gpt_cache()
+    if cache is None:
+        return
+    stats = cache.stats_text()
+    print(f"[GPT_CACHE][{cluster_name}] {stats}")
+    write_log(service, "gpt_cache", cluster_name, stats)
+
+
+def log_api_stats(service, label):
+    """
+    Ожидание квоты Sheets (sheets_quota.py) и повторы / срабатывания
+    circuit breaker по внешним API (resilience.py).
+    """
+    for action, stats in (
+        ("sheets_quota", sheets_quota.stats_text()),
+        ("api_retries", resilience.stats_text()),
+    ):
+        if not stats:
+            continue
+        print(f"[{action.upper()}][{label}] {stats}")
+        write_log(service, action, label, stats)
+
+
+def build_gpt_payload(system_content, prompt_base, text):
+    """Тело chat/completions для одного текста (его же кладём в batch-файл)."""
+    user_content = prompt_base.strip() + "\n\nТекст:\n" + text
+    return {
+        "model": GPT_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_content,
+            },
+            {"role": "user", "content": user_content},
+        ],
+    }
+
+
 def call_gpt_label(prompt_base, text):
     """
     Вызывает GPT и возвращает РОВНО то, что модель ответила
@@ -416,30 +673,29 @@ def call_gpt_label(prompt_base, text):
     else:
         text = str(text)
 
+    system_content = GPT_LABEL_SYSTEM
+
+    cache = get_gpt_cache()
+    cache_prompt = system_content + "\n" + prompt_base.strip()
+    if cache is not None:
+        cached = cache.get(GPT_MODEL, cache_prompt, text)
+        if cached is not None:
+            return cached
+
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
     }
 
-    user_content = prompt_base.strip() + "\n\nТекст:\n" + text
-
-    payload = {
-        "model": "gpt-5-mini",
-        "messages": [
-            {
-                "role": "system",
-                "content": "Ты классификатор. Отвечай КРАТКО и строго согласно промпту пользователя.",
-            },
-            {"role": "user", "content": user_content},
-        ],
-    }
+    payload = build_gpt_payload(system_content, prompt_base, text)
 
     try:
-        resp = requests.post(
-            "https://api.openai.com/v1/chat/completions",
+        resp = http_client.post(
+            f"{OPENAI_BASE_URL}/chat/completions",
             headers=headers,
             json=payload,
             timeout=60,
+            idempotent=True,
         )
     except Exception as e:
         print("GPT request error:", e)
@@ -456,11 +712,15 @@ def call_gpt_label(prompt_base, text):
             .get("message", {})
             .get("content", "")
         )
-        return (content or "").strip()
+        answer = (content or "").strip()
     except Exception as e:
         print("GPT parse error:", e)
         return ""
 
+    if answer and cache is not None:
+        cache.put(GPT_MODEL, cache_prompt, text, answer)
+    return answer
+
 
 # ---------- GPT: категории 1–5 для US_Based (ответ как есть) ----------
 
@@ -477,30 +737,29 @@ def call_gpt_category_5(prompt_base, text):
     else:
         text = str(text)
 
+    system_content = GPT_CATEGORY_SYSTEM
+
+    cache = get_gpt_cache()
+    cache_prompt = system_content + "\n" + prompt_base.strip()
+    if cache is not None:
+        cached = cache.get(GPT_MODEL, cache_prompt, text)
+        if cached is not None:
+            return cached
+
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
     }
 
-    user_content = prompt_base.strip() + "\n\nТекст:\n" + text
-
-    payload = {
-        "model": "gpt-5-mini",
-        "messages": [
-            {
-                "role": "system",
-                "content": "Ты классификатор. Отвечай строго согласно промпту пользователя.",
-            },
-            {"role": "user", "content": user_content},
-        ],
-    }
+    payload = build_gpt_payload(system_content, prompt_base, text)
 
     try:
-        resp = requests.post(
-            "https://api.openai.com/v1/chat/completions",
+        resp = http_client.post(
+            f"{OPENAI_BASE_URL}/chat/completions",
             headers=headers,
             json=payload,
             timeout=60,
+            idempotent=True,
         )
     except Exception as e:
         print("GPT request error (categories):", e)
@@ -517,11 +776,105 @@ def call_gpt_category_5(prompt_base, text):
             .get("message", {})
             .get("content", "")
         )
-        return (content or "").strip()
+        answer = (content or "").strip()
     except Exception as e:
         print("GPT parse error (categories):", e)
         return ""
 
+    if answer and cache is not None:
+        cache.put(GPT_MODEL, cache_prompt, text, answer)
+    return answer
+
+
+# ---------- GPT: несколько текстов в одном запросе ----------
+
+def call_gpt_packed(prompt_base, texts, system_content, single_call):
+    """
+    Классифицирует сразу несколько текстов одним запросом
+    (JSON-ответ {id: ответ}, см. gpt_labeler.build_packed_prompt).
+
+    Возвращает список ответов в порядке texts. Ответы из кэша в запрос
+    не попадают. Если ответ не разобрался (или каких-то id в нём нет) —
+    для этих текстов падаем обратно на single_call(prompt_base, text).
+    """
+    if not OPENAI_API_KEY:
+        return [""] * len(texts)
+
+    texts = ["" if t is None else str(t) for t in texts]
+    answers = [None] * len(texts)
+
+    cache = get_gpt_cache()
+    cache_prompt = system_content + "\n" + prompt_base.strip()
+    if cache is not None:
+        for i, text in enumerate(texts):
+            answers[i] = cache.get(GPT_MODEL, cache_prompt, text)
+
+    missing = [i for i, a in enumerate(answers) if a is None]
+    if len(missing) > 1:
+        headers = {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "model": GPT_MODEL,
+            "messages": [
+                {"role": "system", "content": system_content},
+                {
+                    "role": "user",
+                    "content": build_packed_prompt(prompt_base, [texts[i] for i in missing]),
+                },
+            ],
+            "response_format": {"type": "json_object"},
+        }
+
+        content = ""
+        try:
+            resp = http_client.post(
+                f"{OPENAI_BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=120,
+                idempotent=True,
+            )
+            if resp.status_code == 200:
+                data = resp.json()
+                content = (
+                    data.get("choices", [{}])[0]
+                    .get("message", {})
+                    .get("content", "")
+                ) or ""
+            else:
+                print("GPT HTTP error (packed):", resp.status_code, resp.text[:200])
+        except Exception as e:
+            print("GPT request error (packed):", e)
+
+        parsed = parse_packed_answer(content, len(missing))
+        for i, answer in zip(missing, parsed):
+            if answer is None:
+                continue
+            answers[i] = answer
+            if cache is not None:
+                cache.put(GPT_MODEL, cache_prompt, texts[i], answer)
+
+        fallback = sum(1 for a in parsed if a is None)
+        if fallback:
+            print(f"GPT packed: malformed/missing answers={fallback}/{len(missing)}, fallback to single calls")
+
+    for i, answer in enumerate(answers):
+        if answer is None:
+            answers[i] = single_call(prompt_base, texts[i])
+    return answers
+
+
+def call_gpt_label_batch(prompt_base, texts):
+    """Пакетный вариант call_gpt_label."""
+    return call_gpt_packed(prompt_base, texts, GPT_LABEL_SYSTEM, call_gpt_label)
+
+
+def call_gpt_category_5_batch(prompt_base, texts):
+    """Пакетный вариант call_gpt_category_5."""
+    return call_gpt_packed(prompt_base, texts, GPT_CATEGORY_SYSTEM, call_gpt_category_5)
+
 
 # ---------- GPT массовая разметка TikTok_Posts ----------
 
@@ -534,6 +887,13 @@ def apply_gpt_labels(
     label_column,
     prompt_base,
     log_every=10,
+    concurrency=1,
+    flush_rows=DEFAULT_FLUSH_ROWS,
+    flush_sec=DEFAULT_FLUSH_SEC,
+    group_column="profile_url",
+    pack_size=1,
+    preclassifier=None,
+    first_row=2,
 ):
     """
     Идём ВСЕГДА сверху вниз по всем строкам.
@@ -541,10 +901,20 @@ def apply_gpt_labels(
 
     Логика:
     - если label_column уже НЕ пустая -> не трогаем;
-    - если label_column пустая -> шлём текст в GPT;
-    - что вернул GPT -> пишем в label_column;
-    - после КАЖДОЙ строки пушим всю колонку в Google Sheets,
-      чтобы прогресс сохранялся в реал-тайме.
+    - если label_column пустая -> шлём текст в GPT
+      (до concurrency запросов одновременно, см. gpt_concurrency в Settings);
+    - если задан preclassifier (gpt_preclassifier=script) — очевидные случаи
+      (пусто / чистый ASCII / явно не-латинская письменность) решаем локально,
+      в GPT уходит только спорный остаток;
+    - строки одного профиля (group_column, по умолчанию profile_url)
+      классифицируем одним запросом и раскладываем ответ на все строки профиля;
+    - что вернул GPT -> пишем в label_column тех же строк;
+    - изменённые ячейки копим в LabelWriteBuffer и отправляем одним
+      values.batchUpdate раз в flush_rows строк / flush_sec секунд
+      (и ещё раз в конце / при выходе), чтобы прогресс не терялся.
+
+    rows[0] — строка листа first_row (2, если передан весь лист;
+    с зеркалом TikTok_Posts сюда приходит только хвост листа).
     """
     try:
         text_idx = header.index(target_column)
@@ -553,18 +923,15 @@ def apply_gpt_labels(
         print("GPT: не найдена колонка", target_column, "или", label_column)
         return rows, 0
 
-    # выравниваем строки до длины шапки
-    for i, r in enumerate(rows):
-        if len(r) < len(header):
-            rows[i] = r + [""] * (len(header) - len(r))
-        elif len(r) > len(header):
-            rows[i] = r[: len(header)]
-
-    total_to_process = 0
-    for r in rows:
-        label = (r[label_idx] or "").strip()
-        if not label:
-            total_to_process += 1
+    # колонки RowStore без копий: метки, тексты, ключ группировки
+    labels = rows.column(label_idx)
+    texts = rows.column(text_idx)
+    pending_idx = [
+        row_idx
+        for row_idx, label in enumerate(labels)
+        if not (label or "").strip()
+    ]
+    total_to_process = len(pending_idx)
 
     if total_to_process == 0:
         msg = "nothing_to_process: все метки уже заполнены"
@@ -572,37 +939,87 @@ def apply_gpt_labels(
         write_log(service, "gpt_progress", cluster_name or "ALL", msg)
         return rows, 0
 
-    print(
-        f"[GPT] Старт разметки ({cluster_name or 'ALL'}). "
-        f"Всего к обработке строк (label пустой): {total_to_process}"
-    )
-
     processed = 0
 
-    for row_idx, r in enumerate(rows):
-        current_label = (r[label_idx] or "").strip()
-        if current_label:
-            continue
+    # био — свойство профиля: классифицируем профиль один раз
+    # и раскладываем ответ на все его строки
+    group_keys = rows.column(group_column) if group_column in header else None
+    groups = group_by_column(group_keys, pending_idx)
+    calls_saved = len(pending_idx) - len(groups)
+    total_profiles = len(groups)
 
-        text = r[text_idx] if text_idx < len(r) else ""
-        gpt_answer = call_gpt_label(prompt_base, text)
+    print(
+        f"[GPT] Старт разметки ({cluster_name or 'ALL'}). "
+        f"Всего к обработке строк (label пустой): {total_to_process}, "
+        f"уникальных профилей: {len(groups)} (экономим запросов: {calls_saved}), "
+        f"параллельно запросов: {concurrency}, текстов в запросе: {pack_size}"
+    )
 
-        if gpt_answer != "":
-            r[label_idx] = gpt_answer
+    # пишем в Sheets только изменённые ячейки, пачками (write-behind)
+    label_buffer = LabelWriteBuffer(
+        service,
+        SPREADSHEET_ID,
+        SHEET_DATA,
+        _idx_to_col_letter(label_idx),
+        flush_rows=flush_rows,
+        flush_sec=flush_sec,
+        first_row=first_row,
+        on_flush=_posts_mirror.on_cells_written if _posts_mirror else None,
+    )
 
-        processed += 1
+    # локальный пре-классификатор: очевидные случаи решаем без GPT
+    if preclassifier is not None and groups:
+        verdicts = preclassifier([column_group_text(texts, group) for group in groups])
+        gpt_groups = []
+        local_rows = 0
+        for group, verdict in zip(groups, verdicts):
+            if not verdict:
+                gpt_groups.append(group)
+                continue
+            for row_idx in group:
+                rows.set(row_idx, label_idx, verdict)
+                label_buffer.set(row_idx, verdict)
+                local_rows += 1
+        local_msg = (
+            f"rows={local_rows} profiles={len(groups) - len(gpt_groups)} "
+            f"to_gpt_profiles={len(gpt_groups)}"
+        )
+        print(f"[GPT][{cluster_name or 'ALL'}] preclassified locally: {local_msg}")
+        write_log(service, "gpt_preclassified", cluster_name or "ALL", local_msg)
+        processed += local_rows
+        groups = gpt_groups
 
-        # сохраняем прогресс КАЖДУЮ строку
-        try:
-            save_gpt_labels_only(service, header, rows, label_column)
-        except Exception as e:
-            print("[GPT] error while saving partial GPT labels:", repr(e))
+    # pack_size > 1 — несколько профилей в одном GPT-запросе
+    chunks = chunked(groups, pack_size)
 
-        if log_every and processed % log_every == 0:
-            msg = f"processed={processed}/{total_to_process}"
-            print(f"[GPT][{cluster_name or 'ALL'}] {msg}")
+    def _label_chunk(chunk):
+        chunk_texts = [column_group_text(texts, group) for group in chunk]
+        if len(chunk_texts) == 1:
+            return [call_gpt_label(prompt_base, chunk_texts[0])]
+        return call_gpt_label_batch(prompt_base, chunk_texts)
 
-    final_msg = f"processed={processed}/{total_to_process} (final)"
+    # до concurrency запросов в полёте; ответ пишем в "свои" строки по row_idx
+    try:
+        for chunk, answers in run_in_pool(chunks, _label_chunk, concurrency):
+            answers = answers or [""] * len(chunk)
+            for group, gpt_answer in zip(chunk, answers):
+                for row_idx in group:
+                    if gpt_answer != "":
+                        rows.set(row_idx, label_idx, gpt_answer)
+                        label_buffer.set(row_idx, gpt_answer)
+
+                    processed += 1
+
+                    if log_every and processed % log_every == 0:
+                        msg = f"processed={processed}/{total_to_process}"
+                        print(f"[GPT][{cluster_name or 'ALL'}] {msg}")
+    finally:
+        label_buffer.close()
+
+    final_msg = (
+        f"processed={processed}/{total_to_process} "
+        f"profiles={total_profiles} calls_saved={calls_saved} (final)"
+    )
     write_log(
         service,
         "gpt_progress",
@@ -648,7 +1065,7 @@ def start_scrape_for_urls(urls, limit_per_input=None, total_limit=None):
 
     inputs = [{"url": u, "num_of_posts": DEFAULT_NUM_OF_POSTS} for u in urls]
 
-    resp = requests.post(
+    resp = http_client.post(
         base_url,
         headers=headers,
         params=params,
@@ -682,144 +1099,315 @@ def get_snapshot_status(snapshot_id):
     """Проверка статуса снапшота: running / ready / failed ..."""
     url = f"https://api.brightdata.com/datasets/v3/progress/{snapshot_id}"
     headers = {"Authorization": f"Bearer {BRIGHTDATA_API_KEY}"}
-    resp = requests.get(url, headers=headers, timeout=60)
+    resp = http_client.get(url, headers=headers, timeout=60)
     if resp.status_code != 200:
         raise RuntimeError(f"Status error: {resp.status_code} {resp.text[:200]}")
     return resp.json().get("status", "")
 
 
-def download_snapshot(snapshot_id, max_wait_sec=600, poll_sec=30):
+def get_snapshot_store():
+    """Хранилище снапшотов (snapshot_store.py) или None, если выключено."""
+    global _snapshot_store
+    if _snapshot_store is None and SNAPSHOT_STORE_DIR:
+        try:
+            _snapshot_store = snapshot_store.SnapshotStore(
+                SNAPSHOT_STORE_DIR, SNAPSHOT_STORE_MAX_MB, SNAPSHOT_STORE_KEEP_DAYS
+            )
+        except Exception as e:
+            print("Snapshot store open error:", repr(e))
+    return _snapshot_store
+
+
+def snapshot_meta(cluster_name):
+    """Метаданные снапшота для хранилища (по ним reprocess находит файлы кластера)."""
+    return {"command": COMMAND_NAME, "cluster": cluster_name}
+
+
+def open_snapshot_stream(snapshot_id, max_wait_sec=600, poll_sec=30, stop=None):
     """
-    Качает snapshot. Если Bright Data отвечает 202 (status=building),
-    ждём и повторяем, пока не получим 200 или не упремся в max_wait_sec.
+    GET снапшота в формате NDJSON потоком (stream=True), ответ 200.
+    202 (status=building) — ждём poll_sec и повторяем до max_wait_sec.
+    stop (threading.Event) выставлен, пока ждём, — возвращаем None.
     """
-    url = f"https://api.brightdata.com/datasets/v3/snapshot/{snapshot_id}?format=json"
+    url = f"https://api.brightdata.com/datasets/v3/snapshot/{snapshot_id}?format=ndjson"
     headers = {"Authorization": f"{'Bearer ' + BRIGHTDATA_API_KEY}"}
 
     waited = 0
     while True:
-        resp = requests.get(url, headers=headers, timeout=300)
+        resp = http_client.get(url, headers=headers, timeout=300, stream=True)
 
         if resp.status_code == 200:
-            data = resp.json()
-            if not isinstance(data, list):
-                raise RuntimeError("Expected JSON array from snapshot")
-            return data
+            return resp
+
+        text = resp.text[:200]
+        resp.close()
 
         if resp.status_code == 202:
             print(
-                f"Snapshot building (202), waited={waited} sec, msg={resp.text[:200]}"
+                f"Snapshot building (202), waited={waited} sec, msg={text}"
             )
             if waited >= max_wait_sec:
                 raise RuntimeError(
-                    f"Download timeout after {waited} sec: {resp.text[:200]}"
+                    f"Download timeout after {waited} sec: {text}"
                 )
+            if stop is not None and stop.is_set():
+                return None
             time.sleep(poll_sec)
             waited += poll_sec
             continue
 
-        raise RuntimeError(f"Download error: {resp.status_code} {resp.text[:200]}")
+        raise RuntimeError(f"Download error: {resp.status_code} {text}")
 
 
-# ---------- пост-обработка листа: формулы и формат чисел ----------
-
-def extend_formulas_hij(service, last_row):
+def iter_snapshot_posts(snapshot_id, max_wait_sec=600, poll_sec=30, meta=None, spool=None):
     """
-    Копирует формулы из H2:J2 на H2:J{last_row}
-    (как будто ты протянул формулы вниз).
+    Генератор постов снапшота: качаем в формате NDJSON потоком
+    (stream=True) и разбираем по одной строке, не держа в памяти
+    ни всё тело ответа, ни весь список постов.
+
+    Если Bright Data отвечает 202 (status=building), ждём и повторяем,
+    пока не получим 200 или не упремся в max_wait_sec.
+    Если вызывающий код перестал читать (break) — соединение закрывается.
+
+    Скачанные строки сохраняются в хранилище снапшотов (meta — кластер и т.п.);
+    снапшот, уже сохранённый целиком, читается с диска.
+
+    spool — снапшот уже скачан фоном во временный файл (prefetch_snapshot):
+    строки берём оттуда, а не из сети; удаляет файл вызывающий код.
     """
-    if last_row < 2:
+    store = get_snapshot_store()
+    if store and store.has_complete(snapshot_id):
+        print(f"Снапшот {snapshot_id}: читаем из локального хранилища")
+        yield from store.iter_posts(snapshot_id)
         return
 
-    sheet_id = get_sheet_id(service, SHEET_DATA)
+    if spool is not None:
+        resp = None
+        lines = spool.lines()
+    else:
+        resp = open_snapshot_stream(snapshot_id, max_wait_sec, poll_sec)
+        lines = resp.iter_lines()
 
-    requests_body = {
-        "requests": [
-            {
-                "copyPaste": {
-                    "source": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": 1,   # row 2
-                        "endRowIndex": 2,
-                        "startColumnIndex": 7,  # H
-                        "endColumnIndex": 10,   # J
-                    },
-                    "destination": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": 1,   # row 2
-                        "endRowIndex": last_row,
-                        "startColumnIndex": 7,
-                        "endColumnIndex": 10,
-                    },
-                    "pasteType": "PASTE_FORMULA",
-                    "pasteOrientation": "NORMAL",
-                }
-            }
-        ]
-    }
+    writer = None
+    if store:
+        try:
+            writer = store.writer(snapshot_id, meta)
+        except Exception as e:
+            print("Snapshot store write error:", repr(e))
+    complete = False
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if writer:
+                writer.write(line)
+            # на всякий случай: если пришёл обычный JSON-массив одной строкой
+            yield from snapshot_store.parse_line(line)
+        complete = True
+    except GeneratorExit:
+        # перестали читать (cluster_limit): остаток из сети качаем только
+        # при SNAPSHOT_STORE_FULL, иначе в хранилище остаётся прочитанная
+        # часть (complete=False — reprocess её берёт, повторно снапшот качается);
+        # файл фоновой загрузки уже на диске — его дописываем всегда
+        if writer and (SNAPSHOT_STORE_FULL or spool is not None):
+            complete = writer.drain(lines)
+        raise
+    finally:
+        if resp is not None:
+            resp.close()
+        else:
+            lines.close()
+        if writer:
+            try:
+                writer.finish(complete)
+            except Exception as e:
+                print("Snapshot store write error:", repr(e))
+
+
+def prefetch_snapshot(snapshot_id, max_wait_sec=600, poll_sec=30, stop=None):
+    """
+    Фоновая загрузка (cluster_pipeline): снапшот целиком во временный файл
+    (SnapshotSpool), а не списком постов в память. Посты из файла читает
+    основной поток — iter_snapshot_posts(..., spool=...), с тем же break по
+    cluster_limit, что и при чтении из сети; файл закрывает (удаляет) он же.
 
+    None — снапшот уже целиком в хранилище (читать оттуда) или загрузку
+    остановили через stop (threading.Event): соединение закрыто, файла нет.
+    """
+    store = get_snapshot_store()
+    if store and store.has_complete(snapshot_id):
+        return None
+    resp = open_snapshot_stream(snapshot_id, max_wait_sec, poll_sec, stop)
+    if resp is None:
+        return None
     try:
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=SPREADSHEET_ID,
-            body=requests_body,
-        ).execute()
-    except Exception as e:
-        print("extend_formulas_hij error:", repr(e))
+        return snapshot_store.SnapshotSpool.download(resp.iter_lines(), stop)
+    finally:
+        resp.close()
+
 
+def get_snapshot_history():
+    global _snapshot_history
+    if _snapshot_history is None:
+        _snapshot_history = SnapshotHistory(SNAPSHOT_HISTORY_PATH)
+    return _snapshot_history
 
-def format_column_e_numbers(service, last_row):
+
+def new_snapshot_poll(opts, cluster_name, input_count, resumed=False):
     """
-    Ставит формат чисел без десятичных в колонке E (profile_followers)
-    для строк 2..last_row.
+    Расписание опросов снапшота (backoff + предсказание по истории).
+    resumed — снапшот из прошлого запуска: его возраст неизвестен, историю не трогаем.
     """
-    if last_row < 2:
-        return
+    return SnapshotPoll(
+        opts["wait_bright_min"] * 60,
+        min_sec=opts["poll_min_sec"],
+        max_sec=opts["poll_max_sec"],
+        backoff=opts["poll_backoff"],
+        history=None if resumed else get_snapshot_history(),
+        history_key=f"{COMMAND_NAME}|{cluster_name}|{input_count}",
+    )
 
-    sheet_id = get_sheet_id(service, SHEET_DATA)
 
-    requests_body = {
-        "requests": [
-            {
-                "repeatCell": {
-                    "range": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": 1,      # row 2
-                        "endRowIndex": last_row,
-                        "startColumnIndex": 4,   # E
-                        "endColumnIndex": 5,
-                    },
-                    "cell": {
-                        "userEnteredFormat": {
-                            "numberFormat": {
-                                "type": "NUMBER",
-                                "pattern": "0",
-                            }
-                        }
-                    },
-                    "fields": "userEnteredFormat.numberFormat",
-                }
-            }
-        ]
-    }
+# ---------- журнал этапов кластеров (продолжение после падения) ----------
 
-    try:
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=SPREADSHEET_ID,
-            body=requests_body,
-        ).execute()
-    except Exception as e:
-        print("format_column_e_numbers error:", repr(e))
+def get_checkpoints():
+    global _checkpoints
+    if _checkpoints is None:
+        _checkpoints = run_checkpoints.CheckpointJournal(CHECKPOINT_PATH, CHECKPOINT_MAX_AGE_HOURS)
+    return _checkpoints
 
 
-def extend_us_based_verdict_formulas(service, last_data_row, last_formula_row):
+def cluster_fingerprint(opts, cluster_data):
+    """Поменялись URL или лимиты кластера — снапшот прошлого запуска не подходит."""
+    return run_checkpoints.fingerprint(
+        cluster_data["urls"], opts["bright_limit_per_input"], opts["bright_total_limit"]
+    )
+
+
+def resume_cluster_checkpoint(service, opts, cluster_name, cluster_data):
     """
-    Протягивает формулу Verdict (колонка G) с last_formula_row до last_data_row.
-    last_* — 1-based номера строк в листе US_Based.
+    Запись журнала незавершённого запуска для кластера или None.
+    Снапшот, который Bright Data уже не отдаёт, не используем — кластер
+    запустится заново.
     """
-    if not last_formula_row or last_formula_row < 2:
-        return
-    if last_data_row <= last_formula_row:
-        return
+    journal = get_checkpoints()
+    checkpoint = journal.get(cluster_name, cluster_fingerprint(opts, cluster_data))
+    if checkpoint is None:
+        return None
+
+    snapshot_id = checkpoint.get("snapshot_id")
+    stage = checkpoint["stage"]
+    if stage not in run_checkpoints.STAGES_AFTER_APPEND:
+        try:
+            status = get_snapshot_status(snapshot_id) if snapshot_id else "missing"
+        except Exception as e:
+            status = f"error {e!r}"
+        if not snapshot_id or status in SNAPSHOT_FAILED_STATUSES or status.startswith("error"):
+            print(f"[{cluster_name}] Снапшот прошлого запуска {snapshot_id} недоступен ({status}), запускаем заново")
+            write_log(
+                service,
+                "checkpoint_dropped",
+                cluster_name,
+                f"snapshot_id={snapshot_id} stage={stage} status={status}",
+            )
+            journal.clear(cluster_name)
+            return None
+
+    print(
+        f"[{cluster_name}] Продолжаем прошлый запуск: stage={stage}, "
+        f"snapshot_id={snapshot_id}, rows={checkpoint.get('rows', 0)}"
+    )
+    write_log(
+        service,
+        "cluster_resumed",
+        cluster_name,
+        f"stage={stage} snapshot_id={snapshot_id} rows={checkpoint.get('rows', 0)}",
+    )
+    return checkpoint
+
+
+# ---------- пост-обработка листа: формулы и формат чисел ----------
+
+def extend_formulas_hij(uow, last_row):
+    """
+    Копирует формулы из H2:J2 на H2:J{last_row}
+    (как будто ты протянул формулы вниз).
+    Запрос копится в uow и уходит при uow.commit() после строк; его ошибка
+    только печатается.
+    """
+    if last_row < 2:
+        return
+
+    sheet_id = uow.sheet_id(SHEET_DATA)
+    uow.add_request(
+        {
+            "copyPaste": {
+                "source": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": 1,   # row 2
+                    "endRowIndex": 2,
+                    "startColumnIndex": 7,  # H
+                    "endColumnIndex": 10,   # J
+                },
+                "destination": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": 1,   # row 2
+                    "endRowIndex": last_row,
+                    "startColumnIndex": 7,
+                    "endColumnIndex": 10,
+                },
+                "pasteType": "PASTE_FORMULA",
+                "pasteOrientation": "NORMAL",
+            }
+        },
+        best_effort=True,
+    )
+
+
+def format_column_e_numbers(uow, last_row):
+    """
+    Ставит формат чисел без десятичных в колонке E (profile_followers)
+    для строк 2..last_row. Запрос копится в uow.
+    """
+    if last_row < 2:
+        return
+
+    sheet_id = uow.sheet_id(SHEET_DATA)
+    uow.add_request(
+        {
+            "repeatCell": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": 1,      # row 2
+                    "endRowIndex": last_row,
+                    "startColumnIndex": 4,   # E
+                    "endColumnIndex": 5,
+                },
+                "cell": {
+                    "userEnteredFormat": {
+                        "numberFormat": {
+                            "type": "NUMBER",
+                            "pattern": "0",
+                        }
+                    }
+                },
+                "fields": "userEnteredFormat.numberFormat",
+            }
+        },
+        best_effort=True,
+    )
+
+
+def extend_us_based_verdict_formulas(service, last_data_row, last_formula_row):
+    """
+    Протягивает формулу Verdict (колонка G) с last_formula_row до last_data_row.
+    last_* — 1-based номера строк в листе US_Based.
+    """
+    if not last_formula_row or last_formula_row < 2:
+        return
+    if last_data_row <= last_formula_row:
+        return
 
     try:
         sheet_id = get_sheet_id(service, SHEET_US_BASED)
@@ -865,30 +1453,26 @@ def extend_us_based_verdict_formulas(service, last_data_row, last_formula_row):
 
 # ---------- обработка одного кластера ----------
 
-def process_cluster(service, settings, cluster_name, cluster_data, with_gpt=True):
-    """
-    Полный цикл по одному кластеру:
-    Bright Data -> добавление строчек в TikTok_Posts -> (опционально) GPT-разметка.
-
-    ВАЖНО:
-    - НЕ чистим и НЕ перезаливаем весь лист TikTok_Posts.
-    - Только ДОПИСЫВАЕМ новые строки (и протягиваем формулы/формат).
-    """
-    urls = cluster_data["urls"]
-    wait_bright_min = int(settings.get("wait_bright_min", "20"))
-    gpt_target_column = settings.get("gpt_target_column", "profile_biography")
-    gpt_label_column = settings.get("gpt_label_column", "gpt_flag")
-    gpt_prompt = settings.get(
-        "gpt_prompt",
-        "Only Y or N. If bio is fully in English or empty → Y. If it contains any non-English letters → N.",
-    )
-    status_poll_sec = int(settings.get("status_poll_sec", "1"))
+def _cluster_options(settings):
+    """Настройки кластера из Settings (общие для всех фаз process_cluster)."""
+    opts = {
+        "wait_bright_min": int(settings.get("wait_bright_min", "20")),
+        "gpt_target_column": settings.get("gpt_target_column", "profile_biography"),
+        "gpt_label_column": settings.get("gpt_label_column", "gpt_flag"),
+        "gpt_prompt": settings.get(
+            "gpt_prompt",
+            "Only Y or N. If bio is fully in English or empty → Y. If it contains any non-English letters → N.",
+        ),
+        "status_poll_sec": int(settings.get("status_poll_sec", "1")),
+    }
+    opts["poll_min_sec"], opts["poll_max_sec"], opts["poll_backoff"] = parse_poll_settings(settings)
 
     cluster_limit_raw = settings.get("max_posts_per_cluster", None)
     try:
         cluster_limit = int(cluster_limit_raw) if cluster_limit_raw else BASE_MAX_POSTS_PER_CLUSTER
     except Exception:
         cluster_limit = BASE_MAX_POSTS_PER_CLUSTER
+    opts["cluster_limit"] = cluster_limit
 
     bright_limit_per_input_raw = settings.get("bright_limit_per_input", "").strip()
     bright_total_limit_raw = settings.get("bright_total_limit", "").strip()
@@ -897,29 +1481,47 @@ def process_cluster(service, settings, cluster_name, cluster_data, with_gpt=True
         bright_limit_per_input = int(bright_limit_per_input_raw) if bright_limit_per_input_raw else DEFAULT_NUM_OF_POSTS
     except Exception:
         bright_limit_per_input = DEFAULT_NUM_OF_POSTS
+    opts["bright_limit_per_input"] = bright_limit_per_input
 
     try:
         bright_total_limit = int(bright_total_limit_raw) if bright_total_limit_raw else cluster_limit
     except Exception:
         bright_total_limit = cluster_limit
+    opts["bright_total_limit"] = bright_total_limit
 
     gpt_log_every_raw = settings.get("gpt_log_every", "10")
     try:
-        gpt_log_every = max(1, int(gpt_log_every_raw))
+        opts["gpt_log_every"] = max(1, int(gpt_log_every_raw))
     except Exception:
-        gpt_log_every = 10
+        opts["gpt_log_every"] = 10
+    opts["gpt_concurrency"] = parse_concurrency(settings)
+    opts["gpt_flush_rows"], opts["gpt_flush_sec"] = parse_flush_settings(settings)
+    opts["gpt_pack_size"] = parse_pack_size(settings)
+    opts["gpt_preclassifier"] = get_preclassifier(settings)
+    return opts
+
+
+def trigger_cluster(service, opts, cluster_name, cluster_data):
+    """1. Запускает снапшот Bright Data по URL-ам кластера. Возвращает snapshot_id."""
+    urls = cluster_data["urls"]
 
     print("\n================ Новый кластер ================")
     print("Кластер:", cluster_name, "URL-ов:", len(urls))
     write_log(service, "start_cluster", cluster_name, f"urls={len(urls)}")
 
-    # 1. Bright Data
     result = start_scrape_for_urls(
         urls,
-        limit_per_input=bright_limit_per_input,
-        total_limit=bright_total_limit,
+        limit_per_input=opts["bright_limit_per_input"],
+        total_limit=opts["bright_total_limit"],
     )
     snapshot_id = result["snapshot_id"]
+    get_checkpoints().mark(
+        cluster_name,
+        run_checkpoints.STAGE_TRIGGERED,
+        snapshot_id=snapshot_id,
+        fingerprint=cluster_fingerprint(opts, cluster_data),
+        rows=0,
+    )
     write_log(
         service,
         "bright_async_started",
@@ -927,183 +1529,486 @@ def process_cluster(service, settings, cluster_name, cluster_data, with_gpt=True
         f"snapshot_id={snapshot_id}",
     )
     print("ASYNC, snapshot_id =", snapshot_id)
+    return snapshot_id
 
-    poll_sec = status_poll_sec
-    max_progress_wait = wait_bright_min * 60
-    waited = 0
 
-    last_status_logged = None
-    while True:
-        status = get_snapshot_status(snapshot_id)
-        if status != last_status_logged:
-            write_log(service, "snapshot_status", cluster_name, status)
-            last_status_logged = status
-        print(f"Статус снапшота: {status}, waited={waited} sec")
+def check_cluster_snapshot(service, cluster_name, snapshot_id, waited, max_progress_wait, last_status_logged):
+    """
+    Один опрос статуса снапшота.
+    Возвращает (state, status): state = ready / failed / timeout / running.
+    """
+    status = get_snapshot_status(snapshot_id)
+    if status != last_status_logged:
+        write_log(service, "snapshot_status", cluster_name, status)
+    print(f"[{cluster_name}] Статус снапшота: {status}, waited={waited} sec")
+
+    if status == "ready":
+        get_checkpoints().mark(cluster_name, run_checkpoints.STAGE_READY)
+        return "ready", status
+    if status in SNAPSHOT_FAILED_STATUSES:
+        print(
+            f"Снапшот завершился с ошибочным статусом ({status}). Пропускаем кластер."
+        )
+        get_checkpoints().clear(cluster_name)
+        write_log(
+            service,
+            "snapshot_failed",
+            cluster_name,
+            f"status={status} waited={waited}",
+        )
+        return "failed", status
 
-        if status == "ready":
-            break
-        if status in ("failed", "error", "canceled", "canceling"):
-            print(
-                f"Снапшот завершился с ошибочным статусом ({status}). Пропускаем кластер."
-            )
-            write_log(
-                service,
-                "snapshot_failed",
-                cluster_name,
-                f"status={status} waited={waited}",
-            )
-            return
+    if waited >= max_progress_wait:
+        print("Таймаут ожидания статуса ready. Пропускаем кластер.")
+        write_log(
+            service,
+            "snapshot_timeout_status",
+            cluster_name,
+            f"waited={waited}",
+        )
+        return "timeout", status
 
-        if waited >= max_progress_wait:
-            print("Таймаут ожидания статуса ready. Пропускаем кластер.")
-            write_log(
-                service,
-                "snapshot_timeout_status",
-                cluster_name,
-                f"waited={waited}",
-            )
-            return
+    return "running", status
 
-        time.sleep(poll_sec)
-        waited += poll_sec
 
-    posts = download_snapshot(
-        snapshot_id,
-        max_wait_sec=wait_bright_min * 60,
-        poll_sec=poll_sec,
-    )
+def wait_cluster_snapshot(service, opts, cluster_name, cluster_data, snapshot_id, resumed=False):
+    """2. Ждёт статуса ready. True — можно качать, False — пропускаем кластер."""
+    max_progress_wait = opts["wait_bright_min"] * 60
+    poll = new_snapshot_poll(opts, cluster_name, len(cluster_data["urls"]), resumed=resumed)
+    last_status = [None]
 
-    if not posts:
-        print(f"[{cluster_name}] Постов нет.")
-        write_log(service, "no_posts", cluster_name, "0 posts")
-        return
+    def check(waited):
+        state, last_status[0] = check_cluster_snapshot(
+            service, cluster_name, snapshot_id, waited, max_progress_wait, last_status[0]
+        )
+        return state
 
-    original_posts_len = len(posts)
-    if cluster_limit > 0 and original_posts_len > cluster_limit:
-        posts = posts[:cluster_limit]
-    used_posts_len = len(posts)
+    return wait_for_snapshot(poll, check) == "ready"
 
-    write_log(
-        service,
-        "snapshot_downloaded",
-        cluster_name,
-        f"posts_original={original_posts_len} posts_used={used_posts_len} "
-        f"cluster_limit={cluster_limit} bright_total_limit={bright_total_limit}",
+
+def _append_data_rows(uow, rows_to_append, cluster_name=None):
+    """
+    Ставит строки в очередь uow (appendCells); журнал этапов (счётчик строк
+    кластера) и зеркало узнают о них после commit().
+    """
+    journal = get_checkpoints() if cluster_name else None
+    mirror = _posts_mirror
+
+    def on_commit():
+        if journal:
+            journal.add_rows(cluster_name, len(rows_to_append))
+        if mirror:
+            mirror.append_rows(rows_to_append)
+
+    uow.append_rows(
+        SHEET_DATA,
+        rows_to_append,
+        on_commit=on_commit,
+        raw_columns=[HEADER.index(c) for c in TEXT_COLUMNS],
     )
-    print(f"[{cluster_name}] Snapshot downloaded: original={original_posts_len}, used={used_posts_len}")
 
+
+def append_cluster_posts(service, opts, cluster_name, posts, with_gpt=True, uow=None, rows_done=0):
+    """
+    3–6. Дописывает новые посты в TikTok_Posts, (опционально) GPT, формулы/формат.
+
+    posts — любой iterable (обычно генератор iter_snapshot_posts): читаем
+    по одному и перестаём, как только набрали cluster_limit НОВЫХ строк
+    (rows_done — сколько из них уже дописал прерванный прошлый запуск).
+
+    Все записи копятся в uow (SheetsUnitOfWork): строки (appendCells),
+    формулы (copyPaste) и формат (repeatCell) уходят одним batchUpdate.
+    Каждые SNAPSHOT_CHUNK_ROWS новых строк uow отправляется сразу, чтобы
+    не держать в памяти весь снапшот; при with_gpt строки отправляются до
+    GPT (метки пишутся в уже существующие строки). Если uow передал
+    вызывающий код, последний commit() за ним (туда же он добавит
+    last_cluster_name).
+    """
+    own_uow = uow is None
+    if own_uow:
+        uow = new_sheets_uow(service)
+    cluster_limit = opts["cluster_limit"]
+    limit = cluster_limit - rows_done
     batch_label = (
         datetime.now().strftime("%Y-%m-%d %H:%M")
         + f" | {COMMAND_NAME} | {cluster_name}"
     )
     print("batch_label:", batch_label)
 
-    # 4. Работа с таблицей
-    ensure_data_header(service)
-    header, old_rows = load_data_sheet(service)
-    if not header:
-        header = HEADER
-
-    norm_old_rows = []
-    for r in old_rows:
-        if len(r) < len(header):
-            r = r + [""] * (len(header) - len(r))
-        elif len(r) > len(header):
-            r = r[: len(header)]
-        norm_old_rows.append(r)
-
-    rows = list(norm_old_rows)
-    old_count = len(rows)
+    # 4. Работа с таблицей: rows — строки листа начиная с first_row
+    header, rows, first_row, existing_urls = load_posts_for_update(
+        service, opts["gpt_label_column"], opts["gpt_target_column"]
+    )
+    old_count = first_row - 2 + len(rows)
 
-    # множество уже известных url
-    existing_urls = set()
-    for r in rows:
-        if not r:
-            continue
-        url_val = (r[0] or "").strip()
-        if url_val:
+    posts_read = 0
+    new_appended = 0
+    chunk = []
+    try:
+        for p in posts:
+            if cluster_limit > 0 and new_appended >= limit:
+                break
+            posts_read += 1
+            url_val = (p.get("url", "") or "").strip()
+            if not url_val:
+                continue
+            if url_val in existing_urls:
+                continue
             existing_urls.add(url_val)
 
-    rows_to_append = []
-    for p in posts:
-        url_val = (p.get("url", "") or "").strip()
-        if not url_val:
-            continue
-        if url_val in existing_urls:
-            continue
-        existing_urls.add(url_val)
-
-        followers_val = normalize_followers(p.get("profile_followers", ""))
-        new_row = [
-            p.get("url", ""),
-            p.get("play_count") or p.get("playcount") or "",
-            json.dumps(
-                p.get("hashtags", []), ensure_ascii=False
-            ) if p.get("hashtags") else "",
-            p.get("profile_url", ""),
-            followers_val,
-            p.get("profile_biography", ""),
-            batch_label,
-            "",
-        ]
-        if len(new_row) < len(header):
-            new_row = new_row + [""] * (len(header) - len(new_row))
-        elif len(new_row) > len(header):
-            new_row = new_row[: len(header)]
-
-        rows.append(new_row)
-        rows_to_append.append(new_row)
-
-    sheet = service.spreadsheets()
+            followers_val = normalize_followers(p.get("profile_followers", ""))
+            new_row = [
+                p.get("url", ""),
+                p.get("play_count") or p.get("playcount") or "",
+                json.dumps(
+                    p.get("hashtags", []), ensure_ascii=False
+                ) if p.get("hashtags") else "",
+                p.get("profile_url", ""),
+                followers_val,
+                p.get("profile_biography", ""),
+                batch_label,
+                "",
+            ]
+            if len(new_row) < len(header):
+                new_row = new_row + [""] * (len(header) - len(new_row))
+            elif len(new_row) > len(header):
+                new_row = new_row[: len(header)]
+
+            rows.append(new_row)
+            chunk.append(new_row)
+            new_appended += 1
+
+            if len(chunk) + uow.rows_pending >= SNAPSHOT_CHUNK_ROWS:
+                _append_data_rows(uow, chunk, cluster_name)
+                uow.commit()
+                chunk = []
+    except Exception:
+        # уже разобранные строки не теряем: снапшот стоил денег
+        if chunk:
+            _append_data_rows(uow, chunk, cluster_name)
+            uow.commit()
+        raise
+    finally:
+        # генератор: закрываем соединение, даже если дочитали не до конца
+        if hasattr(posts, "close"):
+            posts.close()
+
+    get_checkpoints().mark(cluster_name, run_checkpoints.STAGE_DOWNLOADED)
+    if chunk:
+        _append_data_rows(uow, chunk, cluster_name)
+
+    if not posts_read:
+        print(f"[{cluster_name}] Постов нет.")
+        write_log(service, "no_posts", cluster_name, "0 posts")
+        uow.on_commit(lambda: get_checkpoints().clear(cluster_name))
+        if own_uow:
+            uow.commit()
+        return
 
-    if rows_to_append:
-        sheet.values().append(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{SHEET_DATA}!A1",
-            valueInputOption="USER_ENTERED",
-            insertDataOption="INSERT_ROWS",
-            body={"values": rows_to_append},
-        ).execute()
+    write_log(
+        service,
+        "snapshot_downloaded",
+        cluster_name,
+        f"posts_read={posts_read} posts_used={new_appended} "
+        f"cluster_limit={cluster_limit} bright_total_limit={opts['bright_total_limit']}",
+    )
+    print(f"[{cluster_name}] Snapshot downloaded: read={posts_read}, used={new_appended}")
 
     write_log(
         service,
         "rows_appended",
         cluster_name,
-        f"old={old_count} new_appended={len(rows_to_append)} total={len(rows)}",
+        f"old={old_count} new_appended={new_appended} total={old_count + new_appended}",
     )
-    print(f"[{cluster_name}] rows_appended: old={old_count}, new={len(rows_to_append)}, total={len(rows)}")
+    print(f"[{cluster_name}] rows_appended: old={old_count}, new={new_appended}, total={old_count + new_appended}")
+
+    finish_cluster_posts(service, opts, cluster_name, header, rows, first_row, uow, own_uow, with_gpt=with_gpt)
+
 
-    # 6. GPT-разметка (опционально)
+def finish_cluster_posts(service, opts, cluster_name, header, rows, first_row, uow, own_uow, with_gpt=True):
+    """6. (опционально) GPT-разметка, формулы/формат, cluster_done."""
+    journal = get_checkpoints()
     if with_gpt:
+        uow.commit()
+        journal.mark(cluster_name, run_checkpoints.STAGE_APPENDED)
         rows, gpt_count = apply_gpt_labels(
             service,
             cluster_name,
             header,
             rows,
-            gpt_target_column,
-            gpt_label_column,
-            gpt_prompt,
-            log_every=gpt_log_every,
+            opts["gpt_target_column"],
+            opts["gpt_label_column"],
+            opts["gpt_prompt"],
+            log_every=opts["gpt_log_every"],
+            concurrency=opts["gpt_concurrency"],
+            flush_rows=opts["gpt_flush_rows"],
+            flush_sec=opts["gpt_flush_sec"],
+            pack_size=opts["gpt_pack_size"],
+            preclassifier=opts["gpt_preclassifier"],
+            first_row=first_row,
         )
         write_log(service, "gpt_done", cluster_name, f"processed={gpt_count}")
         print(f"[{cluster_name}] GPT done, processed={gpt_count}")
+        journal.mark(cluster_name, run_checkpoints.STAGE_LABELED)
 
-    total_rows = len(rows) + 1  # + заголовок
+    total_rows = first_row - 1 + len(rows)  # последняя строка листа (с заголовком)
+    rows_total = total_rows - 1
 
-    extend_formulas_hij(service, total_rows)
-    format_column_e_numbers(service, total_rows)
+    extend_formulas_hij(uow, total_rows)
+    format_column_e_numbers(uow, total_rows)
+    # кластер закрыт, когда ушёл последний batchUpdate (у вызывающего — с last_cluster_name)
+    uow.on_commit(lambda: journal.clear(cluster_name))
+    if own_uow:
+        uow.commit()
 
     write_log(
         service,
         "cluster_done",
         cluster_name,
-        f"rows_total={len(rows)}",
+        f"rows_total={rows_total}",
+    )
+    flush_logs()
+    print(f"[{cluster_name}] cluster_done, rows_total={rows_total}")
+
+
+def resume_cluster_posts(service, opts, cluster_name, checkpoint, with_gpt=True, uow=None):
+    """
+    Продолжение с этапа appended / labeled: строки уже в листе, снапшот не
+    качаем — только GPT (если прошлый запуск её не закончил) и формулы/формат.
+    """
+    own_uow = uow is None
+    if own_uow:
+        uow = new_sheets_uow(service)
+    header, rows, first_row, _ = load_posts_for_update(
+        service, opts["gpt_label_column"], opts["gpt_target_column"]
+    )
+    labeled = checkpoint["stage"] == run_checkpoints.STAGE_LABELED
+    finish_cluster_posts(
+        service, opts, cluster_name, header, rows, first_row, uow, own_uow, with_gpt=with_gpt and not labeled
+    )
+
+
+def process_cluster(service, settings, cluster_name, cluster_data, with_gpt=True, uow=None):
+    """
+    Полный цикл по одному кластеру:
+    Bright Data -> добавление строчек в TikTok_Posts -> (опционально) GPT-разметка.
+
+    ВАЖНО:
+    - НЕ чистим и НЕ перезаливаем весь лист TikTok_Posts.
+    - Только ДОПИСЫВАЕМ новые строки (и протягиваем формулы/формат).
+    - uow — см. append_cluster_posts (None — коммитим сами).
+    - если прошлый запуск оборвался, продолжаем по журналу этапов
+      (снапшот заново не запускаем).
+    """
+    opts = _cluster_options(settings)
+
+    checkpoint = resume_cluster_checkpoint(service, opts, cluster_name, cluster_data)
+    if checkpoint and checkpoint["stage"] in run_checkpoints.STAGES_AFTER_APPEND:
+        resume_cluster_posts(service, opts, cluster_name, checkpoint, with_gpt=with_gpt, uow=uow)
+        return
+
+    if checkpoint:
+        snapshot_id = checkpoint["snapshot_id"]
+    else:
+        snapshot_id = trigger_cluster(service, opts, cluster_name, cluster_data)
+    resumed = checkpoint is not None
+    if not wait_cluster_snapshot(service, opts, cluster_name, cluster_data, snapshot_id, resumed=resumed):
+        return
+
+    posts = iter_snapshot_posts(
+        snapshot_id,
+        max_wait_sec=opts["wait_bright_min"] * 60,
+        poll_sec=opts["status_poll_sec"],
+        meta=snapshot_meta(cluster_name),
     )
-    print(f"[{cluster_name}] cluster_done, rows_total={len(rows)}")
+    rows_done = checkpoint.get("rows", 0) if checkpoint else 0
+    append_cluster_posts(service, opts, cluster_name, posts, with_gpt=with_gpt, uow=uow, rows_done=rows_done)
 
 
 # ---------- прогон по активным кластерам ----------
 
+def _log_cluster_error(service, cluster_name, e):
+    print(
+        "Ошибка при обработке кластера",
+        cluster_name,
+        ":",
+        repr(e),
+    )
+    write_log(
+        service,
+        "cluster_error",
+        cluster_name,
+        repr(e),
+    )
+    flush_logs()
+
+
+def _run_clusters_sequential(service, settings, active_clusters, with_gpt):
+    """Старый режим: кластер за кластером (trigger -> ждём -> качаем -> пишем)."""
+    for cluster_name, cluster_data in active_clusters:
+        try:
+            uow = new_sheets_uow(service)
+            process_cluster(service, settings, cluster_name, cluster_data, with_gpt=with_gpt, uow=uow)
+            update_setting(service, "last_cluster_name", cluster_name, uow=uow)
+            uow.commit()
+        except Exception as e:
+            _log_cluster_error(service, cluster_name, e)
+
+
+def _discard_prefetched(fut):
+    """Колбэк фоновой загрузки, результат которой не понадобился: удаляем файл."""
+    if fut.cancelled() or fut.exception() is not None:
+        return
+    spool = fut.result()
+    if spool is not None:
+        spool.close()
+
+
+def _run_clusters_pipelined(service, settings, active_clusters, with_gpt):
+    """
+    Конвейер (cluster_pipeline=on):
+    1. сразу запускаем снапшоты ВСЕХ активных кластеров;
+    2. одним циклом опрашиваем статусы всех ещё не готовых снапшотов
+       (у каждого своё расписание, см. snapshot_poller.py), готовый снапшот сразу уходит качаться в фоновый поток
+       — во временный файл (prefetch_snapshot), не в память;
+    3. дописываем в TikTok_Posts / GPT / last_cluster_name строго в порядке
+       order — как только скачан очередной по порядку кластер; посты читаем
+       из файла генератором с тем же break по cluster_limit, что и без конвейера.
+
+    Время прогона ~ max(время сборки снапшота) вместо суммы по кластерам.
+    Все записи в таблицу — только из основного потока.
+    """
+    opts = _cluster_options(settings)
+    poll_sec = opts["status_poll_sec"]
+    max_progress_wait = opts["wait_bright_min"] * 60
+
+    # job: snapshot_id, poll, status, future, result, checkpoint
+    # result: None (ещё в работе) / ("posts", SnapshotSpool или None) / ("resume", None) / ("skip", None) / ("error", e)
+    jobs = {}
+    for cluster_name, cluster_data in active_clusters:
+        job = {"snapshot_id": None, "poll": None, "status": None, "future": None, "result": None, "checkpoint": None}
+        try:
+            checkpoint = resume_cluster_checkpoint(service, opts, cluster_name, cluster_data)
+            job["checkpoint"] = checkpoint
+            if checkpoint and checkpoint["stage"] in run_checkpoints.STAGES_AFTER_APPEND:
+                job["result"] = ("resume", None)
+            elif checkpoint:
+                job["snapshot_id"] = checkpoint["snapshot_id"]
+                job["poll"] = new_snapshot_poll(opts, cluster_name, len(cluster_data["urls"]), resumed=True)
+            else:
+                job["snapshot_id"] = trigger_cluster(service, opts, cluster_name, cluster_data)
+                job["poll"] = new_snapshot_poll(opts, cluster_name, len(cluster_data["urls"]))
+        except Exception as e:
+            job["result"] = ("error", e)
+        jobs[cluster_name] = job
+
+    write_log(
+        service,
+        "pipeline_triggered",
+        "",
+        f"clusters={len(active_clusters)}",
+    )
+
+    workers = max(1, min(CLUSTER_DOWNLOAD_WORKERS, len(active_clusters)))
+    next_idx = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while next_idx < len(active_clusters):
+                # опрос статусов / готовых загрузок
+                for cluster_name, _ in active_clusters[next_idx:]:
+                    job = jobs[cluster_name]
+                    if job["result"] is not None:
+                        continue
+
+                    fut = job["future"]
+                    if fut is not None:
+                        if not fut.done():
+                            continue
+                        try:
+                            job["result"] = ("posts", fut.result())
+                        except Exception as e:
+                            job["result"] = ("error", e)
+                        continue
+
+                    poll = job["poll"]
+                    if not poll.due():
+                        continue
+                    try:
+                        state, job["status"] = check_cluster_snapshot(
+                            service, cluster_name, job["snapshot_id"], poll.waited(), max_progress_wait, job["status"]
+                        )
+                    except Exception as e:
+                        job["result"] = ("error", e)
+                        continue
+
+                    if state == "running":
+                        poll.schedule_next()
+                    elif state == "ready":
+                        poll.mark_ready()
+                        job["future"] = pool.submit(
+                            prefetch_snapshot,
+                            job["snapshot_id"],
+                            max_wait_sec=max_progress_wait,
+                            poll_sec=poll_sec,
+                        )
+                    else:
+                        job["result"] = ("skip", None)
+
+                # сливаем готовые кластеры строго по порядку
+                while next_idx < len(active_clusters):
+                    cluster_name, _ = active_clusters[next_idx]
+                    job = jobs[cluster_name]
+                    result = job["result"]
+                    if result is None:
+                        break
+                    next_idx += 1
+
+                    kind, value = result
+                    if kind == "error":
+                        _log_cluster_error(service, cluster_name, value)
+                        continue
+                    try:
+                        uow = new_sheets_uow(service)
+                        checkpoint = job["checkpoint"]
+                        if kind == "posts":
+                            rows_done = checkpoint.get("rows", 0) if checkpoint else 0
+                            posts = iter_snapshot_posts(
+                                job["snapshot_id"],
+                                max_wait_sec=max_progress_wait,
+                                poll_sec=poll_sec,
+                                meta=snapshot_meta(cluster_name),
+                                spool=value,
+                            )
+                            append_cluster_posts(
+                                service, opts, cluster_name, posts, with_gpt=with_gpt, uow=uow, rows_done=rows_done
+                            )
+                        elif kind == "resume":
+                            resume_cluster_posts(service, opts, cluster_name, checkpoint, with_gpt=with_gpt, uow=uow)
+                        update_setting(service, "last_cluster_name", cluster_name, uow=uow)
+                        uow.commit()
+                    except Exception as e:
+                        _log_cluster_error(service, cluster_name, e)
+                    finally:
+                        if kind == "posts" and value is not None:
+                            value.close()
+
+                if next_idx < len(active_clusters):
+                    # спим до ближайшего опроса; пока что-то качается — не дольше poll_sec
+                    pending = [jobs[name] for name, _ in active_clusters[next_idx:] if jobs[name]["result"] is None]
+                    polls = [job["poll"] for job in pending if job["future"] is None]
+                    downloading = any(job["future"] is not None for job in pending)
+                    time.sleep(next_wake_delay(polls, cap=poll_sec if downloading else None))
+        finally:
+            # прервались (исключение) — файлы фоновых загрузок, до которых не дошли, не нужны
+            for cluster_name, _ in active_clusters[next_idx:]:
+                job = jobs[cluster_name]
+                if job["result"] is not None:
+                    if job["result"][0] == "posts" and job["result"][1] is not None:
+                        job["result"][1].close()
+                elif job["future"] is not None and not job["future"].cancel():
+                    job["future"].add_done_callback(_discard_prefetched)
+
+
 def _run_over_active_clusters(service, settings, with_gpt=True, run_label="run"):
     clusters = load_clusters(service)
 
@@ -1131,23 +2036,11 @@ def _run_over_active_clusters(service, settings, with_gpt=True, run_label="run")
         " -> ".join(cluster_names),
     )
 
-    for cluster_name, cluster_data in active_clusters:
-        try:
-            process_cluster(service, settings, cluster_name, cluster_data, with_gpt=with_gpt)
-            update_setting(service, "last_cluster_name", cluster_name)
-        except Exception as e:
-            print(
-                "Ошибка при обработке кластера",
-                cluster_name,
-                ":",
-                repr(e),
-            )
-            write_log(
-                service,
-                "cluster_error",
-                cluster_name,
-                repr(e),
-            )
+    pipeline = (settings.get("cluster_pipeline", "off") or "off").strip().lower()
+    if pipeline in ("on", "1", "true", "yes"):
+        _run_clusters_pipelined(service, settings, active_clusters, with_gpt)
+    else:
+        _run_clusters_sequential(service, settings, active_clusters, with_gpt)
 
     write_log(
         service,
@@ -1155,40 +2048,110 @@ def _run_over_active_clusters(service, settings, with_gpt=True, run_label="run")
         "",
         f"clusters={len(cluster_names)}",
     )
+    flush_logs()
     print(f"{run_label} завершён. Обработано кластеров:", len(cluster_names))
 
 
-def run_once():
+def run_once(service=None):
     """Полный режим: кластеры (Bright Data) + GPT по ходу."""
-    service = get_sheets_service()
+    if service is None:
+        service = get_sheets_service()
+        bootstrap_run(service)
     write_log(service, "run_start", "", f"version={BOT_VERSION}")
     print(f"[RUN] Старт полного прогона кластеров. Версия: {BOT_VERSION}")
 
     settings = load_settings(service)
     _run_over_active_clusters(service, settings, with_gpt=True, run_label="run")
+    log_gpt_cache_stats(service, "ALL")
+    log_api_stats(service, "ALL")
 
 
-def run_scrape_only():
+def run_scrape_only(service=None):
     """Только Bright Data + запись в таблицу + формулы/формат. Без GPT."""
-    service = get_sheets_service()
+    if service is None:
+        service = get_sheets_service()
+        bootstrap_run(service)
     write_log(service, "scrape_start", "", f"version={BOT_VERSION}")
     print(f"[SCRAPE_ONLY] Старт. Версия: {BOT_VERSION}")
 
     settings = load_settings(service)
     _run_over_active_clusters(service, settings, with_gpt=False, run_label="scrape")
+    log_api_stats(service, "SCRAPE_ONLY")
 
 
-def run_gpt_only(overwrite=False):
+def run_reprocess(cluster_names=None):
+    """
+    Режим reprocess: строки кластеров собираются заново из сохранённых
+    снапшотов (snapshot_store.py) — без Bright Data и без GPT.
+
+    Дедуп по url как обычно: существующие строки не трогаем, поэтому после
+    правки маппинга / normalize_followers нужные строки сначала удаляют
+    из TikTok_Posts. Новый cluster_limit действует сразу. Кластер, у которого
+    в журнале этапов есть незавершённый запуск, пропускаем — его доделает
+    обычный запуск.
+    """
+    service = get_sheets_service()
+    bootstrap_run(service)
+    write_log(service, "reprocess_start", "", f"version={BOT_VERSION}")
+    print(f"[REPROCESS] Старт. Версия: {BOT_VERSION}")
+
+    store = get_snapshot_store()
+    if store is None:
+        print("[REPROCESS] Хранилище снапшотов выключено (SNAPSHOT_STORE_DIR).")
+        return
+
+    settings = load_settings(service)
+    opts = _cluster_options(settings)
+    if not cluster_names:
+        active_clusters = sorted(
+            ((name, data) for name, data in load_clusters(service).items() if data["active"]),
+            key=lambda x: x[1]["order"],
+        )
+        cluster_names = [name for name, _ in active_clusters]
+
+    for cluster_name in cluster_names:
+        checkpoint = get_checkpoints().get(cluster_name)
+        if checkpoint and checkpoint.get("fingerprint"):
+            print(f"[REPROCESS] {cluster_name}: незавершённый запуск в журнале этапов, пропускаем")
+            write_log(service, "reprocess_skipped", cluster_name, f"checkpoint stage={checkpoint['stage']}")
+            continue
+
+        metas = store.list(command=COMMAND_NAME, cluster=cluster_name)
+        if not metas:
+            print(f"[REPROCESS] {cluster_name}: сохранённых снапшотов нет")
+            write_log(service, "reprocess_skipped", cluster_name, "no stored snapshots")
+            continue
+
+        write_log(
+            service,
+            "reprocess_cluster",
+            cluster_name,
+            "snapshots=" + ",".join(m["snapshot_id"] for m in metas),
+        )
+        # новые снапшоты первыми: при дубле url остаётся свежая версия поста
+        posts = itertools.chain.from_iterable(store.iter_posts(m["snapshot_id"]) for m in metas)
+        try:
+            append_cluster_posts(service, opts, cluster_name, posts, with_gpt=False)
+        except Exception as e:
+            _log_cluster_error(service, cluster_name, e)
+
+    flush_logs()
+    log_api_stats(service, "REPROCESS")
+
+
+def run_gpt_only(overwrite=False, service=None):
     """
     Режим: только GPT по TikTok_Posts.
     - Идём СВЕРХУ ВНИЗ по всем строкам;
     - меняем только пустые gpt_flag (не перезатираем уже заполненные);
     - что вернул GPT — то и пишем в ячейку;
-    - прогресс сохраняется после каждой строки.
+    - прогресс сохраняется пачками (gpt_flush_rows / gpt_flush_sec).
 
     Если overwrite=True — сначала очищаем колонку gpt_flag и размечаем заново.
     """
-    service = get_sheets_service()
+    if service is None:
+        service = get_sheets_service()
+        bootstrap_run(service)
     settings = load_settings(service)
 
     gpt_target_column = settings.get("gpt_target_column", "profile_biography")
@@ -1198,21 +2161,30 @@ def run_gpt_only(overwrite=False):
         "Only Y or N. If bio is fully in English or empty → Y. If it contains any non-English letters → N.",
     )
 
-    header, rows = load_data_sheet(service)
+    gpt_flush_rows, gpt_flush_sec = parse_flush_settings(settings)
+    gpt_pack_size = parse_pack_size(settings)
+    gpt_preclassifier = get_preclassifier(settings)
+
+    if overwrite:
+        header = ensure_data_header(service) or HEADER
+        rows = load_posts_rows(service, header, gpt_label_column, gpt_target_column)
+        first_row = 2
+    else:
+        # с зеркалом читаем только хвост листа от первой неразмеченной строки
+        header, rows, first_row, _ = load_posts_for_update(service, gpt_label_column, gpt_target_column)
+        if header and not rows and first_row > 2:
+            print("[GPT_ONLY] Все метки уже заполнены (по зеркалу TikTok_Posts).")
+            return
     if not header or not rows:
         print("[GPT_ONLY] Лист TikTok_Posts пуст или без заголовка.")
         return
 
-    print(f"[GPT_ONLY] Всего строк в TikTok_Posts: {len(rows)}")
+    print(f"[GPT_ONLY] Строк TikTok_Posts к просмотру: {len(rows)} (со строки {first_row})")
     print(f"[GPT_ONLY] Целевая колонка: {gpt_target_column}, колонка флага: {gpt_label_column}")
 
     if overwrite:
         try:
-            label_idx = header.index(gpt_label_column)
-            for i, r in enumerate(rows):
-                if len(r) <= label_idx:
-                    rows[i] = r + [""] * (label_idx + 1 - len(r))
-                rows[i][label_idx] = ""
+            rows.clear_column(header.index(gpt_label_column))
             print("[GPT_ONLY] Все значения в колонке флага очищены, размечаем с нуля.")
         except ValueError:
             print("[GPT_ONLY] Колонка флага не найдена, пропускаем очистку.")
@@ -1226,12 +2198,173 @@ def run_gpt_only(overwrite=False):
         label_column=gpt_label_column,
         prompt_base=gpt_prompt,
         log_every=10,
+        concurrency=parse_concurrency(settings),
+        flush_rows=gpt_flush_rows,
+        flush_sec=gpt_flush_sec,
+        pack_size=gpt_pack_size,
+        preclassifier=gpt_preclassifier,
+        first_row=first_row,
     )
 
-    save_gpt_labels_only(service, header, rows, gpt_label_column)
+    # ячейки с метками уже ушли через write-behind буфер;
+    # целиком колонку перезаливаем только при overwrite (чтобы очистить старые метки)
+    if overwrite:
+        save_gpt_labels_only(service, header, rows, gpt_label_column)
+        if _posts_mirror:
+            _posts_mirror.invalidate()
+    log_gpt_cache_stats(service, "GPT_ONLY")
+    log_api_stats(service, "GPT_ONLY")
     print(f"[GPT_ONLY] Готово. GPT обработал строк: {processed}")
 
 
+def run_gpt_batch():
+    """
+    Режим gpt_batch: та же разметка, что gpt_only, но через OpenAI Batch API
+    (дешевле и без сотен тысяч интерактивных запросов).
+    - строки с пустым gpt_flag группируем по профилю (как в apply_gpt_labels);
+    - то, что уже есть в кэше GPT, ставим сразу;
+    - остальное — одним JSONL-файлом в Batch API, ждём до gpt_batch_wait_min минут;
+    - все метки пишем в лист одним values.batchUpdate.
+
+    Если batch не успел завершиться — его id остаётся в GPT_BATCH_DIR,
+    и следующий запуск gpt_batch сначала дождётся его.
+    """
+    log_label = "GPT_BATCH"
+    service = get_sheets_service()
+    bootstrap_run(service)
+    settings = load_settings(service)
+    write_log(service, "gpt_batch_start", log_label, f"version={BOT_VERSION}")
+
+    gpt_target_column = settings.get("gpt_target_column", "profile_biography")
+    gpt_label_column = settings.get("gpt_label_column", "gpt_flag")
+    gpt_prompt = settings.get(
+        "gpt_prompt",
+        "Only Y or N. If bio is fully in English or empty → Y. If it contains any non-English letters → N.",
+    )
+    try:
+        batch_wait_min = max(0, int(settings.get("gpt_batch_wait_min", "300")))
+    except Exception:
+        batch_wait_min = 300
+    try:
+        batch_poll_sec = max(1, int(settings.get("gpt_batch_poll_sec", "60")))
+    except Exception:
+        batch_poll_sec = 60
+
+    header, rows = load_data_sheet(service)
+    if not header or not rows:
+        print(f"[{log_label}] Лист TikTok_Posts пуст или без заголовка.")
+        return
+
+    try:
+        text_idx = header.index(gpt_target_column)
+        label_idx = header.index(gpt_label_column)
+    except ValueError:
+        print("GPT: не найдена колонка", gpt_target_column, "или", gpt_label_column)
+        return
+
+    for i, r in enumerate(rows):
+        if len(r) < len(header):
+            rows[i] = r + [""] * (len(header) - len(r))
+
+    pending_idx = [
+        row_idx
+        for row_idx, r in enumerate(rows)
+        if not (r[label_idx] or "").strip()
+    ]
+    if not pending_idx:
+        msg = "nothing_to_process: все метки уже заполнены"
+        print(f"[{log_label}] {msg}")
+        write_log(service, "gpt_batch_done", log_label, msg)
+        return
+
+    group_idx = header.index("profile_url") if "profile_url" in header else None
+    groups = group_rows_by_key(rows, pending_idx, group_idx)
+    group_texts = [str(group_text(rows, group, text_idx) or "") for group in groups]
+
+    answers = {}
+
+    # очевидные случаи решаем локально (gpt_preclassifier)
+    preclassifier = get_preclassifier(settings)
+    local_count = 0
+    if preclassifier is not None:
+        for text, verdict in zip(group_texts, preclassifier(group_texts)):
+            if verdict and text not in answers:
+                answers[text] = verdict
+                local_count += 1
+
+    cache = get_gpt_cache()
+    cache_prompt = GPT_LABEL_SYSTEM + "\n" + gpt_prompt.strip()
+    if cache is not None:
+        for text in group_texts:
+            if text not in answers:
+                cached = cache.get(GPT_MODEL, cache_prompt, text)
+                if cached is not None:
+                    answers[text] = cached
+    from_cache = len(answers) - local_count
+
+    todo = [text for text in dict.fromkeys(group_texts) if text not in answers]
+    print(
+        f"[{log_label}] строк к разметке: {len(pending_idx)}, профилей: {len(groups)}, "
+        f"локально: {local_count}, из кэша: {from_cache}, в batch: {len(todo)}"
+    )
+
+    status = "completed"
+    if todo and OPENAI_API_KEY:
+        try:
+            got, status = classify_texts_via_batch(
+                OPENAI_BASE_URL,
+                OPENAI_API_KEY,
+                todo,
+                lambda text: build_gpt_payload(GPT_LABEL_SYSTEM, gpt_prompt, text),
+                GPT_BATCH_DIR,
+                COMMAND_NAME,
+                cache_prompt,
+                max_wait_sec=batch_wait_min * 60,
+                poll_sec=batch_poll_sec,
+            )
+        except Exception as e:
+            print(f"[{log_label}] batch error:", repr(e))
+            write_log(service, "gpt_batch_error", log_label, repr(e))
+            got, status = {}, "error"
+
+        for text, answer in got.items():
+            answers[text] = answer
+            if cache is not None:
+                cache.put(GPT_MODEL, cache_prompt, text, answer)
+
+    # все метки — одним values.batchUpdate (и в зеркало TikTok_Posts, если оно включено)
+    mirror = get_posts_mirror(service)
+    label_buffer = LabelWriteBuffer(
+        service,
+        SPREADSHEET_ID,
+        SHEET_DATA,
+        _idx_to_col_letter(label_idx),
+        flush_rows=len(pending_idx) + 1,
+        flush_sec=0,
+        on_flush=mirror.on_cells_written if mirror else None,
+    )
+    labeled = 0
+    for group, text in zip(groups, group_texts):
+        answer = answers.get(text, "")
+        if not answer:
+            continue
+        for row_idx in group:
+            rows[row_idx][label_idx] = answer
+            label_buffer.set(row_idx, answer)
+            labeled += 1
+    label_buffer.close()
+
+    msg = (
+        f"status={status} rows_labeled={labeled}/{len(pending_idx)} "
+        f"profiles={len(groups)} local={local_count} from_cache={from_cache} "
+        f"batch_requests={len(todo)}"
+    )
+    print(f"[{log_label}] {msg}")
+    write_log(service, "gpt_batch_done", log_label, msg)
+    log_gpt_cache_stats(service, log_label)
+    log_api_stats(service, log_label)
+
+
 # ---------- режим для вкладки US_Based ----------
 
 def run_us_based():
@@ -1251,9 +2384,12 @@ def run_us_based():
     - Если и E, и F уже заполнены — строку НЕ трогаем.
     - Если что-то пусто — шлём BIO в GPT и пишем РОВНО то,
       что вернула модель (без авто-правок в Python).
-    - Прогресс по E/F сохраняем каждые ~10 строк и в конце.
+      При gpt_pack_size > 1 в одном запросе уходит сразу несколько BIO.
+    - Прогресс по E/F сохраняем пачками только изменённых ячеек
+      (gpt_flush_rows / gpt_flush_sec) и в конце.
     """
     service = get_sheets_service()
+    bootstrap_run(service)
     settings = load_settings(service)
     sheet = service.spreadsheets()
 
@@ -1356,49 +2492,66 @@ def run_us_based():
 
     processed = 0
 
-    for row_idx, r in enumerate(rows):
-        flag_val = (r[US_FLAG_COL] or "").strip()
-        cat_val = (r[US_CAT_COL] or "").strip()
+    # E/F пишем точечно через write-behind буфер (только изменённые ячейки)
+    flush_rows, flush_sec = parse_flush_settings(settings)
+    pack_size = parse_pack_size(settings)
+    ef_buffer = LabelWriteBuffer(
+        service,
+        SPREADSHEET_ID,
+        SHEET_US_BASED,
+        "E",
+        flush_rows=flush_rows,
+        flush_sec=flush_sec,
+    )
 
-        need_flag = not flag_val
-        need_cat = not cat_val
+    def _bio(r):
+        if BIO_COL < len(r) and r[BIO_COL] is not None:
+            return str(r[BIO_COL])
+        return ""
 
-        if not (need_flag or need_cat):
-            continue
+    pending_idx = [
+        row_idx
+        for row_idx, r in enumerate(rows)
+        if not (r[US_FLAG_COL] or "").strip() or not (r[US_CAT_COL] or "").strip()
+    ]
 
-        bio = ""
-        if BIO_COL < len(r) and r[BIO_COL] is not None:
-            bio = str(r[BIO_COL])
-
-        if need_flag:
-            yn = call_gpt_label(us_flag_prompt, bio)
-            if yn != "":
-                r[US_FLAG_COL] = yn
-
-        if need_cat:
-            cat = call_gpt_category_5(categories_prompt, bio)
-            if cat != "":
-                r[US_CAT_COL] = cat
-
-        processed += 1
-
-        if processed % 10 == 0 or processed == total_to_process:
-            print(f"[US_BASED] processed={processed}/{total_to_process}")
-            ef_values = [[row[US_FLAG_COL], row[US_CAT_COL]] for row in rows]
-            sheet.values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range=f"{SHEET_US_BASED}!E2:F{len(rows) + 1}",
-                valueInputOption="USER_ENTERED",
-                body={"values": ef_values},
-            ).execute()
-
-    ef_values = [[r[US_FLAG_COL], r[US_CAT_COL]] for r in rows]
-    sheet.values().update(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_US_BASED}!E2:F{len(rows) + 1}",
-        valueInputOption="USER_ENTERED",
-        body={"values": ef_values},
-    ).execute()
+    try:
+        # gpt_pack_size > 1 — несколько био в одном GPT-запросе
+        for chunk in chunked(pending_idx, pack_size):
+            flag_idx = [i for i in chunk if not (rows[i][US_FLAG_COL] or "").strip()]
+            cat_idx = [i for i in chunk if not (rows[i][US_CAT_COL] or "").strip()]
+
+            if len(flag_idx) == 1:
+                flag_answers = [call_gpt_label(us_flag_prompt, _bio(rows[flag_idx[0]]))]
+            elif flag_idx:
+                flag_answers = call_gpt_label_batch(us_flag_prompt, [_bio(rows[i]) for i in flag_idx])
+            else:
+                flag_answers = []
+
+            for row_idx, yn in zip(flag_idx, flag_answers):
+                if yn != "":
+                    rows[row_idx][US_FLAG_COL] = yn
+                    ef_buffer.set(row_idx, yn, "E")
+
+            if len(cat_idx) == 1:
+                cat_answers = [call_gpt_category_5(categories_prompt, _bio(rows[cat_idx[0]]))]
+            elif cat_idx:
+                cat_answers = call_gpt_category_5_batch(categories_prompt, [_bio(rows[i]) for i in cat_idx])
+            else:
+                cat_answers = []
+
+            for row_idx, cat in zip(cat_idx, cat_answers):
+                if cat != "":
+                    rows[row_idx][US_CAT_COL] = cat
+                    ef_buffer.set(row_idx, cat, "F")
+
+            prev_processed = processed
+            processed += len(chunk)
+
+            if processed // 10 != prev_processed // 10 or processed == total_to_process:
+                print(f"[US_BASED] processed={processed}/{total_to_process}")
+    finally:
+        ef_buffer.close()
 
     if last_verdict_row:
         extend_us_based_verdict_formulas(
@@ -1413,9 +2566,60 @@ def run_us_based():
         SHEET_US_BASED,
         f"processed={processed}/{total_to_process}",
     )
+    log_gpt_cache_stats(service, SHEET_US_BASED)
+    log_api_stats(service, SHEET_US_BASED)
     print(f"[US_BASED] Готово. GPT обработал строк: {processed} из {total_to_process}")
 
 
+# ---------- daemon ----------
+
+def run_daemon(mode="full"):
+    """
+    Долгоживущий режим (см. daemon_loop): один процесс крутит циклы mode
+    (full / scrape_only / gpt_only), сервис Sheets, HTTP-пулы и кэши живут
+    между циклами. Settings и Clusters перечитываются в начале каждого
+    цикла (bootstrap_run), config.json — только при перезапуске.
+    """
+    runners = {
+        "full": run_once,
+        "scrape_only": run_scrape_only,
+        "gpt_only": run_gpt_only,
+    }
+    run = runners.get(mode)
+    if run is None:
+        print(f"[DAEMON] Неизвестный режим {mode!r}, допустимо: {', '.join(runners)}")
+        return
+
+    service = get_sheets_service()
+    daemon = daemon_loop.Daemon()
+    daemon.install_signal_handlers()
+
+    def cycle():
+        bootstrap_run(service)
+        enabled, sleep_sec = daemon_loop.parse_daemon_settings(load_settings(service))
+        if enabled:
+            run(service=service)
+        else:
+            print("[DAEMON] bot_status = off, пропускаем цикл")
+            write_log(service, "bot_off", "", f"sleep={int(sleep_sec)}s")
+            flush_logs()
+        return sleep_sec
+
+    def on_error(e):
+        print("[DAEMON] Ошибка цикла:", repr(e))
+        write_log(service, "daemon_error", "", repr(e)[:500])
+        flush_logs()
+
+    print(f"[DAEMON] Старт: режим {mode}, версия {BOT_VERSION}")
+    write_log(service, "daemon_start", "", f"mode={mode} version={BOT_VERSION}")
+    flush_logs()
+    try:
+        daemon.run_forever(cycle, on_error)
+    finally:
+        write_log(service, "daemon_stop", "", f"cycles={daemon.cycles}")
+        flush_logs()
+
+
 # ---------- точка входа ----------
 
 if __name__ == "__main__":
@@ -1426,9 +2630,18 @@ if __name__ == "__main__":
     if mode == "gpt_only":
         # только GPT по основной таблице TikTok_Posts
         run_gpt_only(overwrite=False)
+    elif mode == "gpt_batch":
+        # то же, но через OpenAI Batch API (для ночного прогона)
+        run_gpt_batch()
     elif mode == "scrape_only":
         # только выгрузка Bright Data + запись в таблицу
         run_scrape_only()
+    elif mode == "reprocess":
+        # строки заново из сохранённых снапшотов (можно перечислить кластеры)
+        run_reprocess(sys.argv[2:])
+    elif mode == "daemon":
+        # один долгоживущий процесс: циклы по bot_status / sleep_between_min
+        run_daemon(sys.argv[2] if len(sys.argv) > 2 else "full")
     elif mode == "start":
         # режим для вкладки US_Based (GPT по E/F + протяжка Verdict)
         run_us_based()